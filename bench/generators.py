@@ -0,0 +1,182 @@
+# SPDX-License-Identifier: MIT
+"""
+Generators for synthetic dumps, dfmt docs and RDB-style headers of
+arbitrary size, for benchmarking.
+
+All generators are deterministic for a given seed.
+"""
+
+from array import array
+import os
+import random
+
+from libdump.dump import Dump, dump_to_file, _typecode_for_bits, TEXT_FMT
+
+
+def gen_dump(
+    path: str | os.PathLike,
+    size: int,
+    base_addr: int = 0x10000000,
+    val_bits: int = 32,
+    unreadable_ratio: float = 0.0,
+    fmt: str = TEXT_FMT,
+    seed: int = 0,
+    changes_from: Dump | None = None,
+    change_ratio: float = 0.01
+) -> Dump:
+    """
+    Generate an MMIO dump with random values.
+
+    :param path: Path to write the dump to
+    :param size: Size of the dumped block, in bytes
+    :param base_addr: Base address of the block
+    :param val_bits: Amount of bits in values
+    :param unreadable_ratio: Fraction of registers to mark as unreadable
+    :param fmt: Dump format to write; TEXT_FMT or BINARY_FMT
+    :param seed: Seed for the random values
+    :param changes_from: If given, copy this dump (which must cover the same
+                         block) and only change some registers, as if it was
+                         captured again later
+    :param change_ratio: Fraction of registers to change, with changes_from
+    :return: The generated dump, as written
+    """
+    rng = random.Random(seed)
+    stride = 4
+    count = max(size // stride, 1)
+    header = {
+        "fmt": fmt,
+        "type": "mmio",
+        "base_addr": f"0x{base_addr:08x}",
+        "size": hex((count - 1) * stride),
+        "addr_bits": "32",
+        "val_bits": str(val_bits),
+    }
+
+    typecode = _typecode_for_bits(val_bits)
+    if changes_from is None:
+        values = array(typecode, rng.randbytes(count * array(typecode).itemsize))
+        if val_bits % 8:
+            mask = (1 << val_bits) - 1
+            values = array(typecode, (v & mask for v in values))
+        valid = bytearray(b"\xff" * ((count + 7) // 8))
+        for i in range(count):
+            if rng.random() < unreadable_ratio:
+                valid[i >> 3] &= ~(1 << (i & 7))
+    else:
+        values = array(typecode, changes_from.values)
+        valid = bytearray(changes_from.valid)
+        for _ in range(int(count * change_ratio)):
+            i = rng.randrange(count)
+            values[i] ^= 1 << rng.randrange(val_bits)
+
+    dump = Dump.from_arrays(header, values, valid)
+    dump_to_file(dump, path, fmt)
+    return dump
+
+
+def _field_layout(rng: random.Random, val_bits: int, fields: int) -> list[tuple[int, int]]:
+    """Split a register into (start_bit, end_bit) fields at random points."""
+    cuts = sorted(rng.sample(range(1, val_bits), min(fields, val_bits) - 1))
+    starts = [0, *cuts]
+    ends = [*(c - 1 for c in cuts), val_bits - 1]
+    return list(zip(starts, ends))
+
+
+def gen_dfmt(
+    path: str | os.PathLike,
+    registers: int,
+    fields_per_register: int = 4,
+    base_addr: int = 0x10000000,
+    val_bits: int = 32,
+    seed: int = 0
+):
+    """
+    Generate a dfmt doc for a block of 32-bit registers.
+
+    :param path: Path to write the doc to
+    :param registers: Amount of documented registers
+    :param fields_per_register: Amount of bit ranges per register
+    """
+    rng = random.Random(seed)
+    with open(path, "w") as out_file:
+        out_file.write(
+            "fmt doc\ntype mmio\n"
+            f"base_addr 0x{base_addr:08x}\nsize {hex((registers - 1) * 4)}\n"
+            f"addr_bits 32\nval_bits {val_bits}\n--- header_end ---\n"
+        )
+        for n in range(registers):
+            out_file.write(f"0x{n * 4:08x} REG{n}\n! Register {n}\n\n")
+            for start, end in _field_layout(rng, val_bits, fields_per_register):
+                out_file.write(f"  b {start} {end} FIELD{start}\n  ! Bits {start}-{end}\n\n")
+
+
+def gen_rdb_header(
+    path: str | os.PathLike,
+    block: str,
+    registers: int,
+    fields_per_register: int = 4,
+    seed: int = 0
+):
+    """
+    Generate a Kona RDB-style header for a block of 32-bit registers.
+
+    :param path: Path to write the header to
+    :param block: Name of the block, used as the prefix of all defines
+    :param registers: Amount of registers
+    :param fields_per_register: Amount of bit ranges per register
+    """
+    rng = random.Random(seed)
+    guard = f"__BRCM_RDB_{block}_H__"
+    with open(path, "w") as out_file:
+        out_file.write(
+            "/*\n * Generated RDB header for benchmarking\n */\n\n"
+            f"#ifndef {guard}\n#define {guard}\n\n"
+        )
+        for n in range(registers):
+            name = f"{block}_REG{n}"
+            out_file.write(
+                f"#define {name}_OFFSET 0x{n * 4:08X}\n"
+                f"#define {name}_TYPE UInt32\n"
+                f"#define {name}_RESERVED_MASK 0x00000000\n"
+            )
+            for start, end in _field_layout(rng, 32, fields_per_register):
+                mask = ((1 << (end - start + 1)) - 1) << start
+                out_file.write(
+                    f"#define    {name}_FIELD{start}_SHIFT {start}\n"
+                    f"#define    {name}_FIELD{start}_MASK 0x{mask:08X}\n"
+                )
+            out_file.write("\n")
+        out_file.write(f"#endif /* {guard} */\n")
+
+
+def gen_sysmap(
+    dir_path: str | os.PathLike,
+    blocks: int,
+    registers: int = 64,
+    fields_per_register: int = 4,
+    base_addr: int = 0x35000000,
+    block_size: int = 0x1000,
+    seed: int = 0
+) -> str:
+    """
+    Generate a sysmap header (brcm_rdb_sysmap.h) and an RDB header for each
+    block listed in it.
+
+    :param dir_path: Directory to write the headers to
+    :param blocks: Amount of blocks
+    :param registers: Amount of registers per block
+    :return: Path of the sysmap header
+    """
+    sysmap_path = os.path.join(dir_path, "brcm_rdb_sysmap.h")
+    with open(sysmap_path, "w") as sysmap_file:
+        sysmap_file.write("/* Generated sysmap for benchmarking */\n\n")
+        for n in range(blocks):
+            header = f"brcm_rdb_block{n}.h"
+            sysmap_file.write(
+                f"#define BLOCK{n}_BASE_ADDR 0x{base_addr + n * block_size:08X} /* {header} */\n"
+            )
+            gen_rdb_header(
+                os.path.join(dir_path, header), f"BLOCK{n}", registers,
+                fields_per_register, seed=seed + n
+            )
+    return sysmap_path
@@ -0,0 +1,23 @@
+# SPDX-License-Identifier: MIT
+"""
+Reference implementations of code paths that libdump has since replaced,
+so that the replacements can be benchmarked against them.
+"""
+
+
+class LineHeaderParser:
+    """
+    The original header parser, which only splits #define lines and does
+    not handle comments, conditionals or includes.
+    """
+
+    def __init__(self, path: str):
+        with open(path) as header_file:
+            self._raw = header_file.read()
+
+        self.data = {}
+        for line in self._raw.split("\n"):
+            line = line.strip().replace("\t", " ")
+            if line.startswith("#define"):
+                split = line.split()
+                self.data[split[1]] = ' '.join(split[2:])
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+"""
+Benchmarks the parse, lookup and render paths of libdump on synthetic data
+of various sizes, and compares the results against a stored baseline.
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.generators import gen_dfmt, gen_dump, gen_rdb_header
+from bench.reference import LineHeaderParser
+from libdump import Dump
+from libdump.diff import diff_dumps, diff_rows
+from libdump.doc import DFmtDoc, doc_to_dfmt_file
+from libdump.dump import dump_to_file, BINARY_FMT
+from libdump.ext.doc_kona_rdb import KonaRdbDoc
+from libdump import header_parser
+from libdump.header_parser import HeaderParser
+
+SIZES = {
+    "1K": 1 << 10,
+    "64K": 64 << 10,
+    "1M": 1 << 20,
+    "16M": 16 << 20,
+}
+
+#: Amount of random lookups done by the lookup benchmarks.
+LOOKUPS = 10000
+
+#: Benchmarks of replaced code paths (see bench.reference), by the name of
+#: the benchmark of their replacement.
+REFERENCES = {
+    "header_parser.parse": "header_parser.reference",
+}
+
+# -- Argument parsing --
+argparser = argparse.ArgumentParser(
+                    prog='benchmark.py',
+                    description='Benchmark libdump on synthetic dumps and docs')
+argparser.add_argument("-s", "--sizes", default=",".join(SIZES),
+                       help=f"comma-separated block sizes to benchmark, out of {', '.join(SIZES)} (default: all)")
+argparser.add_argument("-u", "--unreadable", type=float, default=0.05, metavar="RATIO",
+                       help="fraction of unreadable registers in the generated dumps (default: %(default)s)")
+argparser.add_argument("-k", "--filter", default="",
+                       help="only run benchmarks whose name contains this string")
+argparser.add_argument("-r", "--repeat", type=int, default=3,
+                       help="amount of timed runs per benchmark; the fastest one counts (default: %(default)s)")
+argparser.add_argument("--data-dir",
+                       help="directory to keep the generated data in, so that it is only generated once (default: a temporary directory)")
+argparser.add_argument("-o", "--output", help="write the results to this JSON file")
+argparser.add_argument("-b", "--baseline", help="compare the results against this JSON file")
+argparser.add_argument("-t", "--threshold", type=float, default=0.2,
+                       help="slowdown (or memory growth) over the baseline to report as a regression (default: %(default)s)")
+args = argparser.parse_args()
+# -- End argument parsing --
+
+sizes = {}
+for label in args.sizes.split(","):
+    if label not in SIZES:
+        argparser.error(f"unknown size: {label}")
+    sizes[label] = SIZES[label]
+
+
+# -- Benchmarks --
+# Each benchmark is a function that takes the data directory and the block
+# size, does any setup that should not be measured, and returns the function
+# to measure. Benchmarks with a max_size are skipped for larger blocks.
+
+BENCHMARKS = []
+
+
+def benchmark(name: str, max_size: int | None = None):
+    def wrap(func):
+        BENCHMARKS.append((name, max_size, func))
+        return func
+    return wrap
+
+
+def data_path(data_dir: str, kind: str, size: int) -> str:
+    """Get the path of a generated file, generating it if needed."""
+    path = os.path.join(data_dir, f"{kind}_{size}_{args.unreadable}")
+    if os.path.exists(path):
+        return path
+
+    if kind == "dump":
+        gen_dump(path, size, unreadable_ratio=args.unreadable)
+    elif kind == "dump_changed":
+        gen_dump(
+            path, size, unreadable_ratio=args.unreadable, seed=1,
+            changes_from=Dump(data_path(data_dir, "dump", size))
+        )
+    elif kind == "bindump":
+        dump_to_file(Dump(data_path(data_dir, "dump", size)), path, BINARY_FMT)
+    elif kind == "dfmt":
+        gen_dfmt(path, size // 4)
+    elif kind == "rdb":
+        gen_rdb_header(path, "BENCH", size // 4)
+    return path
+
+
+@benchmark("dump.parse_text")
+def bench_parse_text(data_dir, size):
+    path = data_path(data_dir, "dump", size)
+    return lambda: Dump(path).values
+
+
+@benchmark("dump.load_binary")
+def bench_load_binary(data_dir, size):
+    path = data_path(data_dir, "bindump", size)
+    return lambda: Dump(path).values
+
+
+@benchmark("dump.lookup")
+def bench_dump_lookup(data_dir, size):
+    dump = Dump(data_path(data_dir, "dump", size))
+    # Parse the dump up front, so that the first run does not include it
+    dump.values
+    rng = random.Random(0)
+    addrs = [dump.base_addr + rng.randrange(dump.count) * dump.stride for _ in range(LOOKUPS)]
+    data = dump.data
+
+    def run():
+        for addr in addrs:
+            data[addr]
+    return run
+
+
+@benchmark("dump.write_text")
+def bench_write_text(data_dir, size):
+    dump = Dump(data_path(data_dir, "dump", size))
+    dump.values
+    out_path = os.path.join(data_dir, "write_text.tmp")
+    return lambda: dump_to_file(dump, out_path)
+
+
+@benchmark("diff.diff_dumps")
+def bench_diff_dumps(data_dir, size):
+    foo = Dump(data_path(data_dir, "dump", size))
+    bar = Dump(data_path(data_dir, "dump_changed", size))
+    foo.values, bar.values
+    return lambda: diff_dumps(foo, bar)
+
+
+@benchmark("diff.render", max_size=64 << 10)
+def bench_diff_render(data_dir, size):
+    from jinja2 import Template
+
+    foo = Dump(data_path(data_dir, "dump", size))
+    bar = Dump(data_path(data_dir, "dump_changed", size))
+    doc = DFmtDoc(data_path(data_dir, "dfmt", size))
+    foo.values, bar.values
+    with open("_generate_dump_diff_tmpl.html") as template_file:
+        template = Template(template_file.read())
+
+    def run():
+        rows = diff_rows(foo, bar, doc=doc)
+        for _chunk in template.generate(foo=foo, bar=bar, rows=rows):
+            pass
+    return run
+
+
+@benchmark("doc.dfmt_parse", max_size=1 << 20)
+def bench_dfmt_parse(data_dir, size):
+    path = data_path(data_dir, "dfmt", size)
+    return lambda: DFmtDoc(path)
+
+
+@benchmark("doc.dfmt_write", max_size=1 << 20)
+def bench_dfmt_write(data_dir, size):
+    doc = DFmtDoc(data_path(data_dir, "dfmt", size))
+    out_path = os.path.join(data_dir, "write_dfmt.tmp")
+    return lambda: doc_to_dfmt_file(doc, "mmio", out_path)
+
+
+@benchmark("doc.lookup", max_size=1 << 20)
+def bench_doc_lookup(data_dir, size):
+    doc = DFmtDoc(data_path(data_dir, "dfmt", size))
+    doc.finalize(32)
+    rng = random.Random(0)
+    lookups = [(rng.randrange(size // 4) * 4, rng.randrange(32)) for _ in range(LOOKUPS)]
+
+    def run():
+        for offset, bit in lookups:
+            doc_addr = doc[offset]
+            if doc_addr is not None:
+                doc_addr[bit]
+    return run
+
+
+@benchmark("header_parser.parse", max_size=1 << 20)
+def bench_header_parser(data_dir, size):
+    path = data_path(data_dir, "rdb", size)
+
+    def run():
+        header_parser._lex_cached.cache_clear()
+        HeaderParser(path).data
+    return run
+
+
+@benchmark("header_parser.reference", max_size=1 << 20)
+def bench_header_parser_reference(data_dir, size):
+    path = data_path(data_dir, "rdb", size)
+    return lambda: LineHeaderParser(path).data
+
+
+@benchmark("kona_rdb.parse", max_size=1 << 20)
+def bench_kona_rdb(data_dir, size):
+    path = data_path(data_dir, "rdb", size)
+
+    def run():
+        header_parser._lex_cached.cache_clear()
+        KonaRdbDoc(0, path)
+    return run
+
+
+def measure(func) -> dict:
+    """Get the best time out of args.repeat runs, and the peak memory use."""
+    times = []
+    for _ in range(args.repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # Memory is measured in a separate run, as tracing slows everything down
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"time": min(times), "peak_mem": peak}
+
+
+def run_benchmarks(data_dir: str) -> dict:
+    results = {}
+    for label, size in sizes.items():
+        for name, max_size, setup in BENCHMARKS:
+            full_name = f"{name}[{label}]"
+            if args.filter not in full_name:
+                continue
+            if max_size is not None and size > max_size:
+                continue
+            try:
+                func = setup(data_dir, size)
+            except ImportError as e:
+                print(f"{full_name}: skipped ({e})")
+                continue
+            result = measure(func)
+            results[full_name] = result
+            print(
+                f"{full_name}: {result['time'] * 1000:.2f} ms, "
+                f"peak {result['peak_mem'] / 1024:.1f} KiB", flush=True
+            )
+    return results
+
+
+if args.data_dir:
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = run_benchmarks(args.data_dir)
+else:
+    with tempfile.TemporaryDirectory() as data_dir:
+        results = run_benchmarks(data_dir)
+
+if args.output:
+    with open(args.output, "w") as out_file:
+        json.dump({
+            "meta": {
+                "date": datetime.datetime.now().isoformat(),
+                "python": sys.version,
+                "platform": platform.platform(),
+                "unreadable_ratio": args.unreadable,
+            },
+            "results": results,
+        }, out_file, indent=2)
+
+# Replacements must not be slower than, or use more memory than, the code
+# they replaced
+regressions = 0
+compared = False
+for name, reference in REFERENCES.items():
+    for label in sizes:
+        result = results.get(f"{name}[{label}]")
+        reference_result = results.get(f"{reference}[{label}]")
+        if result is None or reference_result is None:
+            continue
+        if not compared:
+            print("\nComparison against reference implementations:")
+            compared = True
+        time_ratio = result["time"] / max(reference_result["time"], 1e-9)
+        mem_ratio = result["peak_mem"] / max(reference_result["peak_mem"], 1)
+        regressed = time_ratio > 1 + args.threshold or mem_ratio > 1 + args.threshold
+        regressions += regressed
+        print(
+            f"{'REGRESSION ' if regressed else ''}{name}[{label}] vs {reference}: "
+            f"time x{time_ratio:.2f}, memory x{mem_ratio:.2f}"
+        )
+
+if args.baseline:
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)["results"]
+
+    print(f"\nComparison against {args.baseline}:")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        time_ratio = result["time"] / max(baseline[name]["time"], 1e-9)
+        mem_ratio = result["peak_mem"] / max(baseline[name]["peak_mem"], 1)
+        regressed = time_ratio > 1 + args.threshold or mem_ratio > 1 + args.threshold
+        regressions += regressed
+        print(
+            f"{'REGRESSION ' if regressed else ''}{name}: "
+            f"time x{time_ratio:.2f}, memory x{mem_ratio:.2f}"
+        )
+
+if regressions:
+    print(f"{regressions} regressions")
+    sys.exit(1)
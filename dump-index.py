@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+
+import argparse
+from libdump import stats
+from libdump.cli import add_tool_arguments, run_tool
+from libdump.cli import index as tool
+
+# -- Argument parsing --
+argparser = argparse.ArgumentParser(
+                    prog='dump-index.py',
+                    description=tool.DESCRIPTION)
+add_tool_arguments(tool, argparser)
+args = argparser.parse_args()
+stats.setup_from_args(args)
+# -- End argument parsing --
+
+run_tool(tool, argparser, args)
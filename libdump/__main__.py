@@ -0,0 +1,39 @@
+# SPDX-License-Identifier: MIT
+"""
+Entry point for "python -m libdump COMMAND ...".
+
+Setting up the arguments of all commands is cheap; the modules a command
+needs are only imported once it runs. See libdump.cli.
+"""
+
+import argparse
+import sys
+
+from . import stats
+from .cli import COMMANDS, add_tool_arguments, load_tool, run_tool
+
+
+def main(argv: list[str] | None = None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    argparser = argparse.ArgumentParser(
+                        prog='python -m libdump',
+                        description='Tools for working with register dumps')
+    subparsers = argparser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+
+    parsers = {}
+    for name in COMMANDS:
+        tool = load_tool(name)
+        parsers[name] = subparsers.add_parser(
+            name, help=tool.DESCRIPTION, description=tool.DESCRIPTION
+        )
+        add_tool_arguments(tool, parsers[name])
+
+    args = argparser.parse_args(argv)
+    stats.setup_from_args(args)
+    run_tool(load_tool(args.command), parsers[args.command], args)
+
+
+if __name__ == "__main__":
+    main()
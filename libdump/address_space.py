@@ -0,0 +1,396 @@
+# SPDX-License-Identifier: MIT
+"""
+Sparse map of a whole address space, assembled from the dumps of its blocks.
+
+An AddressSpace keeps the dumps of many blocks (e.g. the output of
+split-dumpall-dumps.py) sorted by absolute address, so that registers can be
+looked up by address without knowing which block they belong to, ranges can
+be read across block boundaries, and two captures of the whole address space
+can be compared block by block.
+
+The address space is stored as a sorted list of non-overlapping segments,
+each of which maps a range of addresses to the dump covering it. Lookups are
+a binary search over the segments, and the values of a segment are served
+straight out of its dump's storage.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+import os
+
+from .diff import DumpDiff, diff_dumps
+from .dump import Dump
+
+
+@dataclass(slots=True)
+class RegionView:
+    """
+    Part of an AddressSpace covered by a single dump.
+
+    The values are a view into the dump's storage; no data is copied.
+    """
+
+    #: Dump covering the region.
+    dump: Dump
+
+    #: First address of the region.
+    start: int
+
+    #: Address right after the end of the region.
+    end: int
+
+    @property
+    def _first(self) -> int:
+        """Index of the region's first address in the dump."""
+        return -(-(self.start - self.dump.base_addr) // self.dump.stride)
+
+    def __len__(self) -> int:
+        stride = self.dump.stride
+        last = (self.end - self.dump.base_addr + stride - 1) // stride
+        return max(last - self._first, 0)
+
+    @property
+    def base_addr(self) -> int:
+        """Address of the region's first register."""
+        return self.dump.base_addr + self._first * self.dump.stride
+
+    @property
+    def values(self) -> memoryview:
+        """
+        Values of the registers in the region, as a view into Dump.values.
+
+        Unreadable values are set to 0; use RegionView.is_valid to tell them
+        apart.
+        """
+        first = self._first
+        return memoryview(self.dump.values)[first:first + len(self)]
+
+    def is_valid(self, index: int) -> bool:
+        """Check whether the value at the given index of the region was readable."""
+        return self.dump.is_valid(self._first + index)
+
+    def items(self) -> Iterator[tuple[int, int]]:
+        """
+        Iterate over the (addr, value) pairs of the region; unreadable
+        values are set to -1.
+        """
+        first, stride = self._first, self.dump.stride
+        values, valid = self.dump.values, self.dump.valid
+        addr = self.dump.base_addr + first * stride
+        for i in range(first, first + len(self)):
+            yield addr, values[i] if valid[i >> 3] >> (i & 7) & 1 else -1
+            addr += stride
+
+    def as_dump(self) -> Dump:
+        """
+        Get the region as a dump of its own.
+
+        The values are still shared with the original dump; only the
+        validity bitmap is copied, as the region does not necessarily start
+        on a byte boundary of the original one.
+        """
+        dump, first, count = self.dump, self._first, len(self)
+        valid = dump.valid
+        bits = int.from_bytes(valid[first >> 3:(first + count + 7) >> 3], "little")
+        bits = (bits >> (first & 7)) & ((1 << count) - 1)
+
+        header = dict(dump.header)
+        header["base_addr"] = hex(self.base_addr)
+        header["size"] = hex(max(count - 1, 0) * dump.stride)
+        return Dump.from_arrays(
+            header, self.values, bytearray(bits.to_bytes((count + 7) // 8, "little")),
+            filename=dump.filename
+        )
+
+
+@dataclass(slots=True)
+class Overlap:
+    """Range of addresses covered by more than one dump."""
+
+    #: First address of the overlapping range.
+    start: int
+
+    #: Address right after the end of the overlapping range.
+    end: int
+
+    #: Dump that was hidden in this range.
+    hidden: Dump
+
+    #: Dump that covers the range in the address space.
+    dump: Dump
+
+
+class AddressSpace:
+    """
+    Sparse address space assembled from dumps; see the module documentation.
+
+    Dumps may overlap, in which case the dump added last takes precedence
+    for the addresses that both cover; see AddressSpace.overlaps.
+    """
+
+    def __init__(self, dumps: Iterable[Dump] = ()):
+        """
+        :param dumps: Dumps to add to the address space, in order of
+                      increasing precedence
+        """
+        # Non-overlapping segments, sorted by start address: segment n
+        # covers addresses _starts[n] up to (excluding) _ends[n] with
+        # _dumps[n].
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        self._dumps: list[Dump] = []
+
+        #: Ranges in which a dump hides (part of) another one, in the order
+        #: they were found in.
+        self.overlaps: list[Overlap] = []
+
+        for dump in dumps:
+            self.add(dump)
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str | os.PathLike]) -> "AddressSpace":
+        """
+        Create an address space from dump files and directories of dumps.
+
+        Directories are searched recursively, in sorted order; files that
+        are not dumps, as well as I2C dumps, are skipped.
+        """
+        def candidates() -> Iterator[str]:
+            for path in paths:
+                if not os.path.isdir(path):
+                    yield os.fspath(path)
+                    continue
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    for filename in sorted(filenames):
+                        yield os.path.join(dirpath, filename)
+
+        out = cls()
+        for path in candidates():
+            try:
+                dump = Dump(path)
+            except (ValueError, KeyError, UnicodeDecodeError):
+                continue
+            if dump.type != "i2c":
+                out.add(dump)
+        return out
+
+    def add(self, dump: Dump):
+        """
+        Add a dump to the address space. Where it overlaps dumps that were
+        added before, it takes precedence over them.
+        """
+        if dump.type == "i2c":
+            raise ValueError(f"{dump.filename}: I2C dumps have no absolute addresses")
+        start = dump.base_addr
+        end = start + dump.count * dump.stride
+        starts, ends, dumps = self._starts, self._ends, self._dumps
+
+        # Segments that overlap the new one: the one starting before it (if
+        # it reaches into it), and all that start inside it.
+        lo = bisect_right(starts, start) - 1
+        if lo < 0 or ends[lo] <= start:
+            lo += 1
+        hi = bisect_left(starts, end)
+
+        replacement = []
+        for n in range(lo, hi):
+            seg_start, seg_end, seg_dump = starts[n], ends[n], dumps[n]
+            self.overlaps.append(
+                Overlap(max(seg_start, start), min(seg_end, end), seg_dump, dump)
+            )
+            if seg_start < start:
+                replacement.append((seg_start, start, seg_dump))
+            if n == hi - 1:
+                replacement.append((start, end, dump))
+            if seg_end > end:
+                replacement.append((end, seg_end, seg_dump))
+        if lo == hi:
+            replacement.append((start, end, dump))
+
+        starts[lo:hi] = [s for s, _e, _d in replacement]
+        ends[lo:hi] = [e for _s, e, _d in replacement]
+        dumps[lo:hi] = [d for _s, _e, d in replacement]
+
+    def __len__(self) -> int:
+        """Amount of segments in the address space."""
+        return len(self._starts)
+
+    @property
+    def dumps(self) -> list[Dump]:
+        """Dumps that are (at least partly) visible, in address order."""
+        out = []
+        for dump in self._dumps:
+            if not out or out[-1] is not dump:
+                out.append(dump)
+        return out
+
+    # -- Lookups --
+
+    def find(self, addr: int) -> Dump | None:
+        """Get the dump covering an address, if any."""
+        n = bisect_right(self._starts, addr) - 1
+        if n >= 0 and addr < self._ends[n]:
+            return self._dumps[n]
+        return None
+
+    def __getitem__(self, addr: int) -> int:
+        """
+        Get the value at an address; -1 if it was unreadable.
+
+        Raises KeyError if no dump covers the address.
+        """
+        dump = self.find(addr)
+        if dump is None:
+            raise KeyError(addr)
+        return dump.data[addr]
+
+    def get(self, addr: int, default: int | None = None) -> int | None:
+        try:
+            return self[addr]
+        except KeyError:
+            return default
+
+    def __contains__(self, addr) -> bool:
+        dump = self.find(addr)
+        return dump is not None and addr in dump.data
+
+    def regions(self, start: int = 0, end: int | None = None) -> list[RegionView]:
+        """
+        Get views of the parts of an address range covered by dumps, in
+        address order. Holes in the range are left out; see
+        AddressSpace.holes.
+
+        :param start: First address of the range
+        :param end: Address right after the end of the range; defaults to
+                    the end of the address space
+        """
+        starts, ends, dumps = self._starts, self._ends, self._dumps
+        if end is None:
+            end = ends[-1] if ends else start
+        n = max(bisect_right(starts, start) - 1, 0)
+        out = []
+        while n < len(starts) and starts[n] < end:
+            if ends[n] > start:
+                out.append(
+                    RegionView(dumps[n], max(starts[n], start), min(ends[n], end))
+                )
+            n += 1
+        return out
+
+    def holes(self, start: int | None = None, end: int | None = None) -> list[tuple[int, int]]:
+        """
+        Get the ranges between two dumps that are not covered by any dump,
+        as (start, end) tuples with end excluded.
+
+        :param start: First address to look at; defaults to the start of
+                      the first dump
+        :param end: Address right after the last address to look at;
+                    defaults to the end of the last dump
+        """
+        if not self._starts:
+            return [(start, end)] if start is not None and end is not None and start < end else []
+        if start is None:
+            start = self._starts[0]
+        if end is None:
+            end = self._ends[-1]
+
+        out = []
+        pos = start
+        for region in self.regions(start, end):
+            if region.start > pos:
+                out.append((pos, region.start))
+            pos = region.end
+        if pos < end:
+            out.append((pos, end))
+        return out
+
+
+@dataclass(slots=True)
+class AddressSpaceDiff:
+    """Result of a comparison of two address spaces. See diff_address_spaces."""
+
+    #: Differences between the parts covered by both address spaces, one
+    #: DumpDiff per range covered by a single dump on either side. Ranges
+    #: that are equal are included (as empty diffs).
+    regions: list[DumpDiff] = field(default_factory=list)
+
+    #: Ranges covered only by the first address space, as (start, end)
+    #: tuples with end excluded.
+    only_foo: list[tuple[int, int]] = field(default_factory=list)
+
+    #: Ranges covered only by the second address space.
+    only_bar: list[tuple[int, int]] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.only_foo or self.only_bar or any(self.regions))
+
+    def changed(self) -> list[DumpDiff]:
+        """Get the diffs of the ranges that differ."""
+        return [diff for diff in self.regions if diff]
+
+
+def diff_address_spaces(foo: AddressSpace, bar: AddressSpace) -> AddressSpaceDiff:
+    """
+    Compare two captures of an address space, range by range.
+
+    The address spaces are walked in address order, and every range covered
+    by a single dump on both sides is compared with diff_dumps, so the
+    comparison works on the dumps' storage and skips equal chunks. The
+    dumps do not need to be split along the same lines on both sides.
+
+    Raises ValueError if a range is covered on both sides by dumps with
+    different address widths.
+    """
+    out = AddressSpaceDiff()
+    foo_regions = foo.regions()
+    bar_regions = bar.regions()
+    i = j = 0
+    # Start of the part of the current region that was not compared yet,
+    # on each side
+    foo_pos = foo_regions[0].start if foo_regions else 0
+    bar_pos = bar_regions[0].start if bar_regions else 0
+
+    def add_range(ranges: list[tuple[int, int]], start: int, end: int):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+
+    while i < len(foo_regions) and j < len(bar_regions):
+        foo_region, bar_region = foo_regions[i], bar_regions[j]
+        foo_pos = max(foo_pos, foo_region.start)
+        bar_pos = max(bar_pos, bar_region.start)
+
+        if foo_pos < bar_pos:
+            end = min(foo_region.end, bar_pos)
+            add_range(out.only_foo, foo_pos, end)
+            foo_pos = end
+        elif bar_pos < foo_pos:
+            end = min(bar_region.end, foo_pos)
+            add_range(out.only_bar, bar_pos, end)
+            bar_pos = end
+        else:
+            end = min(foo_region.end, bar_region.end)
+            foo_view = RegionView(foo_region.dump, foo_pos, end)
+            bar_view = RegionView(bar_region.dump, bar_pos, end)
+            if foo_region.dump.stride != bar_region.dump.stride:
+                raise ValueError(
+                    f"{foo_region.dump.filename} and {bar_region.dump.filename} "
+                    f"have different address widths"
+                )
+            if len(foo_view):
+                out.regions.append(diff_dumps(foo_view.as_dump(), bar_view.as_dump()))
+            foo_pos = bar_pos = end
+
+        if foo_pos >= foo_region.end:
+            i += 1
+        if bar_pos >= bar_region.end:
+            j += 1
+
+    for region in foo_regions[i:]:
+        add_range(out.only_foo, max(foo_pos, region.start), region.end)
+    for region in bar_regions[j:]:
+        add_range(out.only_bar, max(bar_pos, region.start), region.end)
+    return out
@@ -0,0 +1,348 @@
+# SPDX-License-Identifier: MIT
+"""
+Content-addressed storage for large numbers of dumps.
+
+Dumps are split into chunks of CHUNK_SIZE registers, and every chunk is
+stored once under the hash of its contents, so chunks that are the same
+across dumps (the common case for repeated captures of a block) only take
+up space once. A snapshot can also be stored as a delta against another
+snapshot, in which case only the chunks that differ from the base are
+recorded, each as the XOR of the chunk and the base's chunk. Only the
+registers that changed are non-zero in that XOR, so it compresses down to
+little more than the changes.
+
+Layout of an archive directory:
+
+* objects/XX/YYYY...: zlib-compressed chunks and chunk deltas, named by the
+  SHA-256 hash of their uncompressed contents (the chunk's values, as
+  little-endian integers, followed by its part of the validity bitmap);
+* snapshots/NAME: marshal-serialized manifest of a snapshot.
+"""
+
+from array import array
+from collections.abc import Iterator
+from functools import cached_property
+from hashlib import sha256
+import marshal
+import os
+import sys
+import zlib
+
+from .dump import Dump, _typecode_for_bits
+
+#: Version of the on-disk manifest format; bump when it changes.
+ARCHIVE_VERSION = 2
+
+#: Amount of registers per chunk. Must be a multiple of 8, so that chunks
+#: line up with the validity bitmap.
+CHUNK_SIZE = 1024
+
+
+def _values_le(dump: Dump) -> memoryview:
+    """Get the bytes of a dump's values, as little-endian integers."""
+    values = dump.values
+    if sys.byteorder != "little":
+        values = array(_typecode_for_bits(dump.val_bits), values)
+        values.byteswap()
+    return memoryview(values).cast("B")
+
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    """XOR two byte strings of the same length."""
+    return (
+        int.from_bytes(a, "little") ^ int.from_bytes(b, "little")
+    ).to_bytes(len(a), "little")
+
+
+class ArchivedDump(Dump):
+    """
+    Dump stored in an Archive.
+
+    The header is read from the snapshot's manifest; the values are only
+    reconstructed from the chunks on first access.
+    """
+
+    def __init__(
+        self,
+        archive: "Archive",
+        name: str,
+        header: dict[str, str],
+        chunks: list[tuple[str, ...]]
+    ):
+        """
+        :param archive: Archive the dump is stored in
+        :param name: Name of the snapshot
+        :param header: Header of the dump
+        :param chunks: Hashes of the dump's chunks, in address order; each
+                       is the hash of a full chunk followed by the hashes of
+                       the deltas to apply to it, as from
+                       Archive._resolve_chunks
+        """
+        self.archive = archive
+        self.name = name
+        self.filename = f"{archive.path}:{name}"
+        self.header = dict(header)
+        self._chunks = chunks
+        self._check_validity()
+
+    @cached_property
+    def _store(self) -> tuple[array, bytearray]:
+        typecode = _typecode_for_bits(self.val_bits)
+        values = array(typecode)
+        itemsize = values.itemsize
+        valid = bytearray()
+        raw = bytearray()
+
+        # Repeated chunks (e.g. all-zero ranges) are only decompressed once.
+        seen: dict[str, bytes] = {}
+        for n, hashes in enumerate(self._chunks):
+            chunk = self.archive._read_chunk(hashes, seen)
+            count = min(CHUNK_SIZE, self.count - n * CHUNK_SIZE)
+            raw += chunk[:count * itemsize]
+            valid += chunk[count * itemsize:]
+
+        values.frombytes(raw)
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values, valid
+
+
+class Archive:
+    """Content-addressed store of dumps; see the module documentation."""
+
+    def __init__(self, path: str | os.PathLike):
+        """
+        :param path: Archive directory; created if it does not exist
+        """
+        self.path = os.fspath(path)
+        self._objects_dir = os.path.join(self.path, "objects")
+        self._snapshots_dir = os.path.join(self.path, "snapshots")
+        os.makedirs(self._objects_dir, exist_ok=True)
+        os.makedirs(self._snapshots_dir, exist_ok=True)
+
+    # -- Objects --
+
+    def _object_path(self, chunk_hash: str) -> str:
+        return os.path.join(self._objects_dir, chunk_hash[:2], chunk_hash[2:])
+
+    def _read_object(self, chunk_hash: str) -> bytes:
+        with open(self._object_path(chunk_hash), "rb") as object_file:
+            return zlib.decompress(object_file.read())
+
+    def _read_chunk(self, hashes: tuple[str, ...], seen: dict[str, bytes]) -> bytes:
+        """
+        Reconstruct a chunk from the hash of a full chunk and the hashes of
+        the deltas to apply to it.
+
+        :param seen: Objects that were already read, by hash; updated with
+                     the objects read here
+        """
+        chunk = None
+        for chunk_hash in hashes:
+            data = seen.get(chunk_hash)
+            if data is None:
+                data = seen[chunk_hash] = self._read_object(chunk_hash)
+            chunk = data if chunk is None else _xor(chunk, data)
+        return chunk
+
+    def _write_object(self, chunk: bytes) -> str:
+        """Store a chunk, unless it is already stored; returns its hash."""
+        chunk_hash = sha256(chunk).hexdigest()
+        path = self._object_path(chunk_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_file(path, zlib.compress(chunk))
+        return chunk_hash
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as out_file:
+            out_file.write(data)
+        os.replace(tmp_path, path)
+
+    # -- Snapshots --
+
+    def _snapshot_path(self, name: str) -> str:
+        if not name or "/" in name or name.startswith(".") or name.endswith(".tmp"):
+            raise ValueError(f"invalid snapshot name: \"{name}\"")
+        return os.path.join(self._snapshots_dir, name)
+
+    def _read_manifest(self, name: str) -> tuple:
+        """
+        Get the (header, base, chunks) manifest of a snapshot.
+
+        For full snapshots, chunks is a tuple of chunk hashes; for deltas, it
+        is a dict mapping the index of each chunk that differs from the base
+        to the hash of its delta.
+        """
+        try:
+            with open(self._snapshot_path(name), "rb") as manifest_file:
+                version, header, base, chunks = marshal.load(manifest_file)
+        except FileNotFoundError:
+            raise KeyError(name) from None
+        if version != ARCHIVE_VERSION:
+            raise ValueError(f"snapshot {name} has unsupported version {version}")
+        return header, base, chunks
+
+    def _write_manifest(self, name: str, header: dict, base: str | None, chunks):
+        self._write_file(
+            self._snapshot_path(name),
+            marshal.dumps((ARCHIVE_VERSION, header, base, chunks))
+        )
+
+    def _resolve_chunks(self, name: str) -> tuple[dict, list[tuple[str, ...]]]:
+        """
+        Get the header and the chunks of a snapshot; see ArchivedDump.
+
+        Only the manifests are read; the deltas are applied once the chunks
+        are read.
+        """
+        header, base, chunks = self._read_manifest(name)
+        if base is None:
+            return header, [(chunk_hash,) for chunk_hash in chunks]
+        _base_header, out = self._resolve_chunks(base)
+        for index, delta_hash in chunks.items():
+            out[index] += (delta_hash,)
+        return header, out
+
+    def names(self) -> list[str]:
+        """Get the names of all snapshots, sorted."""
+        return sorted(
+            name for name in os.listdir(self._snapshots_dir)
+            if not name.endswith(".tmp")
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names())
+
+    def __len__(self) -> int:
+        return len(self.names())
+
+    def __contains__(self, name) -> bool:
+        try:
+            return os.path.exists(self._snapshot_path(name))
+        except ValueError:
+            return False
+
+    def base_of(self, name: str) -> str | None:
+        """Get the name of the snapshot a snapshot is a delta against, if any."""
+        return self._read_manifest(name)[1]
+
+    def add(self, dump: Dump, name: str | None = None, base: str | None = None) -> str:
+        """
+        Store a dump.
+
+        :param dump: Dump to store
+        :param name: Name of the snapshot; defaults to the dump's filename
+                     without its directory
+        :param base: Name of a snapshot of the same block to store the dump
+                     as a delta against, if any
+        :return: Name of the snapshot
+        """
+        if name is None:
+            name = os.path.basename(os.fspath(dump.filename))
+        if name in self:
+            raise ValueError(f"snapshot {name} already exists")
+
+        values = _values_le(dump)
+        valid = memoryview(dump.valid).cast("B")
+        itemsize = array(_typecode_for_bits(dump.val_bits)).itemsize
+
+        def chunks() -> Iterator[bytes]:
+            for start in range(0, dump.count, CHUNK_SIZE):
+                end = min(start + CHUNK_SIZE, dump.count)
+                yield bytes(values[start * itemsize:end * itemsize]) + \
+                    bytes(valid[start >> 3:(end + 7) >> 3])
+
+        header = dict(dump.header)
+        if base is None:
+            self._write_manifest(
+                name, header, None, tuple(map(self._write_object, chunks()))
+            )
+            return name
+
+        base_dump = self.load(base)
+        if (base_dump.base_addr, base_dump.addr_bits, base_dump.val_bits, base_dump.count) \
+                != (dump.base_addr, dump.addr_bits, dump.val_bits, dump.count):
+            raise ValueError(f"{name} does not cover the same block as {base}")
+
+        delta = {}
+        seen: dict[str, bytes] = {}
+        for index, (chunk, base_hashes) in enumerate(zip(chunks(), base_dump._chunks)):
+            base_chunk = self._read_chunk(base_hashes, seen)
+            if chunk != base_chunk:
+                delta[index] = self._write_object(_xor(chunk, base_chunk))
+        self._write_manifest(name, header, base, delta)
+        return name
+
+    def load(self, name: str) -> ArchivedDump:
+        """
+        Get a stored dump. The dump's values are only reconstructed once
+        they are accessed.
+        """
+        header, chunks = self._resolve_chunks(name)
+        return ArchivedDump(self, name, header, chunks)
+
+    def __getitem__(self, name: str) -> ArchivedDump:
+        return self.load(name)
+
+    def remove(self, name: str):
+        """
+        Remove a snapshot. Snapshots that are deltas against it are turned
+        into full snapshots first. The chunks are only removed by gc().
+        """
+        self._read_manifest(name)
+        for other in self.names():
+            if other != name and self.base_of(other) == name:
+                self.flatten(other)
+        os.remove(self._snapshot_path(name))
+
+    def flatten(self, name: str):
+        """Turn a delta snapshot into a full snapshot."""
+        header, chunks = self._resolve_chunks(name)
+        seen: dict[str, bytes] = {}
+        self._write_manifest(name, header, None, tuple(
+            hashes[0] if len(hashes) == 1
+            else self._write_object(self._read_chunk(hashes, seen))
+            for hashes in chunks
+        ))
+
+    def gc(self) -> tuple[int, int]:
+        """
+        Remove chunks that are not used by any snapshot, as well as leftover
+        temporary files.
+
+        :return: Amount of removed files and the amount of bytes freed
+        """
+        used = set()
+        for name in self.names():
+            _header, _base, chunks = self._read_manifest(name)
+            used.update(chunks.values() if isinstance(chunks, dict) else chunks)
+
+        removed = freed = 0
+        for dirpath, _dirnames, filenames in os.walk(self._objects_dir):
+            prefix = os.path.basename(dirpath)
+            for filename in filenames:
+                if not filename.endswith(".tmp") and prefix + filename in used:
+                    continue
+                path = os.path.join(dirpath, filename)
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+        for filename in os.listdir(self._snapshots_dir):
+            if filename.endswith(".tmp"):
+                path = os.path.join(self._snapshots_dir, filename)
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+
+        return removed, freed
+
+    def disk_usage(self) -> int:
+        """Get the total size of the archive's files, in bytes."""
+        total = 0
+        for dirpath, _dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+        return total
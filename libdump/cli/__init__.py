@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: MIT
+"""
+Command-line tools, usable as subcommands of "python -m libdump" or through
+the scripts in the repository root.
+
+Each tool is a module with a DESCRIPTION, an add_arguments(argparser)
+function that adds the tool's arguments, and a run(args) function. Tools
+only import what they need once they are run, so that setting up the
+argument parser for all of them stays cheap.
+"""
+
+import argparse
+import importlib
+from types import ModuleType
+
+from .. import stats
+from ..config import ConfigError
+
+#: Subcommands of "python -m libdump", with the modules implementing them.
+COMMANDS = {
+    "diff": "libdump.cli.diff",
+    "commands": "libdump.cli.commands",
+    "split": "libdump.cli.split",
+    "symbols": "libdump.cli.symbols",
+    "annotate": "libdump.cli.annotate",
+    "convert": "libdump.cli.convert",
+    "archive": "libdump.cli.archive",
+    "index": "libdump.cli.index",
+    "series": "libdump.cli.series",
+    "space": "libdump.cli.space",
+}
+
+
+class UsageError(Exception):
+    """Raised by a tool's run() for invalid combinations of arguments."""
+
+
+def load_tool(command: str) -> ModuleType:
+    """Get the module implementing a subcommand."""
+    return importlib.import_module(COMMANDS[command])
+
+
+def add_tool_arguments(tool: ModuleType, argparser: argparse.ArgumentParser):
+    """Add a tool's arguments to a parser, along with the --profile options."""
+    tool.add_arguments(argparser)
+    stats.add_arguments(argparser)
+
+
+def run_tool(tool: ModuleType, argparser: argparse.ArgumentParser, args: argparse.Namespace):
+    """
+    Run a tool with the parsed arguments. UsageErrors and missing or invalid
+    settings are reported as usage errors of the parser, like invalid
+    arguments.
+    """
+    try:
+        tool.run(args)
+    except (UsageError, ConfigError) as e:
+        argparser.error(str(e))
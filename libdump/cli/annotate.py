@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: MIT
+"""Annotate an MMIO trace with block, register and field names."""
+
+import argparse
+import contextlib
+import sys
+
+from .. import config, stats
+
+DESCRIPTION = "Annotate an MMIO trace with block, register and field names"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    argparser.add_argument("trace", help="trace file; - for stdin")
+    argparser.add_argument("-o", "--output", default="-", help="file to write the annotated trace to (default: stdout)")
+    argparser.add_argument("-d", "--doc", help="path to dfmt doc file to take names from, instead of the RDB headers")
+    argparser.add_argument("--base-addr", type=lambda x: int(x, 0),
+                           help="absolute address of the block documented by --doc (default: the doc's base address)")
+    argparser.add_argument("-a", "--all-fields", action="store_true",
+                           help="list the value of every field on every access, not just the fields that changed")
+    argparser.add_argument("--batch-size", type=int,
+                           help="amount of lines to process at once (default: libdump.trace.DEFAULT_BATCH_SIZE)")
+    config.add_arguments(argparser)
+
+
+def run(args: argparse.Namespace):
+    from ..trace import DEFAULT_BATCH_SIZE, doc_lookup, format_trace, sysmap_lookup
+
+    cfg = config.from_args(args)
+    doc_cache = None
+    if cfg.doc_cache:
+        from ..doc_cache import DocCache
+        doc_cache = DocCache()
+    batch_size = args.batch_size or DEFAULT_BATCH_SIZE
+
+    if args.doc:
+        from ..doc import DFmtDoc
+        doc = doc_cache.load(args.doc, DFmtDoc, args.doc) if doc_cache else DFmtDoc(args.doc)
+        lookup = doc_lookup(doc, base_addr=args.base_addr)
+    else:
+        from ..ext.doc_kona_rdb import SysmapIndex
+        index = SysmapIndex(cfg.sysmap_path, doc_cache=doc_cache)
+        lookup = sysmap_lookup(index)
+
+    batch = []
+    with stats.timer("trace.annotate"), contextlib.ExitStack() as files:
+        # stdin and stdout are left open
+        in_file = sys.stdin if args.trace == "-" else files.enter_context(open(args.trace))
+        out_file = sys.stdout if args.output == "-" else files.enter_context(open(args.output, "w"))
+        for line in format_trace(in_file, lookup, args.all_fields, batch_size):
+            batch.append(line)
+            if len(batch) >= batch_size:
+                batch.append("")
+                out_file.write("\n".join(batch))
+                batch.clear()
+        if batch:
+            batch.append("")
+            out_file.write("\n".join(batch))
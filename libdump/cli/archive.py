@@ -0,0 +1,66 @@
+# SPDX-License-Identifier: MIT
+"""Store dumps in a deduplicating archive."""
+
+import argparse
+
+from ..dump import BINARY_FMT, TEXT_FMT
+from . import UsageError
+
+DESCRIPTION = "Store dumps in a deduplicating archive"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    argparser.add_argument("archive", help="path to the archive directory")
+    subparsers = argparser.add_subparsers(dest="subcommand", required=True)
+
+    add_parser = subparsers.add_parser("add", help="add dumps to the archive")
+    add_parser.add_argument("dumps", nargs="+")
+    add_parser.add_argument("-n", "--name",
+                            help="name of the snapshot (default: the dump's filename); only valid with a single dump")
+    add_parser.add_argument("-b", "--base",
+                            help="store the dumps as deltas against this snapshot")
+
+    subparsers.add_parser("list", help="list the snapshots in the archive")
+
+    extract_parser = subparsers.add_parser("extract", help="write a snapshot out as a dump file")
+    extract_parser.add_argument("name")
+    extract_parser.add_argument("target")
+    extract_parser.add_argument("-f", "--format", choices=(TEXT_FMT, BINARY_FMT), default=TEXT_FMT,
+                                help="format to write (default: %(default)s)")
+
+    remove_parser = subparsers.add_parser("remove", help="remove snapshots; run gc afterwards to free up space")
+    remove_parser.add_argument("names", nargs="+")
+
+    flatten_parser = subparsers.add_parser("flatten", help="turn delta snapshots into full snapshots")
+    flatten_parser.add_argument("names", nargs="+")
+
+    subparsers.add_parser("gc", help="remove data that is no longer used by any snapshot")
+
+
+def run(args: argparse.Namespace):
+    from ..archive import Archive
+    from ..dump import Dump, dump_to_file
+
+    archive = Archive(args.archive)
+
+    if args.subcommand == "add":
+        if args.name and len(args.dumps) > 1:
+            raise UsageError("--name can only be used with a single dump")
+        for path in args.dumps:
+            name = archive.add(Dump(path), name=args.name, base=args.base)
+            print(f"Added {name}")
+    elif args.subcommand == "list":
+        for name in archive:
+            base = archive.base_of(name)
+            print(f"{name} (delta against {base})" if base else name)
+    elif args.subcommand == "extract":
+        dump_to_file(archive[args.name], args.target, args.format)
+    elif args.subcommand == "remove":
+        for name in args.names:
+            archive.remove(name)
+    elif args.subcommand == "flatten":
+        for name in args.names:
+            archive.flatten(name)
+    elif args.subcommand == "gc":
+        removed, freed = archive.gc()
+        print(f"Removed {removed} files, freed {freed} bytes")
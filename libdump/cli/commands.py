@@ -0,0 +1,54 @@
+# SPDX-License-Identifier: MIT
+"""Turn the differences between two dumps into commands that write them back."""
+
+import argparse
+
+DESCRIPTION = "Generate commands for dumping diffed values"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    argparser.add_argument("foo", help="Dump of current state")
+    argparser.add_argument("bar", help="Dump to replace the current state")
+    argparser.add_argument("-p", "--patch", metavar="FILE",
+                           help="write a patch file for tools-ondev/apply-patch.py instead of printing commands")
+    argparser.add_argument("-m", "--masked", action="store_true",
+                           help="only write the bits that changed, keeping the other bits as they are on the device (read-modify-write); only applies to patch files")
+
+
+def run(args: argparse.Namespace):
+    from ..diff import diff_dumps
+    from ..dump import Dump
+
+    # -- Prepare dumps --
+    foo = Dump(args.foo)
+    bar = Dump(args.bar)
+
+    # -- Do a diff --
+    # Only registers that are readable in the target dump can be written back.
+    dump_diff = diff_dumps(foo, bar)
+
+    if args.patch:
+        from ..patch import diff_to_patch, patch_to_file
+        patch = diff_to_patch(foo, bar, diff=dump_diff, masked=args.masked)
+        patch_to_file(patch, args.patch)
+        return
+
+    diff = {}
+    for addr in sorted([*dump_diff.changed, *dump_diff.became_readable]):
+        diff[addr] = bar.data[addr]
+
+    # -- Format the diff into commands --
+    if foo.type == "i2c":
+        i2c_bus = foo.header.get("i2c_bus", "0")
+        dev_addr = foo.header.get("dev_addr", "0xFIXME")
+        for addr, val in diff.items():
+            print(f"sudo i2cset -f -y {i2c_bus} {dev_addr} {hex(addr)} {hex(val)}")
+    elif foo.type == "mmio":
+        if foo.val_bits == 32:
+            devmem_mode = "w"
+        elif foo.val_bits == 16:
+            devmem_mode = "h"
+        elif foo.val_bits == 8:
+            devmem_mode = "b"
+        for addr, val in diff.items():
+            print(f"sudo devmem2 {hex(addr)} {devmem_mode} {hex(val)}")
@@ -0,0 +1,27 @@
+# SPDX-License-Identifier: MIT
+"""Convert a dump between the text and binary dump formats."""
+
+import argparse
+
+from ..dump import BINARY_FMT, TEXT_FMT
+
+DESCRIPTION = "Convert a dump between the text and binary dump formats"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    argparser.add_argument("source")
+    argparser.add_argument("target")
+    argparser.add_argument("-f", "--format", choices=(TEXT_FMT, BINARY_FMT),
+                           help="format to convert to (default: the opposite of the source format)")
+
+
+def run(args: argparse.Namespace):
+    from ..dump import Dump, dump_to_file
+
+    dump = Dump(args.source)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = TEXT_FMT if dump.header["fmt"] == BINARY_FMT else BINARY_FMT
+
+    dump_to_file(dump, args.target, fmt)
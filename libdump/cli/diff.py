@@ -0,0 +1,291 @@
+# SPDX-License-Identifier: MIT
+"""Generate a human-readable HTML diff of two dumps."""
+
+import argparse
+import os
+import sys
+
+from .. import config, stats
+
+DESCRIPTION = "Generate a human-readable diff of two dumps"
+
+TEMPLATE = "_generate_dump_diff_tmpl.html"
+INDEX_TEMPLATE = "_generate_dump_diff_index_tmpl.html"
+
+#: Directory the diffs are written to.
+OUT_DIR = "generated-dumps"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    argparser.add_argument("foo")
+    argparser.add_argument("bar")
+    argparser.add_argument("-d", "--doc", help="path to dfmt doc file")
+    argparser.add_argument("-c", "--changed-only", action="store_true",
+                           help="only show registers that differ between the dumps")
+    argparser.add_argument("-C", "--context", type=int, default=0, metavar="N",
+                           help="show N registers around each changed register (implies --changed-only)")
+    argparser.add_argument("-p", "--page-size", type=int, default=0, metavar="N",
+                           help="split the diff into linked pages of N rows each, plus an index page")
+    argparser.add_argument("-w", "--watch", type=float, nargs="?", const=1.0, metavar="SECONDS",
+                           help="keep watching the dumps for changes (e.g. while they are still being captured), checking every SECONDS seconds (default: 1), and update the diff as they change; pages are then split by address")
+    argparser.add_argument("--verify", action="store_true",
+                           help="with --watch, check the whole files for changes on every update instead of assuming that growing files were only appended to")
+    argparser.add_argument("--no-open", action="store_true",
+                           help="do not open the generated diff in a browser")
+    argparser.add_argument("--no-template-cache", action="store_true",
+                           help="always compile the HTML templates from source instead of using the cached bytecode")
+    config.add_arguments(argparser)
+
+
+def page_filename(number: int) -> str:
+    return f"page_{number:04d}.html"
+
+
+def _load_doc(args: argparse.Namespace, cfg: config.Config, base_addr: int):
+    """Get the doc to take names from, if any."""
+    from ..doc import DFmtDoc
+
+    if cfg.doc_cache:
+        from ..doc_cache import DocCache
+        load_doc = DocCache().load
+    else:
+        def load_doc(source, cls, *cls_args):
+            return cls(*cls_args)
+
+    if args.doc:
+        return load_doc(args.doc, DFmtDoc, args.doc)
+
+    # Default to RDB doc autolookup
+    from ..ext.doc_kona_rdb import KonaRdbDoc, lookup_header_from_sysmap
+    hdr = lookup_header_from_sysmap(base_addr, cfg.sysmap_path)
+    if hdr is None:
+        print(f"No RDB header found for base address {base_addr}")
+        return None
+    return load_doc(hdr, KonaRdbDoc, base_addr, hdr)
+
+
+def run(args: argparse.Namespace):
+    import datetime
+    import subprocess
+    import time
+    from ..diff import diff_dumps, diff_rows
+    from ..dump import Dump
+    from ..templates import DEFAULT_CACHE_DIR, load_template
+
+    cfg = config.from_args(args)
+    if args.no_template_cache:
+        cfg.template_cache = False
+
+    # -- Prepare dumps --
+    watcher = None
+    if args.watch is not None:
+        from ..watch import DiffWatcher
+        watcher = DiffWatcher(args.foo, args.bar)
+        watcher.update()
+        while watcher.diff is None:
+            time.sleep(args.watch)
+            watcher.update()
+        foo, bar, diff = watcher.foo.dump, watcher.bar.dump, watcher.diff
+    else:
+        foo = Dump(args.foo)
+        bar = Dump(args.bar)
+
+        diff = diff_dumps(foo, bar)
+
+    # -- Prepare docs --
+    doc = _load_doc(args, cfg, foo.base_addr)
+
+    cache_dir = DEFAULT_CACHE_DIR if cfg.template_cache else None
+    with stats.timer("template.compile"):
+        template = load_template(TEMPLATE, cache_dir)
+
+    now = datetime.datetime.now().strftime("%Y%m%d-%H-%M%-S")
+
+    if watcher is not None:
+        with stats.timer("template.compile"):
+            index_template = load_template(INDEX_TEMPLATE, cache_dir)
+        _watch(args, watcher, doc, template, index_template, now)
+        return
+
+    # -- Generate HTML table --
+    rows = diff_rows(
+        foo, bar, diff=diff, doc=doc,
+        changed_only=args.changed_only or args.context > 0,
+        context=args.context
+    )
+    if stats.enabled:
+        rows = stats.counted(rows, "diff.rows")
+
+    if not args.page_size:
+        os.makedirs(OUT_DIR, exist_ok=True)
+        filename = os.path.join(OUT_DIR, f"dump_diff_{now}.html")
+        with stats.timer("render"), open(filename, "w+") as dump_file:
+            # Stream the output instead of rendering it into a string first.
+            dump_file.writelines(template.generate(foo=foo, bar=bar, rows=rows))
+            stats.count("render.bytes_written", dump_file.tell())
+    else:
+        with stats.timer("template.compile"):
+            index_template = load_template(INDEX_TEMPLATE, cache_dir)
+        filename = _render_paged(args, foo, bar, rows, template, index_template, now)
+
+    if not args.no_open:
+        subprocess.Popen(["xdg-open", filename])
+
+
+def _render_paged(args, foo, bar, rows, template, index_template, now: str) -> str:
+    """Render the diff as linked pages plus an index page; returns the index's path."""
+    import itertools
+
+    out_dir = os.path.join(OUT_DIR, f"dump_diff_{now}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Only the current and the next page are held in memory at once; the
+    # next page is needed to know whether to link to it.
+    pages = []
+    next_rows = list(itertools.islice(rows, args.page_size))
+    number = 0
+    while next_rows:
+        number += 1
+        page_rows = next_rows
+        next_rows = list(itertools.islice(rows, args.page_size))
+
+        page = {
+            "number": number,
+            "filename": page_filename(number),
+            "prev": page_filename(number - 1) if number > 1 else None,
+            "next": page_filename(number + 1) if next_rows else None,
+        }
+        with stats.timer("render"), \
+             open(os.path.join(out_dir, page["filename"]), "w+") as page_file:
+            page_file.writelines(
+                template.generate(foo=foo, bar=bar, rows=page_rows, page=page)
+            )
+            stats.count("render.bytes_written", page_file.tell())
+
+        pages.append({
+            "number": number,
+            "filename": page["filename"],
+            "first_addr": page_rows[0].addr,
+            "last_addr": page_rows[-1].addr,
+            "changed": sum(row.changed for row in page_rows),
+        })
+
+    filename = os.path.join(out_dir, "index.html")
+    with open(filename, "w+") as index_file:
+        index_file.writelines(index_template.generate(foo=foo, bar=bar, pages=pages))
+    return filename
+
+
+def _watch(args, watcher, doc, template, index_template, now: str):
+    """
+    Keep the diff up to date while the dumps change, until interrupted.
+
+    Pages cover fixed ranges of addresses, so that a change only requires
+    the pages (and the index) covering the changed registers to be rendered
+    again.
+    """
+    from bisect import bisect_left, bisect_right
+    import subprocess
+    import time
+    from ..diff import diff_rows
+
+    foo, bar, diff = watcher.foo.dump, watcher.bar.dump, watcher.diff
+    out_dir = os.path.join(OUT_DIR, f"dump_diff_{now}")
+    os.makedirs(out_dir, exist_ok=True)
+    refresh = max(int(args.watch), 1)
+
+    def page_count() -> int:
+        return -(-min(foo.count, bar.count) // page_size)
+
+    def render_page(number: int):
+        window = range((number - 1) * page_size, number * page_size)
+        rows = diff_rows(
+            foo, bar, diff=diff, doc=doc,
+            changed_only=args.changed_only or args.context > 0,
+            context=args.context, window=window
+        )
+        page = {
+            "number": number,
+            "filename": page_filename(number),
+            "prev": page_filename(number - 1) if number > 1 else None,
+            "next": page_filename(number + 1) if number < page_count() else None,
+        }
+        with stats.timer("render"), \
+             open(os.path.join(out_dir, page["filename"]), "w") as page_file:
+            page_file.writelines(template.generate(
+                foo=foo, bar=bar, rows=rows, page=page if args.page_size else None,
+                refresh=refresh
+            ))
+
+    def render_index():
+        pages = []
+        for number in range(1, page_count() + 1):
+            first_addr = foo.base_addr + (number - 1) * page_size * foo.stride
+            last_addr = min(first_addr + (page_size - 1) * foo.stride,
+                            foo.base_addr + (min(foo.count, bar.count) - 1) * foo.stride)
+            pages.append({
+                "number": number,
+                "filename": page_filename(number),
+                "first_addr": first_addr,
+                "last_addr": last_addr,
+                "changed": bisect_right(diff.changed, last_addr) - bisect_left(diff.changed, first_addr),
+            })
+        with open(os.path.join(out_dir, "index.html"), "w") as index_file:
+            index_file.writelines(index_template.generate(
+                foo=foo, bar=bar, pages=pages, refresh=refresh
+            ))
+
+    def render_all():
+        for number in range(1, page_count() + 1):
+            render_page(number)
+        if args.page_size:
+            render_index()
+
+    def describe(addr: int) -> str:
+        foo_val, bar_val = foo.data[addr], bar.data[addr]
+        foo_str = hex(foo_val) if foo_val != -1 else "-"
+        bar_str = hex(bar_val) if bar_val != -1 else "-"
+        state = "differs" if diff.is_changed(addr) else "equal"
+        return f"{addr:#010x}: {foo_str} {bar_str} ({state})"
+
+    page_size = args.page_size or min(foo.count, bar.count)
+    render_all()
+    filename = os.path.join(out_dir, "index.html" if args.page_size else page_filename(1))
+    if not args.no_open:
+        subprocess.Popen(["xdg-open", filename])
+    print(f"Watching {args.foo} and {args.bar}; writing to {filename}")
+    sys.stdout.flush()
+
+    try:
+        while True:
+            time.sleep(args.watch)
+            result = watcher.update(args.verify)
+            if result is None:
+                # A dump was reloaded, e.g. because its header changed
+                foo, bar, diff = watcher.foo.dump, watcher.bar.dump, watcher.diff
+                page_size = args.page_size or min(foo.count, bar.count)
+                print("Dumps reloaded")
+                render_all()
+                continue
+            indices, addrs = result
+            for addr in addrs:
+                print(describe(addr))
+            sys.stdout.flush()
+            if not indices:
+                continue
+            # With --context, a change also shows up in the rows around it
+            pages = sorted({
+                number
+                for index in indices
+                for number in range(
+                    max(index - args.context, 0) // page_size + 1,
+                    (index + args.context) // page_size + 2
+                )
+            })
+            for number in pages:
+                if number <= page_count():
+                    render_page(number)
+            if args.page_size and addrs:
+                render_index()
+    except KeyboardInterrupt:
+        pass
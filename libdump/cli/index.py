@@ -0,0 +1,67 @@
+# SPDX-License-Identifier: MIT
+"""Index directories of dumps and search them by register values."""
+
+import argparse
+
+from . import UsageError
+
+DESCRIPTION = "Index directories of dumps and search them by register values"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    argparser.add_argument("index", help="path to the index directory")
+    subparsers = argparser.add_subparsers(dest="subcommand", required=True)
+
+    update_parser = subparsers.add_parser("update", help="add new and modified dumps to the index")
+    update_parser.add_argument("paths", nargs="+", help="dump files or directories to search for dumps")
+
+    subparsers.add_parser("blocks", help="list the indexed blocks")
+
+    values_parser = subparsers.add_parser("values", help="list the values of a register across all dumps")
+    values_parser.add_argument("block", help="block name, as listed by the blocks command")
+    values_parser.add_argument("addr", type=lambda x: int(x, 0))
+
+    query_parser = subparsers.add_parser("query", help="find dumps by register value")
+    query_parser.add_argument("block", help="block name, as listed by the blocks command")
+    query_parser.add_argument("addr", type=lambda x: int(x, 0))
+    query_parser.add_argument("-v", "--value", type=lambda x: int(x, 0),
+                              help="value to look for; with --mask, the value of the masked bits")
+    query_parser.add_argument("-m", "--mask", type=lambda x: int(x, 0),
+                              help="only compare the bits set in the mask (default: all bits set, unless --value is given)")
+
+    field_parser = subparsers.add_parser("field", help="find dumps by the value of a documented field")
+    field_parser.add_argument("block", help="block name, as listed by the blocks command")
+    field_parser.add_argument("field", help="field name, or REGISTER.FIELD")
+    field_parser.add_argument("-d", "--doc", required=True, help="path to dfmt doc file")
+    field_parser.add_argument("-v", "--value", type=lambda x: int(x, 0),
+                              help="value of the field (default: all bits of the field set)")
+
+
+def run(args: argparse.Namespace):
+    from ..doc import DFmtDoc
+    from ..index import DumpIndex
+
+    index = DumpIndex(args.index)
+
+    if args.subcommand == "update":
+        added, removed = index.update(args.paths)
+        print(f"Indexed {added} dumps, removed {removed} dumps")
+    elif args.subcommand == "blocks":
+        for block, count in index.blocks().items():
+            print(f"{block} ({count} dumps)")
+    elif args.subcommand == "values":
+        for value, paths in index.values(args.block, args.addr).items():
+            print(f"{hex(value)}:")
+            for path in paths:
+                print(f"  {path}")
+    else:
+        if args.subcommand == "field":
+            paths = index.with_field(args.block, DFmtDoc(args.doc), args.field, args.value)
+        elif args.mask is None and args.value is not None:
+            paths = index.with_value(args.block, args.addr, args.value)
+        elif args.mask is None:
+            raise UsageError("either --value or --mask is required")
+        else:
+            paths = index.with_mask(args.block, args.addr, args.mask, args.value)
+        for path in paths:
+            print(path)
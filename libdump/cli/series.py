@@ -0,0 +1,42 @@
+# SPDX-License-Identifier: MIT
+"""Summarize which registers and bits change across many dumps of a block."""
+
+import argparse
+
+from . import UsageError
+
+DESCRIPTION = "Summarize which registers and bits change across many dumps of the same block"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    argparser.add_argument("dumps", nargs="*", help="dumps that do not belong to any group")
+    argparser.add_argument("-g", "--group", nargs="+", action="append", default=[],
+                           metavar=("LABEL", "DUMP"),
+                           help="labelled group of dumps, e.g. '-g screen-on a.val b.val'; can be repeated")
+    argparser.add_argument("-d", "--doc", help="path to dfmt doc file")
+
+
+def run(args: argparse.Namespace):
+    from ..doc import DFmtDoc
+    from ..dump import Dump
+    from ..series import DumpSeries
+
+    paths = []
+    labels = []
+    for path in args.dumps:
+        paths.append(path)
+        labels.append(None)
+    for label, *group_paths in args.group:
+        if not group_paths:
+            raise UsageError(f"group {label} has no dumps")
+        for path in group_paths:
+            paths.append(path)
+            labels.append(label)
+
+    if not paths:
+        raise UsageError("no dumps given")
+
+    doc = DFmtDoc(args.doc) if args.doc else None
+
+    series = DumpSeries([Dump(path) for path in paths], labels)
+    print(series.report(doc), end="")
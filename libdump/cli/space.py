@@ -0,0 +1,73 @@
+# SPDX-License-Identifier: MIT
+"""Merge the dumps of many blocks into one address map, and compare whole captures."""
+
+import argparse
+
+DESCRIPTION = "Merge the dumps of many blocks into one address map, and compare whole captures"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    subparsers = argparser.add_subparsers(dest="subcommand", required=True)
+
+    map_parser = subparsers.add_parser("map", help="list the dumped blocks, the holes between them and overlapping dumps")
+    map_parser.add_argument("paths", nargs="+", help="dump files or directories to search for dumps")
+
+    read_parser = subparsers.add_parser("read", help="print the values in a range of addresses, across block boundaries")
+    read_parser.add_argument("start", type=lambda x: int(x, 0))
+    read_parser.add_argument("end", type=lambda x: int(x, 0), help="address right after the last address to print")
+    read_parser.add_argument("paths", nargs="+", help="dump files or directories to search for dumps")
+
+    diff_parser = subparsers.add_parser("diff", help="compare two captures of the whole address space")
+    diff_parser.add_argument("foo", help="dump file or directory of dumps")
+    diff_parser.add_argument("bar", help="dump file or directory of dumps")
+    diff_parser.add_argument("-v", "--verbose", action="store_true", help="list every differing address")
+
+
+def run(args: argparse.Namespace):
+    from ..address_space import AddressSpace, diff_address_spaces
+
+    if args.subcommand == "map":
+        space = AddressSpace.from_paths(args.paths)
+        for region in space.regions():
+            print(f"{region.start:#010x}-{region.end - 1:#010x} {region.dump.filename}")
+        for start, end in space.holes():
+            print(f"hole: {start:#010x}-{end - 1:#010x}")
+        for overlap in space.overlaps:
+            print(
+                f"overlap: {overlap.start:#010x}-{overlap.end - 1:#010x} "
+                f"{overlap.dump.filename} hides {overlap.hidden.filename}"
+            )
+    elif args.subcommand == "read":
+        space = AddressSpace.from_paths(args.paths)
+        pos = args.start
+        for region in space.regions(args.start, args.end):
+            if region.start > pos:
+                print(f"# {pos:#010x}-{region.start - 1:#010x} not dumped")
+            for addr, value in region.items():
+                print(f"{addr:#010x} {value:#x}" if value != -1 else f"{addr:#010x} -")
+            pos = region.end
+        if pos < args.end:
+            print(f"# {pos:#010x}-{args.end - 1:#010x} not dumped")
+    else:
+        diff = diff_address_spaces(
+            AddressSpace.from_paths([args.foo]), AddressSpace.from_paths([args.bar])
+        )
+        for start, end in diff.only_foo:
+            print(f"only in {args.foo}: {start:#010x}-{end - 1:#010x}")
+        for start, end in diff.only_bar:
+            print(f"only in {args.bar}: {start:#010x}-{end - 1:#010x}")
+        for region in diff.changed():
+            print(
+                f"{region.base_addr:#010x}: {len(region.changed)} changed, "
+                f"{len(region.became_unreadable)} became unreadable, "
+                f"{len(region.became_readable)} became readable"
+            )
+            if args.verbose:
+                for addr, xor in zip(region.changed, region.xor):
+                    print(f"  {addr:#010x} changed bits {xor:#x}")
+                for addr in region.became_unreadable:
+                    print(f"  {addr:#010x} became unreadable")
+                for addr in region.became_readable:
+                    print(f"  {addr:#010x} became readable")
+        if not diff:
+            print("No differences")
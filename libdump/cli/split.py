@@ -0,0 +1,17 @@
+# SPDX-License-Identifier: MIT
+"""Split a dumpall capture into one dump file per block."""
+
+import argparse
+
+DESCRIPTION = "Split the results of dumpall into multiple separate files"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    argparser.add_argument("source")
+    argparser.add_argument("target_dir")
+
+
+def run(args: argparse.Namespace):
+    from ..dumpall import split_dumpall
+
+    split_dumpall(args.source, args.target_dir)
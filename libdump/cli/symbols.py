@@ -0,0 +1,38 @@
+# SPDX-License-Identifier: MIT
+"""
+Generate a list of symbols from RDB headers that can be imported into Ghidra
+(Window -> Script Manager -> ImportSymbolsScript.py).
+"""
+
+import argparse
+import sys
+
+from .. import config
+
+DESCRIPTION = "Generate a Ghidra symbol map from the RDB headers"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    argparser.add_argument("-j", "--processes", type=int,
+                           help="amount of worker processes to parse the headers with (default: amount of CPUs)")
+    config.add_arguments(argparser)
+
+
+def run(args: argparse.Namespace):
+    from ..ext.doc_kona_rdb import load_rdb_docs
+
+    cfg = config.from_args(args)
+    doc_cache = None
+    if cfg.doc_cache:
+        from ..doc_cache import DocCache
+        doc_cache = DocCache()
+
+    # Parse all RDBs listed in the sysmap, in parallel
+    for result in load_rdb_docs(cfg.sysmap_path, processes=args.processes, doc_cache=doc_cache):
+        if not result:
+            print(f"# {result.entry.name}: failed to load rdb: "
+                  f"{result.error_type}: {result.error}", file=sys.stderr)
+            continue
+
+        for addr in result.doc.addresses:
+            print(addr.name, hex(result.doc.base_addr + addr.addr))
@@ -0,0 +1,138 @@
+# SPDX-License-Identifier: MIT
+"""
+Configuration shared by the command-line tools.
+
+Settings are taken from, in order of precedence:
+
+* command-line options (see add_arguments);
+* environment variables (LIBDUMP_RDB_DIR, LIBDUMP_SYSMAP,
+  LIBDUMP_DOC_CACHE, LIBDUMP_TEMPLATE_CACHE);
+* the [libdump] section of the config file, which is read from
+  LIBDUMP_CONFIG or DEFAULT_CONFIG_PATH, e.g.:
+
+      [libdump]
+      rdb_dir = ~/code/downstream/arch/arm/mach-java/include/mach/rdb
+      doc_cache = yes
+
+* the defaults of the Config class.
+"""
+
+import argparse
+from dataclasses import dataclass, fields
+import os
+
+#: Default location of the config file.
+DEFAULT_CONFIG_PATH = os.path.join(
+    os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config")),
+    "libdump", "config.ini"
+)
+
+#: Name of the sysmap header in the RDB directory.
+SYSMAP_NAME = "brcm_rdb_sysmap.h"
+
+_TRUE = ("1", "yes", "true", "on")
+_FALSE = ("0", "no", "false", "off")
+
+
+class ConfigError(ValueError):
+    """Raised when a setting is invalid, or missing while a tool needs it."""
+
+
+@dataclass
+class Config:
+    """Settings of the command-line tools; see the module documentation."""
+
+    #: Directory containing the Kona RDB headers.
+    rdb_dir: str | None = None
+
+    #: Path of the RDB sysmap header; defaults to the one in rdb_dir.
+    sysmap: str | None = None
+
+    #: Whether to load docs through the compiled doc cache.
+    doc_cache: bool = True
+
+    #: Whether to cache compiled templates.
+    template_cache: bool = True
+
+    @property
+    def sysmap_path(self) -> str:
+        """Path of the RDB sysmap header. Raises ConfigError if neither it nor rdb_dir is set."""
+        if self.sysmap is not None:
+            return self.sysmap
+        if self.rdb_dir is None:
+            raise ConfigError(
+                "the location of the RDB headers is not configured; pass --rdb-dir DIR "
+                "(or --sysmap FILE), set LIBDUMP_RDB_DIR (or LIBDUMP_SYSMAP), or set "
+                "rdb_dir in the [libdump] section of the config file "
+                f"(default: {DEFAULT_CONFIG_PATH})"
+            )
+        return os.path.join(self.rdb_dir, SYSMAP_NAME)
+
+    def _set(self, key: str, value: str, source: str):
+        """Set a setting from its string representation."""
+        if key in ("doc_cache", "template_cache"):
+            lowered = value.strip().lower()
+            if lowered not in _TRUE + _FALSE:
+                raise ConfigError(f"{source}: {key} must be a boolean, got \"{value}\"")
+            setattr(self, key, lowered in _TRUE)
+        else:
+            setattr(self, key, os.path.expanduser(value))
+
+
+def load_config(path: str | os.PathLike | None = None) -> Config:
+    """
+    Load the configuration from the config file and the environment.
+
+    :param path: Config file to read; defaults to LIBDUMP_CONFIG or
+                 DEFAULT_CONFIG_PATH. A missing default config file is not
+                 an error, but a missing explicitly given one is.
+    """
+    config = Config()
+    keys = [f.name for f in fields(Config)]
+
+    if path is None:
+        path = os.environ.get("LIBDUMP_CONFIG")
+    if path is not None and not os.path.exists(path):
+        raise FileNotFoundError(f"config file {path} does not exist")
+    if path is None:
+        path = DEFAULT_CONFIG_PATH
+
+    import configparser
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    if parser.has_section("libdump"):
+        for key, value in parser.items("libdump"):
+            if key not in keys:
+                raise ConfigError(f"{path}: unknown setting \"{key}\"")
+            config._set(key, value, path)
+
+    for key in keys:
+        var = f"LIBDUMP_{key.upper()}"
+        if var in os.environ:
+            config._set(key, os.environ[var], var)
+
+    return config
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    """Add the options that override the configuration to a script's arguments."""
+    argparser.add_argument("--config", metavar="FILE",
+                           help=f"config file to read (default: $LIBDUMP_CONFIG or {DEFAULT_CONFIG_PATH})")
+    argparser.add_argument("--rdb-dir", metavar="DIR",
+                           help="directory containing the Kona RDB headers")
+    argparser.add_argument("-s", "--sysmap", metavar="FILE",
+                           help=f"path to the RDB sysmap header (default: {SYSMAP_NAME} in the RDB directory)")
+    argparser.add_argument("--no-doc-cache", action="store_true",
+                           help="always parse docs from source instead of using the compiled doc cache")
+
+
+def from_args(args: argparse.Namespace) -> Config:
+    """Load the configuration, with the overrides given by the options added by add_arguments."""
+    config = load_config(args.config)
+    if args.rdb_dir is not None:
+        config.rdb_dir = args.rdb_dir
+    if args.sysmap is not None:
+        config.sysmap = args.sysmap
+    if args.no_doc_cache:
+        config.doc_cache = False
+    return config
@@ -0,0 +1,356 @@
+# SPDX-License-Identifier: MIT
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+from . import stats
+from .doc import Doc, DocAddr
+from .dump import Dump
+
+#: Amount of registers compared at once. Chunks that are byte-for-byte equal
+#: in both dumps are skipped without looking at individual registers.
+#: Must be a multiple of 8, so that chunks line up with the validity bitmap.
+CHUNK_SIZE = 1024
+
+
+@dataclass(slots=True)
+class DumpDiff:
+    """Result of a comparison of two dumps. See diff_dumps."""
+
+    #: Base address of the compared dumps.
+    base_addr: int
+
+    #: Distance between two consecutive addresses.
+    stride: int
+
+    #: Addresses that are readable in both dumps, but have different values.
+    #: Sorted in ascending order.
+    changed: array = field(default_factory=lambda: array("Q"))
+
+    #: XOR of the two values, for each address in DumpDiff.changed.
+    xor: array = field(default_factory=lambda: array("Q"))
+
+    #: Amount of differing bits, for each address in DumpDiff.changed.
+    changed_bits: array = field(default_factory=lambda: array("B"))
+
+    #: Addresses that are readable in the first dump, but not in the second.
+    became_unreadable: array = field(default_factory=lambda: array("Q"))
+
+    #: Addresses that are unreadable in the first dump, but readable in
+    #: the second.
+    became_readable: array = field(default_factory=lambda: array("Q"))
+
+    def __bool__(self):
+        return bool(
+            self.changed or self.became_unreadable or self.became_readable
+        )
+
+    def mask(self, addr: int) -> int:
+        """Get the mask of bits that changed at the given address."""
+        i = bisect_left(self.changed, addr)
+        if i < len(self.changed) and self.changed[i] == addr:
+            return self.xor[i]
+        return 0
+
+    def is_changed(self, addr: int) -> bool:
+        """Check whether the given address differs between the two dumps."""
+        for addrs in self.changed, self.became_unreadable, self.became_readable:
+            i = bisect_left(addrs, addr)
+            if i < len(addrs) and addrs[i] == addr:
+                return True
+        return False
+
+    def changed_addrs(self) -> list[int]:
+        """Get all addresses that differ in any way, in ascending order."""
+        return sorted(
+            [*self.changed, *self.became_unreadable, *self.became_readable]
+        )
+
+
+@stats.timed("diff.compare")
+def diff_dumps(foo: Dump, bar: Dump) -> DumpDiff:
+    """
+    Compare two dumps of the same block.
+
+    The dumps must have the same base address and address width; if one dump
+    is larger than the other, addresses missing from one of them are treated
+    as unreadable in that dump.
+    """
+    if foo.base_addr != bar.base_addr or foo.stride != bar.stride:
+        raise ValueError("dumps do not cover the same block")
+
+    out = DumpDiff(base_addr=foo.base_addr, stride=foo.stride)
+    base_addr = foo.base_addr
+    stride = foo.stride
+
+    foo_values, bar_values = foo.values, bar.values
+    foo_valid, bar_valid = foo.valid, bar.valid
+    common = min(foo.count, bar.count)
+
+    # Equal chunks are found by comparing the raw bytes, which only works
+    # if both dumps store their values the same way.
+    itemsize = memoryview(foo_values).itemsize
+    fast = itemsize == memoryview(bar_values).itemsize
+    if fast:
+        foo_bytes = memoryview(foo_values).cast("B")
+        bar_bytes = memoryview(bar_values).cast("B")
+        foo_valid_bytes = memoryview(foo_valid).cast("B")
+        bar_valid_bytes = memoryview(bar_valid).cast("B")
+
+    for start in range(0, common, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, common)
+        if (
+            fast and end - start == CHUNK_SIZE
+            and foo_bytes[start * itemsize:end * itemsize]
+            == bar_bytes[start * itemsize:end * itemsize]
+            and foo_valid_bytes[start >> 3:end >> 3]
+            == bar_valid_bytes[start >> 3:end >> 3]
+        ):
+            continue
+
+        for i in range(start, end):
+            foo_ok = foo_valid[i >> 3] >> (i & 7) & 1
+            bar_ok = bar_valid[i >> 3] >> (i & 7) & 1
+            if foo_ok and bar_ok:
+                xor = foo_values[i] ^ bar_values[i]
+                if xor:
+                    out.changed.append(base_addr + i * stride)
+                    out.xor.append(xor)
+                    out.changed_bits.append(xor.bit_count())
+            elif foo_ok:
+                out.became_unreadable.append(base_addr + i * stride)
+            elif bar_ok:
+                out.became_readable.append(base_addr + i * stride)
+
+    for i in range(common, foo.count):
+        if foo.is_valid(i):
+            out.became_unreadable.append(base_addr + i * stride)
+    for i in range(common, bar.count):
+        if bar.is_valid(i):
+            out.became_readable.append(base_addr + i * stride)
+
+    stats.count("diff.changed", len(out.changed))
+    return out
+
+
+def _remove_addr(addrs: array, addr: int, *parallel: array) -> bool:
+    """Remove an address from a sorted array, along with its entries in parallel arrays."""
+    i = bisect_left(addrs, addr)
+    if i < len(addrs) and addrs[i] == addr:
+        del addrs[i]
+        for other in parallel:
+            del other[i]
+        return True
+    return False
+
+
+def update_diff(diff: DumpDiff, foo: Dump, bar: Dump, indices: Iterable[int]) -> list[int]:
+    """
+    Update the result of diff_dumps(foo, bar) after some of the registers
+    of either dump changed, without comparing the rest of the dumps.
+
+    :param diff: Diff to update in place
+    :param indices: Indices (in Dump.values) of the registers that changed
+    :return: Addresses whose entry in the diff changed, in ascending order
+    """
+    if foo.base_addr != diff.base_addr or bar.base_addr != diff.base_addr \
+       or foo.stride != diff.stride or bar.stride != diff.stride:
+        raise ValueError("dumps do not cover the same block as the diff")
+
+    out = []
+    for i in sorted(set(indices)):
+        addr = diff.base_addr + i * diff.stride
+        old_xor = diff.mask(addr)
+        was_unreadable = _remove_addr(diff.became_unreadable, addr)
+        was_readable = _remove_addr(diff.became_readable, addr)
+        _remove_addr(diff.changed, addr, diff.xor, diff.changed_bits)
+
+        foo_ok = i < foo.count and foo.is_valid(i)
+        bar_ok = i < bar.count and bar.is_valid(i)
+        xor = 0
+        if foo_ok and bar_ok:
+            xor = foo.values[i] ^ bar.values[i]
+            if xor:
+                n = bisect_left(diff.changed, addr)
+                diff.changed.insert(n, addr)
+                diff.xor.insert(n, xor)
+                diff.changed_bits.insert(n, xor.bit_count())
+        elif foo_ok:
+            diff.became_unreadable.insert(bisect_left(diff.became_unreadable, addr), addr)
+        elif bar_ok:
+            diff.became_readable.insert(bisect_left(diff.became_readable, addr), addr)
+
+        if (xor, foo_ok and not bar_ok, bar_ok and not foo_ok) != \
+           (old_xor, was_unreadable, was_readable):
+            out.append(addr)
+    return out
+
+
+#
+# Row model for rendered diffs
+#
+
+
+@dataclass(slots=True)
+class DiffRow:
+    """
+    Single register in a rendered diff, with everything pre-formatted.
+
+    Only registers that are readable in both dumps get a row.
+    """
+
+    #: Address of the register.
+    addr: int
+
+    #: Name of the register from the doc, if any.
+    name: str | None
+
+    #: Whether the value differs between the two dumps.
+    changed: bool
+
+    #: Values formatted as zero-padded hex strings (without the 0x prefix).
+    foo_hex: str
+    bar_hex: str
+
+    #: Whether each hex digit differs, in the same order as the hex strings.
+    hex_diff: list[bool]
+
+    #: Values formatted as zero-padded binary strings.
+    foo_bin: str
+    bar_bin: str
+
+    #: Whether each bit differs, in the same order as the binary strings.
+    bin_diff: list[bool]
+
+    #: Description of each bit, in the same order as the binary strings.
+    bit_titles: list[str]
+
+    #: Amount of registers left out between the previous row and this one.
+    #: Only set when skipping unchanged registers.
+    skipped: int = 0
+
+
+def _bit_titles(doc_addr: DocAddr | None, width: int) -> list[str]:
+    """Get bit descriptions for a register, most significant bit first."""
+    out = []
+    for bit in range(width - 1, -1, -1):
+        r = doc_addr[bit] if doc_addr else None
+        if r is None:
+            out.append(f"{bit} (unknown)")
+        elif r.start_bit != r.end_bit:
+            out.append(f"{bit} ({r.name}, {r.end_bit}-{r.start_bit})")
+        else:
+            out.append(f"{bit} ({r.name}, {r.end_bit})")
+    return out
+
+
+def diff_rows(
+    foo: Dump,
+    bar: Dump,
+    diff: DumpDiff | None = None,
+    doc: Doc | None = None,
+    changed_only: bool = False,
+    context: int = 0,
+    window: range | None = None
+) -> Iterator[DiffRow]:
+    """
+    Generate the rows of a rendered diff of two dumps.
+
+    :param foo: First dump
+    :param bar: Second dump
+    :param diff: Result of diff_dumps(foo, bar), if already available
+    :param doc: Doc to take register and bit names from
+    :param changed_only: Only generate rows for registers that changed
+    :param context: With changed_only, also generate this many rows before
+                    and after each changed register
+    :param window: Only generate rows for the registers at these indices
+                   (in Dump.values), e.g. for rendering a single page
+    """
+    if diff is None:
+        diff = diff_dumps(foo, bar)
+
+    base_addr = foo.base_addr
+    stride = foo.stride
+    val_bits = foo.val_bits
+    hex_digits = val_bits // 4
+    count = min(foo.count, bar.count)
+    if window is None:
+        window = range(count)
+    else:
+        window = range(max(window.start, 0), min(window.stop, count))
+
+    if changed_only:
+        indices = set()
+        changed = diff.changed
+        if len(window) < count:
+            # Only look at the changes that can reach into the window
+            changed = changed[
+                bisect_left(changed, base_addr + (window.start - context) * stride):
+                bisect_left(changed, base_addr + (window.stop + context) * stride)
+            ]
+        for addr in changed:
+            index = (addr - base_addr) // stride
+            indices.update(range(
+                max(index - context, window.start),
+                min(index + context + 1, window.stop)
+            ))
+        indices = sorted(indices)
+    else:
+        indices = window
+
+    foo_values, bar_values = foo.values, bar.values
+    foo_valid, bar_valid = foo.valid, bar.valid
+    no_diff_hex = [False] * hex_digits
+    no_diff_bin = [False] * val_bits
+    titles: dict[int, list[str]] = {}
+
+    prev = window.start - 1
+    for index in indices:
+        if not (
+            foo_valid[index >> 3] >> (index & 7) & 1
+            and bar_valid[index >> 3] >> (index & 7) & 1
+        ):
+            continue
+
+        addr = base_addr + index * stride
+        foo_val = foo_values[index]
+        bar_val = bar_values[index]
+        xor = foo_val ^ bar_val
+
+        foo_hex = f"{foo_val:0{hex_digits}x}"
+        bar_hex = f"{bar_val:0{hex_digits}x}"
+        foo_bin = f"{foo_val:0{val_bits}b}"
+        bar_bin = f"{bar_val:0{val_bits}b}"
+        if xor:
+            hex_diff = [
+                bool(xor >> (4 * d) & 0xf)
+                for d in range(len(foo_hex) - 1, -1, -1)
+            ]
+            bin_diff = [
+                bool(xor >> b & 1) for b in range(len(foo_bin) - 1, -1, -1)
+            ]
+        else:
+            hex_diff = no_diff_hex
+            bin_diff = no_diff_bin
+
+        doc_addr = doc[addr - base_addr] if doc else None
+        key = doc_addr.addr if doc_addr else -1
+        if key not in titles:
+            titles[key] = _bit_titles(doc_addr, val_bits)
+
+        yield DiffRow(
+            addr=addr,
+            name=doc_addr.name if doc_addr else None,
+            changed=bool(xor),
+            foo_hex=foo_hex,
+            bar_hex=bar_hex,
+            hex_diff=hex_diff,
+            foo_bin=foo_bin,
+            bar_bin=bar_bin,
+            bin_diff=bin_diff,
+            bit_titles=titles[key],
+            skipped=index - prev - 1 if changed_only else 0
+        )
+        prev = index
@@ -1,8 +1,13 @@
 # SPDX-License-Identifier: MIT
 
+from collections.abc import Iterator
 from dataclasses import dataclass
 from functools import cached_property
 import os
+from typing import TextIO
+
+from . import stats
+from .dump import Dump
 
 @dataclass(slots=True)
 class DocAddrRange:
@@ -57,18 +62,84 @@ class DocAddr:
         else:
             self.ranges = []
 
+        # Bit -> range lookup table and (name, shift, mask) of each field;
+        # built by finalize().
+        self._lut: list[DocAddrRange | None] | None = None
+        self._fields: list[tuple[str, int, int]] = []
+
     def add_range(self, r: DocAddrRange):
         """Add a range to the doc."""
         if r is None:
             return
         self.ranges.append(r)
+        self._lut = None
 
-    def __getitem__(self, index):
+    def finalize(self, val_bits: int | None = None):
+        """
+        Build the lookup tables used for accessing bits and fields.
+
+        This is done automatically on first access, and again after a range
+        is added with add_range.
+
+        :param val_bits: Amount of bits in the value; defaults to the end bit
+                         of the highest documented range
+        """
+        if val_bits is None:
+            val_bits = max((r.end_bit + 1 for r in self.ranges), default=0)
+
+        lut: list[DocAddrRange | None] = [None] * val_bits
         for r in self.ranges:
-            if r.start_bit <= index and r.end_bit >= index:
-                return r
+            for bit in range(max(r.start_bit, 0), min(r.end_bit + 1, val_bits)):
+                # Earlier ranges take precedence over later overlapping ones
+                if lut[bit] is None:
+                    lut[bit] = r
+
+        self._fields = [
+            (r.name, r.start_bit, (1 << (r.end_bit - r.start_bit + 1)) - 1)
+            for r in self.ranges
+        ]
+        self._lut = lut
+
+    @property
+    def fields(self) -> list[tuple[str, int, int]]:
+        """
+        The documented fields, as (name, shift, mask) tuples in the order of
+        DocAddr.ranges; a field's value is value >> shift & mask.
+        """
+        if self._lut is None:
+            self.finalize()
+        return self._fields
+
+    def __getitem__(self, index):
+        if self._lut is None:
+            self.finalize()
+        if 0 <= index < len(self._lut):
+            return self._lut[index]
         return None
 
+    def extract(self, value: int) -> dict[str, int]:
+        """Get the value of each documented field from a register value."""
+        if self._lut is None:
+            self.finalize()
+        return {
+            name: value >> shift & mask for name, shift, mask in self._fields
+        }
+
+    def extract_array(self, values) -> dict[str, list[int]]:
+        """
+        Get the value of each documented field from a sequence of register
+        values, such as Dump.values.
+
+        Returns a dict with the field name as the key and a list with the
+        field's value for each register value as the value.
+        """
+        if self._lut is None:
+            self.finalize()
+        return {
+            name: [value >> shift & mask for value in values]
+            for name, shift, mask in self._fields
+        }
+
     def __repr__(self):
         return f"<DocAddr {self.name} @ {hex(self.addr)} " \
                f"({len(self.ranges)} ranges)>"
@@ -82,17 +153,33 @@ class Doc:
     You can use Doc.base_addr and Doc.size for calculation convenience.
     """
 
+    #: Attributes of a subclass that DocCache stores along with the
+    #: addresses, so that cached docs have them too; their values must be
+    #: serializable with marshal.
+    cache_attrs: tuple[str, ...] = ()
+
     def __init__(
         self,
         base_addr: int,
         size: int,
         name: str = "",
-        addresses: list[DocAddr] | None = None
+        addresses: list[DocAddr] | None = None,
+        sources: list[str] | None = None,
+        missing_sources: list[str] | None = None
     ):
         self.base_addr = base_addr
         self.size = size
         self.name = name
 
+        #: Files the doc was built from; DocCache re-creates the doc when
+        #: any of them changes.
+        self.sources = sources or []
+
+        #: Files that did not exist when the doc was built, but would have
+        #: been used if they had, like missing includes; DocCache re-creates
+        #: the doc when any of them appears.
+        self.missing_sources = missing_sources or []
+
         self._indices = {}
         if addresses is not None:
             self.addresses = addresses
@@ -111,6 +198,29 @@ class Doc:
             return self.addresses[self._indices[index]]
         return None
 
+    def finalize(self, val_bits: int | None = None):
+        """Build the lookup tables of all addresses. See DocAddr.finalize."""
+        for addr in self.addresses:
+            addr.finalize(val_bits)
+
+    def extract_dump(self, dump: Dump) -> dict[int, dict[str, int]]:
+        """
+        Get the value of each documented field in a dump.
+
+        Returns a dict with the address offset as the key and the fields of
+        that address (as in DocAddr.extract) as the value. Addresses that are
+        unreadable or not covered by the dump are left out.
+        """
+        out = {}
+        for addr in self.addresses:
+            try:
+                index = dump.index(dump.base_addr + addr.addr)
+            except KeyError:
+                continue
+            if dump.is_valid(index):
+                out[addr.addr] = addr.extract(dump.values[index])
+        return out
+
     def __repr__(self):
         return f"<Doc {self.name or 'unnamed'} @ {hex(self.base_addr)} " \
                f"- {hex(self.base_addr + self.size)} " \
@@ -122,28 +232,47 @@ class Doc:
 # DFmt (doc format) support
 #
 
+#: Amount of addresses the dfmt writer formats and writes at once.
+WRITE_CHUNK_SIZE = 1024
+
+
+def _parse_header_int(val: str) -> int:
+    """
+    Parse a number from a header: a prefixed number, a decimal number (as
+    written by older versions of the writer), or a bare hex number.
+    """
+    try:
+        return int(val, 0)
+    except ValueError:
+        return int(val, 16)
+
 
 class DFmtDoc(Doc):
     """
     Doc parser for the custom doc format.
     """
 
+    cache_attrs = ("filename", "header")
+
     def __init__(self, filename: str | os.PathLike):
         """Initialize doc from path."""
-        self.filename = filename
+        self.filename = os.fspath(filename)
 
-        with open(filename, "r") as dump_file:
-            #: Raw dump data as plaintext.
-            self.raw = dump_file.read()
+        with stats.timer("doc.dfmt_parse"):
+            with open(filename, "r") as dump_file:
+                self.raw = dump_file.read()
+            stats.count("doc.bytes_read", len(self.raw))
 
-        self._check_validity()
+            self._check_validity()
 
-        super().__init__(
-            base_addr=self.header["base_addr"],
-            size=self.header["size"]
-        )
+            super().__init__(
+                base_addr=_parse_header_int(self.header["base_addr"]),
+                size=_parse_header_int(self.header["size"]),
+                sources=[self.filename]
+            )
 
-        self._parse()
+            self._parse()
+            stats.count("doc.addresses", len(self.addresses))
 
     def _check_validity(self):
         """Check if the current doc is valid."""
@@ -153,6 +282,16 @@ class DFmtDoc(Doc):
             if key not in self.header:
                 raise ValueError(f"missing key \"{key}\"")
 
+    @cached_property
+    def raw(self) -> str:
+        """
+        Raw doc data as plaintext.
+
+        Docs loaded from a DocCache read this from the file on first access.
+        """
+        with open(self.filename, "r") as dump_file:
+            return dump_file.read()
+
     @cached_property
     def header(self) -> dict[str, str]:
         """Header with information about the dump."""
@@ -221,32 +360,66 @@ class DFmtDoc(Doc):
 
             current_addr = DocAddr(address, name=' '.join(split[1:]))
 
+        if current_addr:
+            self.add_addr(current_addr)
 
-def doc_to_dfmt(doc: Doc, ftype: str, addr_bits: int = 32, val_bits: int = 32):
+
+def iter_dfmt(
+    doc: Doc, ftype: str, addr_bits: int = 32, val_bits: int = 32
+) -> Iterator[str]:
     """
-    Convert a Doc object to a doc format dump.
+    Convert a Doc object to the doc format, in chunks.
+
+    Each chunk covers up to WRITE_CHUNK_SIZE addresses. Parsing the output
+    with DFmtDoc gives back the same addresses and ranges.
+    """
+    yield (
+        f"fmt doc\n"
+        f"type {ftype}\n"
+        f"base_addr {hex(doc.base_addr)}\n"
+        f"size {hex(doc.size)}\n"
+        f"addr_bits {addr_bits}\n"
+        f"val_bits {val_bits}\n"
+        f"--- header_end ---\n"
+    )
+
+    addresses = sorted(doc.addresses, key=lambda a: a.addr)
+    for start in range(0, len(addresses), WRITE_CHUNK_SIZE):
+        chunk = []
+        for addr in addresses[start:start + WRITE_CHUNK_SIZE]:
+            chunk.append(f"{hex(addr.addr)} {addr.name}\n")
+            for range_ in sorted(addr.ranges, key=lambda r: r.start_bit):
+                chunk.append(f"\n  b {range_.start_bit} {range_.end_bit} {range_.name}\n")
+            chunk.append("\n")
+        yield "".join(chunk)
+
+
+def write_dfmt(
+    doc: Doc, out_file: TextIO, ftype: str, addr_bits: int = 32, val_bits: int = 32
+):
+    """
+    Write a Doc object to a file object opened in text mode, in the doc
+    format. See iter_dfmt.
     """
-    out = "fmt doc\n"
-    out += f"type {ftype}\n"
-    out += f"base_addr {doc.base_addr}\n"
-    out += f"size {doc.size}\n"
-    out += f"addr_bits {addr_bits}\n"
-    out += f"val_bits {val_bits}\n"
-    out += "--- header_end ---\n"
+    written = 0
+    with stats.timer("doc.dfmt_write"):
+        for chunk in iter_dfmt(doc, ftype, addr_bits=addr_bits, val_bits=val_bits):
+            written += out_file.write(chunk)
+    stats.count("doc.bytes_written", written)
 
-    for addr in sorted(doc.addresses, key=lambda a: a.addr):
-        out += f"{hex(addr.addr)} {addr.name}\n"
-        for range in sorted(addr.ranges, key=lambda r: r.start_bit):
-            out += "\n"
-            out += f"  b {range.start_bit} {range.end_bit} {range.name}\n"
-        out += "\n"
 
-    return out
+def doc_to_dfmt(doc: Doc, ftype: str, addr_bits: int = 32, val_bits: int = 32) -> str:
+    """
+    Convert a Doc object to a doc format dump.
+
+    Prefer write_dfmt for large docs, which does not build the whole text.
+    """
+    return "".join(iter_dfmt(doc, ftype, addr_bits=addr_bits, val_bits=val_bits))
 
 
 def doc_to_dfmt_file(doc: Doc, ftype: str, out_path: str, addr_bits: int = 32, val_bits: int = 32):
     """
-    Wrapper for doc_to_dfmt that automatically dumps the doc to a file.
+    Wrapper for write_dfmt that automatically dumps the doc to a file.
     """
     with open(out_path, "w") as out_file:
-        out_file.write(doc_to_dfmt(doc, ftype, addr_bits=addr_bits, val_bits=val_bits))
+        write_dfmt(doc, out_file, ftype, addr_bits=addr_bits, val_bits=val_bits)
@@ -0,0 +1,255 @@
+# SPDX-License-Identifier: MIT
+
+from functools import lru_cache
+from hashlib import sha256
+import marshal
+import os
+import sys
+
+from . import stats
+from .doc import Doc, DocAddr, DocAddrRange
+from .header_parser import HeaderParser
+
+#: Default location of the doc cache.
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "libdump", "docs"
+)
+
+#: Default maximum size of the doc cache, in bytes.
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+def _hash_file(path: str | os.PathLike) -> str:
+    """Get the SHA-256 hash of a file's contents."""
+    digest = sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@lru_cache
+def format_version(cls: type[Doc]) -> str:
+    """
+    Get the version of the cache entry format for a doc class.
+
+    This is a hash of the modules that define the entry format and the
+    class and its bases, as well as the header parser, so that entries are
+    re-created whenever the code that produced them changes.
+    """
+    modules = {__name__, Doc.__module__, HeaderParser.__module__}
+    modules.update(base.__module__ for base in cls.__mro__)
+    digest = sha256()
+    for name in sorted(modules):
+        path = getattr(sys.modules.get(name), "__file__", None)
+        if path is None:
+            continue
+        with open(path, "rb") as module_file:
+            digest.update(name.encode() + b"\0" + module_file.read())
+    return digest.hexdigest()
+
+
+def doc_to_tuple(doc: Doc) -> tuple:
+    """Convert a doc to a tuple of plain values, for serialization."""
+    return (
+        doc.name, doc.base_addr, doc.size,
+        tuple(
+            (addr.addr, addr.name, tuple(
+                (r.start_bit, r.end_bit, r.name) for r in addr.ranges
+            ))
+            for addr in doc.addresses
+        ),
+        tuple(doc.sources),
+        tuple(doc.missing_sources),
+        {attr: getattr(doc, attr) for attr in doc.cache_attrs}
+    )
+
+
+def doc_from_tuple(data: tuple, cls: type[Doc] = Doc) -> Doc:
+    """
+    Convert a tuple created by doc_to_tuple back into a doc.
+
+    :param data: Tuple created by doc_to_tuple
+    :param cls: Doc subclass to create; the subclass' constructor is not
+                called, only the attributes of Doc and the ones listed in
+                cls.cache_attrs are restored
+    """
+    name, base_addr, size, addresses, sources, missing_sources, attrs = data
+    doc = cls.__new__(cls)
+    Doc.__init__(
+        doc, base_addr=base_addr, size=size, name=name,
+        addresses=[
+            DocAddr(addr, addr_name, [
+                DocAddrRange(start_bit=start, end_bit=end, name=r_name)
+                for start, end, r_name in ranges
+            ])
+            for addr, addr_name, ranges in addresses
+        ],
+        sources=list(sources),
+        missing_sources=list(missing_sources)
+    )
+    for attr, value in attrs.items():
+        setattr(doc, attr, value)
+    return doc
+
+
+def _file_state(path: str) -> tuple[str, int, int]:
+    """Get the (path, mtime_ns, size) of a file."""
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class DocCache:
+    """
+    On-disk cache of parsed docs.
+
+    Entries are keyed by the doc class, its parameters and the path of the
+    source file it was built from, and are invalidated when the contents of
+    any of the files the doc was built from (see Doc.sources) change, when
+    any of the files it looked for but did not find (see
+    Doc.missing_sources) appears, or when the code that built it changes
+    (see format_version). The least recently used entries are removed once
+    the cache grows over its maximum size.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | os.PathLike = DEFAULT_CACHE_DIR,
+        max_size: int = DEFAULT_MAX_SIZE
+    ):
+        """
+        :param cache_dir: Directory to store the cache in
+        :param max_size: Maximum total size of the cache entries, in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def _entry_path(self, source: str | os.PathLike, cls: type, args: tuple, kwargs: dict) -> str:
+        """Get the path of the cache entry for a doc."""
+        key = repr((
+            f"{cls.__module__}.{cls.__qualname__}",
+            os.path.abspath(source), args, sorted(kwargs.items())
+        ))
+        return os.path.join(
+            self.cache_dir, sha256(key.encode()).hexdigest() + ".doc"
+        )
+
+    def load(self, source: str | os.PathLike, cls: type[Doc], *args, **kwargs) -> Doc:
+        """
+        Get the doc created by cls(*args, **kwargs) from the cache, or create
+        and cache it if the entry is missing or stale.
+
+        :param source: Path of the file the doc is built from
+        :param cls: Doc class to create
+        """
+        with stats.timer("doc_cache.load"):
+            return self._load(source, cls, args, kwargs)
+
+    def _load(self, source: str | os.PathLike, cls: type[Doc], args: tuple, kwargs: dict) -> Doc:
+        entry_path = self._entry_path(source, cls, args, kwargs)
+        source = os.path.abspath(source)
+        version = format_version(cls)
+        source_state = _file_state(source)
+
+        try:
+            with open(entry_path, "rb") as entry_file:
+                entry = marshal.load(entry_file)
+            entry_version, files, missing, data = entry
+        except (OSError, EOFError, ValueError, TypeError):
+            entry = None
+        else:
+            if entry_version == version and not any(map(os.path.isfile, missing)):
+                files = self._check_files(files)
+                if files is not None:
+                    if files is not entry[1]:
+                        # Some files were touched without changing them
+                        self._store(entry_path, (version, files, missing, data))
+                    else:
+                        os.utime(entry_path)
+                    stats.count("doc_cache.hits")
+                    return doc_from_tuple(data, cls)
+
+        stats.count("doc_cache.misses")
+        doc = cls(*args, **kwargs)
+        # The source is stated before parsing, so that changes made while
+        # it is parsed make the entry stale
+        files = [(*source_state, _hash_file(source))]
+        for path in dict.fromkeys(map(os.path.abspath, doc.sources)):
+            if path != source:
+                files.append((*_file_state(path), _hash_file(path)))
+        missing = tuple(dict.fromkeys(map(os.path.abspath, doc.missing_sources)))
+        self._store(entry_path, (version, tuple(files), missing, doc_to_tuple(doc)))
+        return doc
+
+    @staticmethod
+    def _check_files(files: tuple) -> tuple | None:
+        """
+        Check whether the files of an entry are unchanged.
+
+        Returns files itself if none of them were touched, the files with
+        their current mtimes if some were touched but still have the same
+        contents, and None if any of them changed or is gone.
+        """
+        updated = None
+        for i, (path, mtime_ns, size, content_hash) in enumerate(files):
+            try:
+                state = _file_state(path)
+                if state[1:] == (mtime_ns, size):
+                    continue
+                # The file was touched; it only needs to be re-parsed if its
+                # contents actually changed.
+                if content_hash != _hash_file(path):
+                    return None
+            except OSError:
+                return None
+            if updated is None:
+                updated = list(files)
+            updated[i] = (*state, content_hash)
+        return files if updated is None else tuple(updated)
+
+    def _store(self, entry_path: str, entry: tuple):
+        """Write a cache entry and trim the cache down to its maximum size."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as entry_file:
+            marshal.dump(entry, entry_file)
+        os.replace(tmp_path, entry_path)
+        self.trim()
+
+    def trim(self, max_size: int | None = None):
+        """Remove the least recently used entries until the cache fits."""
+        if max_size is None:
+            max_size = self.max_size
+
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for dirent in it:
+                if not dirent.name.endswith(".doc"):
+                    continue
+                stat = dirent.stat()
+                entries.append((stat.st_mtime, stat.st_size, dirent.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        self.trim(0)
+
+
+def load_doc(source: str | os.PathLike, cls: type[Doc], *args, **kwargs) -> Doc:
+    """Shorthand for DocCache().load(), using the default cache location."""
+    return DocCache().load(source, cls, *args, **kwargs)
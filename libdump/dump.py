@@ -1,39 +1,237 @@
 # SPDX-License-Identifier: MIT
 
+from array import array
+from collections.abc import Iterable, Iterator, Mapping
 from functools import cached_property
+import mmap
 import os
+import sys
+from typing import BinaryIO
+
+from . import stats
+
+#: Value of the "fmt" header key for text dumps.
+TEXT_FMT = "dump"
+
+#: Value of the "fmt" header key for binary dumps.
+BINARY_FMT = "bindump"
+
+#: Alignment of the value array in binary dumps.
+BINARY_ALIGN = 8
+
+#: Header key holding the size of each value in binary dumps, in bytes.
+BINARY_VAL_BYTES = "val_bytes"
+
+#: Amount of records the text dump writer formats and writes at once.
+WRITE_CHUNK_SIZE = 256
+
+
+def _typecode_for_bits(bits: int) -> str:
+    """Get the smallest array typecode that can hold values of given width."""
+    for typecode in "BHILQ":
+        if array(typecode).itemsize * 8 >= bits:
+            return typecode
+    raise ValueError(f"unsupported value width: {bits} bits")
+
+
+def _binary_val_bytes(bits: int) -> int:
+    """
+    Get the size of values of given width in binary dumps; the smallest of
+    1, 2, 4 and 8 bytes that fits, regardless of the platform's C types.
+    """
+    for nbytes in 1, 2, 4, 8:
+        if nbytes * 8 >= bits:
+            return nbytes
+    raise ValueError(f"unsupported value width: {bits} bits")
+
+
+def _typecode_for_bytes(nbytes: int) -> str:
+    """Get an array typecode with items of exactly the given size."""
+    for typecode in "BHILQ":
+        if array(typecode).itemsize == nbytes:
+            return typecode
+    raise ValueError(f"no array type with {nbytes}-byte items")
+
+
+def _parse_record_lines(lines: Iterable[str]) -> Iterator[tuple[int, int]]:
+    """Parse text dump record lines into (addr, value) pairs."""
+    for line in lines:
+        try:
+            addr_str, val_str = line.rstrip("\n").split(" ")
+        except ValueError:
+            continue
+        if val_str == "-":
+            yield int(addr_str, 16), -1
+        else:
+            yield int(addr_str, 16), int(val_str, 16)
+
+
+class DumpData(Mapping):
+    """
+    Read-only, dict-compatible view of the data contained in a dump.
+
+    Maps each address covered by the dump to its value. If the address was
+    unreadable (or missing from the dump), the value is -1.
+    """
+
+    __slots__ = ("_dump",)
+
+    def __init__(self, dump: "Dump"):
+        self._dump = dump
+
+    def __getitem__(self, addr: int) -> int:
+        index = self._dump.index(addr)
+        if not self._dump.is_valid(index):
+            return -1
+        return self._dump.values[index]
+
+    def __contains__(self, addr) -> bool:
+        try:
+            self._dump.index(addr)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[int]:
+        dump = self._dump
+        return iter(range(
+            dump.base_addr, dump.base_addr + dump.count * dump.stride, dump.stride
+        ))
+
+    def __len__(self) -> int:
+        return self._dump.count
+
+    def __repr__(self):
+        return f"<DumpData of {self._dump.filename} ({self._dump.count} addresses)>"
 
 
 class Dump:
     """Class representing dump file."""
 
+    #: Offset of the first record in the file; None for in-memory dumps.
+    _data_offset: int | None = None
+
     def __init__(self, filename: str | os.PathLike):
         """Initialize dump from path."""
         self.filename = filename
 
-        with open(filename, "r") as dump_file:
-            #: Raw dump data as plaintext.
-            self.raw = dump_file.read()
-
         self._check_validity()
 
+    @classmethod
+    def from_arrays(
+        cls,
+        header: dict[str, str],
+        values,
+        valid: bytearray,
+        filename: str | os.PathLike = ""
+    ) -> "Dump":
+        """
+        Create a dump from an already parsed header and value storage.
+
+        :param header: Header of the dump, as in Dump.header
+        :param values: Sequence of values, one for each address (see Dump.values)
+        :param valid: Validity bitmap (see Dump.valid)
+        :param filename: Filename to report for the dump, if any
+        """
+        dump = cls.__new__(cls)
+        dump.filename = filename
+        dump.header = dict(header)
+        dump._check_validity()
+        if len(values) != dump.count:
+            raise ValueError(
+                f"expected {dump.count} values, got {len(values)}"
+            )
+        dump._store = (values, valid)
+        return dump
+
+    @classmethod
+    def from_lines(
+        cls,
+        lines: Iterable[str],
+        filename: str | os.PathLike = ""
+    ) -> "Dump":
+        """
+        Create a dump by parsing text dump lines, e.g. from a file object.
+
+        The lines are consumed as they are parsed and are not kept around.
+        Empty lines before and inside the header are skipped.
+
+        :param lines: Lines of a text dump, with or without line breaks
+        :param filename: Filename to report for the dump, if any
+        """
+        lines = iter(lines)
+        header = {}
+        for line in lines:
+            line = line.rstrip("\n")
+            if line == "--- header_end ---":
+                break
+            if not line:
+                continue
+            key, val = line.split(" ")
+            header[key] = val
+
+        dump = cls.__new__(cls)
+        dump.filename = filename
+        dump.header = header
+        dump._check_validity()
+        dump._store = dump._build_store(_parse_record_lines(lines))
+        return dump
+
+    def close(self):
+        """
+        Unmap the file backing a binary dump.
+
+        Views of Dump.values and Dump.valid taken before must not be used
+        afterwards; the file is mapped again if the data is accessed later.
+        Does nothing for other dumps.
+        """
+        mm = self.__dict__.pop("_mmap", None)
+        if mm is None:
+            return
+        for buf in self.__dict__.pop("_store", ()):
+            if isinstance(buf, memoryview):
+                buf.release()
+        mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def _check_validity(self):
         """Check if the current dump is valid."""
-        if self.header.get("fmt", "unknown") != "dump":
-            raise ValueError("\"fmt\" must be set to \"dump\"")
+        if self.header.get("fmt", "unknown") not in (TEXT_FMT, BINARY_FMT):
+            raise ValueError(
+                f"\"fmt\" must be set to \"{TEXT_FMT}\" or \"{BINARY_FMT}\""
+            )
         for key in "type", "base_addr", "size", "addr_bits", "val_bits":
             if key not in self.header:
                 raise ValueError(f"missing key \"{key}\"")
 
+    @property
+    def raw(self) -> str:
+        """
+        Raw dump data as plaintext.
+
+        This is read from the file on every access and is not used by the
+        parser; prefer Dump.iter_records for going through the records.
+        """
+        with open(self.filename, "r") as dump_file:
+            return dump_file.read()
+
     @cached_property
     def header(self) -> dict[str, str]:
         """Header with information about the dump."""
         out = {}
-        for line in self.raw.split("\n"):
-            if line == "--- header_end ---":
-                break
-            key, val = line.split(" ")
-            out[key] = val
+        with stats.timer("dump.header"), open(self.filename, "rb") as dump_file:
+            for line in dump_file:
+                line = line.rstrip(b"\n").decode()
+                if line == "--- header_end ---":
+                    break
+                key, val = line.split(" ")
+                out[key] = val
+            self._data_offset = dump_file.tell()
         return out
 
     @cached_property
@@ -65,27 +263,269 @@ class Dump:
         return int(self.header["val_bits"])
 
     @cached_property
-    def data(self) -> dict[int, int]:
+    def stride(self) -> int:
+        """Distance between two consecutive addresses in the dump."""
+        return max(self.addr_bits // 8, 1)
+
+    @cached_property
+    def count(self) -> int:
+        """Amount of addresses covered by the dump."""
+        return self.size // self.stride + 1
+
+    def index(self, addr: int) -> int:
         """
-        Data contained in the dump.
+        Get the index of the given address in Dump.values.
 
-        Dict with address as the key and dumped value as the value.
-        If the address was unreadable, the value is set to -1.
+        Raises KeyError if the address is not covered by the dump.
         """
-        header_end = False
-        out = {}
-        for line in self.raw.split("\n"):
-            if line == "--- header_end ---":
-                header_end = True
-                continue
-            if header_end is False:
-                continue
+        offset = addr - self.base_addr
+        index, rem = divmod(offset, self.stride)
+        if offset < 0 or rem or index >= self.count:
+            raise KeyError(addr)
+        return index
+
+    def is_valid(self, index: int) -> bool:
+        """Check whether the value at the given index was readable."""
+        return bool(self.valid[index >> 3] >> (index & 7) & 1)
+
+    @cached_property
+    def _store(self) -> tuple[array | memoryview, bytearray | memoryview]:
+        """Compact storage for the dump data; see Dump.values and Dump.valid."""
+        if self.header["fmt"] == BINARY_FMT:
+            with stats.timer("dump.load_binary"):
+                return self._load_binary()
+        with stats.timer("dump.parse"):
+            return self._build_store(self.iter_records())
+
+    def _build_store(self, records: Iterable[tuple[int, int]]) -> tuple[array, bytearray]:
+        """Build the storage for the dump data from (addr, value) records."""
+        count = self.count
+        values = array(_typecode_for_bits(self.val_bits))
+        values.frombytes(bytes(count * values.itemsize))
+        valid = bytearray((count + 7) // 8)
+
+        if stats.enabled:
+            records = stats.counted(records, "dump.records_parsed")
+        for addr, val in records:
             try:
-                addr_str, val_str = line.split(" ")
-            except ValueError:
+                index = self.index(addr)
+            except KeyError:
+                raise ValueError(
+                    f"address {hex(addr)} is outside of the dumped block"
+                ) from None
+            if val == -1:
                 continue
-            if val_str == "-":
-                out[int(addr_str, 16)] = -1
+            try:
+                values[index] = val
+            except OverflowError:
+                raise ValueError(
+                    f"value {hex(val)} at {hex(addr)} does not fit in "
+                    f"{self.val_bits} bits"
+                ) from None
+            valid[index >> 3] |= 1 << (index & 7)
+
+        return values, valid
+
+    def _load_binary(self) -> tuple[array | memoryview, memoryview]:
+        """Load the data of a binary dump."""
+        default_val_bytes = _binary_val_bytes(self.val_bits)
+        val_bytes = int(self.header.get(BINARY_VAL_BYTES, default_val_bytes))
+        if val_bytes not in (1, 2, 4, 8) or val_bytes < default_val_bytes:
+            raise ValueError(f"invalid {BINARY_VAL_BYTES} for {self.val_bits}-bit values: {val_bytes}")
+        typecode = _typecode_for_bytes(val_bytes)
+        values_len = self.count * val_bytes
+        values_start = self._data_offset + -self._data_offset % BINARY_ALIGN
+        valid_start = values_start + values_len
+        valid_len = (self.count + 7) // 8
+
+        with open(self.filename, "rb") as dump_file:
+            if os.fstat(dump_file.fileno()).st_size < valid_start + valid_len:
+                raise ValueError("binary dump is truncated")
+            stats.count("dump.bytes_mapped", valid_start + valid_len)
+            self._mmap = mmap.mmap(
+                dump_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        view = memoryview(self._mmap)
+        valid = view[valid_start:valid_start + valid_len]
+        if sys.byteorder == "little":
+            values = view[values_start:valid_start].cast(typecode)
+        else:
+            values = array(typecode)
+            values.frombytes(view[values_start:valid_start])
+            values.byteswap()
+
+        return values, valid
+
+    def iter_records(self) -> Iterator[tuple[int, int]]:
+        """
+        Iterate over the records in the dump, in file order.
+
+        Yields (addr, value) pairs; unreadable values are set to -1. The file
+        is memory-mapped and parsed as the generator advances, so only the
+        records that are actually consumed get read.
+
+        For dumps not backed by a text file, this yields every address
+        covered by the dump instead.
+        """
+        self.header  # reading the header sets _data_offset
+        if self._data_offset is None or self.header["fmt"] != TEXT_FMT:
+            yield from self.data.items()
+            return
+
+        with open(self.filename, "rb") as dump_file:
+            file_size = os.fstat(dump_file.fileno()).st_size
+            if file_size <= self._data_offset:
+                return
+            stats.count("dump.bytes_read", file_size)
+            with mmap.mmap(dump_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                mm.seek(self._data_offset)
+                for line in iter(mm.readline, b""):
+                    try:
+                        addr_str, val_str = line.rstrip(b"\n").split(b" ")
+                    except ValueError:
+                        continue
+                    if val_str == b"-":
+                        yield int(addr_str, 16), -1
+                    else:
+                        yield int(addr_str, 16), int(val_str, 16)
+
+    @property
+    def values(self) -> array | memoryview:
+        """
+        Values contained in the dump, indexed by (addr - base_addr) / stride.
+
+        Unreadable values are set to 0; use Dump.valid to tell them apart.
+        For binary dumps, this is a read-only view of the memory-mapped file.
+        """
+        return self._store[0]
+
+    @property
+    def valid(self) -> bytearray | memoryview:
+        """
+        Validity bitmap for Dump.values.
+
+        Bit (index % 8) of byte (index // 8) is set if the value was readable.
+        """
+        return self._store[1]
+
+    @cached_property
+    def data(self) -> DumpData:
+        """
+        Data contained in the dump.
+
+        Read-only dict-like view with address as the key and dumped value as
+        the value. If the address was unreadable, the value is set to -1.
+        """
+        return DumpData(self)
+
+    def write(self, out_file: BinaryIO, fmt: str = TEXT_FMT):
+        """
+        Write the dump to a file object opened in binary mode.
+
+        The output is written in chunks as it is formatted, so the whole
+        text of a large dump is never held in memory. Parsing the output
+        gives back the same header and data.
+
+        Text dumps are written with lowercase hex digits, unlike the capture
+        scripts in tools-ondev; the parser accepts either.
+
+        :param out_file: File object to write to, e.g. sys.stdout.buffer
+        :param fmt: Format to write; either TEXT_FMT or BINARY_FMT
+        """
+        if fmt not in (TEXT_FMT, BINARY_FMT):
+            raise ValueError(f"unknown dump format \"{fmt}\"")
+
+        header = _header_bytes(self, fmt)
+        with stats.timer("dump.write"):
+            written = out_file.write(header)
+            if fmt == TEXT_FMT:
+                written += _write_text(self, out_file)
             else:
-                out[int(addr_str, 16)] = int(val_str, 16)
-        return out
+                written += _write_binary(self, out_file, len(header))
+        stats.count("dump.bytes_written", written)
+
+
+def dump_to_file(dump: Dump, out_path: str | os.PathLike, fmt: str = TEXT_FMT):
+    """
+    Write a dump to a file, in the text or the binary dump format.
+
+    All header keys are carried over, so the conversion is lossless in both
+    directions. See Dump.write for writing to an open file.
+
+    :param dump: Dump to write
+    :param out_path: Path to the output file
+    :param fmt: Format to write; either TEXT_FMT or BINARY_FMT
+    """
+    if fmt not in (TEXT_FMT, BINARY_FMT):
+        raise ValueError(f"unknown dump format \"{fmt}\"")
+    with open(out_path, "wb") as out_file:
+        dump.write(out_file, fmt)
+
+
+def _header_bytes(dump: Dump, fmt: str) -> bytes:
+    """
+    Serialize the header of a dump, with "fmt" set to the given format and,
+    for binary dumps, the value size set.
+    """
+    header = [f"fmt {fmt}\n"]
+    for key, val in dump.header.items():
+        if key not in ("fmt", BINARY_VAL_BYTES):
+            header.append(f"{key} {val}\n")
+    if fmt == BINARY_FMT:
+        header.append(f"{BINARY_VAL_BYTES} {_binary_val_bytes(dump.val_bits)}\n")
+    header.append("--- header_end ---\n")
+    return "".join(header).encode()
+
+
+def _all_valid(valid, start: int, end: int) -> bool:
+    """
+    Check whether all values from index start (a multiple of 8) up to end
+    are readable.
+    """
+    full_end = end & ~7
+    if bytes(valid[start >> 3:full_end >> 3]).count(0xff) != (full_end - start) >> 3:
+        return False
+    return all(valid[i >> 3] >> (i & 7) & 1 for i in range(full_end, end))
+
+
+def _write_text(dump: Dump, out_file: BinaryIO) -> int:
+    addr_digits = (dump.addr_bits + 3) // 4
+    val_digits = (dump.val_bits + 3) // 4
+    line = f"0x%0{addr_digits}x 0x%0{val_digits}x\n"
+    unreadable_line = f"0x%0{addr_digits}x -\n"
+
+    values, valid = dump.values, dump.valid
+    base_addr, stride, count = dump.base_addr, dump.stride, dump.count
+    written = 0
+    for start in range(0, count, WRITE_CHUNK_SIZE):
+        end = min(start + WRITE_CHUNK_SIZE, count)
+        addrs = range(base_addr + start * stride, base_addr + end * stride, stride)
+        if _all_valid(valid, start, end):
+            # Format the whole chunk with a single operation
+            args = [0] * (2 * (end - start))
+            args[0::2] = addrs
+            args[1::2] = values[start:end]
+            chunk = (line * (end - start)) % tuple(args)
+        else:
+            chunk = "".join([
+                line % (addr, values[i]) if valid[i >> 3] >> (i & 7) & 1
+                else unreadable_line % addr
+                for i, addr in zip(range(start, end), addrs)
+            ])
+        written += out_file.write(chunk.encode())
+    return written
+
+
+def _write_binary(dump: Dump, out_file: BinaryIO, header_len: int) -> int:
+    values = dump.values
+    val_bytes = _binary_val_bytes(dump.val_bits)
+    if values.itemsize != val_bytes or sys.byteorder != "little":
+        values = array(_typecode_for_bytes(val_bytes), values)
+        if sys.byteorder != "little":
+            values.byteswap()
+
+    written = out_file.write(bytes(-header_len % BINARY_ALIGN))
+    written += out_file.write(values)
+    written += out_file.write(dump.valid)
+    return written
@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: MIT
+"""
+Support for dumpall captures, i.e. the combined output of the script
+generated by libdump.ext.doc_kona_rdb.gen_dump_commands.
+
+Each block in the capture starts with a "!! NAME" line, followed by a dump
+in the text dump format.
+"""
+
+from collections.abc import Iterator
+from typing import TextIO
+import os
+
+from .dump import Dump
+
+
+def _section_name(line: str) -> str:
+    """Get the section name from a "!! NAME" line."""
+    return line.split("!! ", 1)[1].strip()
+
+
+def split_dumpall(
+    source: str | os.PathLike,
+    target_dir: str | os.PathLike
+) -> list[str]:
+    """
+    Split a dumpall capture into one file per block.
+
+    The capture is read and written line by line. Each block is written to
+    "NAME.val" in the target directory, starting with its "!! NAME" line.
+
+    :returns: Paths of the written files, in capture order
+    """
+    os.makedirs(target_dir, exist_ok=True)
+
+    written = []
+    out_file: TextIO | None = None
+    try:
+        with open(source) as source_file:
+            for line in source_file:
+                if line.startswith("!!"):
+                    if out_file is not None:
+                        out_file.close()
+                    path = os.path.join(target_dir, _section_name(line) + ".val")
+                    out_file = open(path, "w+")
+                    written.append(path)
+                if out_file is not None:
+                    out_file.write(line)
+    finally:
+        if out_file is not None:
+            out_file.close()
+
+    return written
+
+
+def iter_dumpall(source: str | os.PathLike) -> Iterator[tuple[str, Dump]]:
+    """
+    Parse the blocks of a dumpall capture, without splitting it into files.
+
+    Yields (name, dump) pairs in capture order. Each block is parsed straight
+    from the capture as it is read, so only one block is held in memory at a
+    time (unless the caller keeps the dumps around). The filename of each
+    dump is set to "source:NAME".
+
+    Raises ValueError if a block is not a valid dump.
+    """
+    with open(source) as source_file:
+        lines = iter(source_file)
+
+        name = None
+        for line in lines:
+            if line.startswith("!!"):
+                name = _section_name(line)
+                break
+
+        while name is not None:
+            next_name = None
+
+            def section():
+                nonlocal next_name
+                for line in lines:
+                    if line.startswith("!!"):
+                        next_name = _section_name(line)
+                        return
+                    yield line
+
+            section_lines = section()
+            try:
+                dump = Dump.from_lines(section_lines, filename=f"{source}:{name}")
+            except ValueError as e:
+                raise ValueError(f"invalid dump for block {name}: {e}") from e
+            # Make sure the whole section is consumed before moving on
+            for _ in section_lines:
+                pass
+
+            yield name, dump
+            name = next_name
@@ -15,7 +15,8 @@ class BCM59054RegDoc(Doc):
         :param header_path: Path to reg file
         :param map: Which I2C map to document (0 or 1)
         """
-        header_parsed = HeaderParser(header_path).data
+        parser = HeaderParser(header_path)
+        header_parsed = parser.data
 
         blocks: dict[str, DocAddr] = {}
         blocks_nomap: list[str] = []
@@ -52,20 +53,10 @@ class BCM59054RegDoc(Doc):
                     range_name = key[len(current_block)+1:-5]
 
                 try:
-                    mask = int(val, 16)
+                    # Some masks use the shift and get calculated live
+                    mask = parser.eval(key)
                 except ValueError:
-                    if "<<" in val:
-                        # Some masks use the shift and get calculated live
-                        split = val.split("<<")
-                        width = int(split[0][1:].strip())
-                        shift = split[1][:-1]
-                        try:
-                            shift = int(shift)
-                        except ValueError:
-                            shift = int(header_parsed[split[1][:-1].strip()])
-                        mask = width << shift
-                    else:
-                        continue
+                    continue
 
                 # Yes, there's a value that has a mask of 0...
                 if mask == 0:
@@ -79,6 +70,8 @@ class BCM59054RegDoc(Doc):
             name=os.path.splitext(os.path.basename(header_path))[0],
             base_addr=0x00,
             size=current_offset,
-            addresses=list(blocks.values())
+            addresses=list(blocks.values()),
+            sources=parser.files,
+            missing_sources=parser.missing_files
         )
 
@@ -1,9 +1,31 @@
 # SPDX-License-Identifier: MIT
 
+from .. import stats
 from ..doc import Doc, DocAddr, DocAddrRange
+from ..doc_cache import DocCache
 from ..header_parser import HeaderParser
 
-import os.path
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import lru_cache, partial
+import os
+
+
+def _define_int(parser: HeaderParser, key: str) -> int:
+    """
+    Get the value of a define as an integer, the way a C compiler would.
+
+    Plain hex numbers, which make up almost all of the RDB headers, are
+    converted directly instead of going through HeaderParser.eval.
+    """
+    val = parser.macros[key]
+    if val[:2] in ("0x", "0X"):
+        try:
+            return int(val, 16)
+        except ValueError:
+            pass
+    return parser.eval(key)
 
 
 class KonaRdbDoc(Doc):
@@ -12,7 +34,13 @@ class KonaRdbDoc(Doc):
     """
 
     def __init__(self, base_addr: int, header_path: str):
-        header_parsed = HeaderParser(header_path).data
+        with stats.timer("doc.rdb_parse"):
+            self._parse(base_addr, header_path)
+        stats.count("doc.addresses", len(self.addresses))
+
+    def _parse(self, base_addr: int, header_path: str):
+        parser = HeaderParser(header_path)
+        header_parsed = parser.data
 
         # RDB files follow the following pattern:
         # #define (blockname)_OFFSET 0x0000....
@@ -28,71 +56,320 @@ class KonaRdbDoc(Doc):
         for key, val in header_parsed.items():
             if key.endswith("_OFFSET"):
                 current_block = key[:-7]
-                current_offset = int(val, 16)
+                current_offset = _define_int(parser, key)
                 blocks[current_block] = DocAddr(current_offset, current_block)
             elif key.endswith("_MASK") and not key.endswith("_RESERVED_MASK"):
                 if not key.startswith(current_block):
                     raise ValueError(f"Out-of-order line for key {key}")
                 range_name = key[len(current_block)+1:-5]
                 blocks[current_block].add_range(
-                    DocAddrRange.from_mask(int(val, 16), range_name)
+                    DocAddrRange.from_mask(_define_int(parser, key), range_name)
                 )
 
         super().__init__(
             name=os.path.splitext(os.path.basename(header_path))[0],
             base_addr=base_addr,
             size=current_offset,
-            addresses=list(blocks.values())
+            addresses=list(blocks.values()),
+            sources=parser.files,
+            missing_sources=parser.missing_files
         )
 
 
+@dataclass(frozen=True, slots=True)
+class SysmapEntry:
+    """Single block listed in the sysmap."""
+
+    #: Name of the define for the block's base address.
+    name: str
+
+    #: Base address of the block.
+    base: int
+
+    #: Size of the block, i.e. the distance to the next block in the sysmap;
+    #: None for the last block.
+    size: int | None
+
+    #: Path to the RDB header for the block.
+    header: str
+
+    def __contains__(self, addr: int) -> bool:
+        # The extent of the last block is not known from the sysmap alone,
+        # so only its base address counts; SysmapIndex bounds it by its doc
+        if self.size is None:
+            return addr == self.base
+        return self.base <= addr < self.base + self.size
+
+
+def _parse_sysmap(sysmap_path: str) -> tuple[tuple[SysmapEntry, ...], tuple[SysmapEntry, ...]]:
+    """
+    Parse the blocks listed in a sysmap header.
+
+    Returns the blocks in the order they are listed, and sorted by base
+    address; the sort is stable, so for blocks sharing a base address the
+    first one listed comes first.
+    """
+    # brcm_rdb_sysmap.h includes a list of defines for each component's
+    # base address, with a comment listing the relevant header file for
+    # internal offsets.
+    blocks = []
+    with stats.timer("sysmap.parse"):
+        header_parsed = HeaderParser(sysmap_path)
+    for key in header_parsed.data:
+        header = header_parsed.comments.get(key)
+        if not header:
+            continue
+        try:
+            base = _define_int(header_parsed, key)
+        except ValueError:
+            continue
+        blocks.append((key, base, os.path.join(os.path.dirname(sysmap_path), header)))
+
+    # The size of each block is the distance to the next block with a
+    # different base address.
+    bases = sorted(base for _, base, _ in blocks)
+    entries = []
+    for name, base, header in blocks:
+        i = bisect_right(bases, base)
+        size = bases[i] - base if i < len(bases) else None
+        entries.append(SysmapEntry(name=name, base=base, size=size, header=header))
+
+    return tuple(entries), tuple(sorted(entries, key=lambda e: e.base))
+
+
+@lru_cache(maxsize=8)
+def _load_sysmap(sysmap_path: str, mtime_ns: int) -> tuple[tuple[SysmapEntry, ...], tuple[SysmapEntry, ...]]:
+    """Parse a sysmap header; cached by path and modification time."""
+    return _parse_sysmap(sysmap_path)
+
+
+class SysmapIndex:
+    """
+    Index of the blocks listed in a Kona sysmap header (brcm_rdb_sysmap.h),
+    for finding the block that an absolute address belongs to.
+
+    Use SysmapIndex.from_file to get an index without re-parsing the sysmap
+    on every call.
+    """
+
+    def __init__(self, sysmap_path: str, doc_cache: DocCache | None = None):
+        """
+        :param sysmap_path: Path to the sysmap header
+        :param doc_cache: Cache to load RDB docs from in lookup_register;
+                          if None, docs are parsed from their headers
+        """
+        self._init(sysmap_path, doc_cache, _parse_sysmap(sysmap_path))
+
+    def _init(
+        self,
+        sysmap_path: str,
+        doc_cache: DocCache | None,
+        parsed: tuple[tuple[SysmapEntry, ...], tuple[SysmapEntry, ...]]
+    ):
+        self.sysmap_path = sysmap_path
+        self.doc_cache = doc_cache
+
+        entries, self._sorted = parsed
+        self._bases = [e.base for e in self._sorted]
+
+        #: Blocks in the order they are listed in the sysmap.
+        self.entries: list[SysmapEntry] = list(entries)
+
+        # Docs loaded by SysmapIndex.doc; at most one per block
+        self._docs: dict[str, KonaRdbDoc | None] = {}
+
+    @classmethod
+    def from_file(cls, sysmap_path: str, doc_cache: DocCache | None = None) -> "SysmapIndex":
+        """
+        Get an index for a sysmap, re-using the parsed sysmap until the file
+        changes.
+
+        Every call returns a new index, with its own loaded docs.
+        """
+        sysmap_path = os.path.abspath(sysmap_path)
+        parsed = _load_sysmap(sysmap_path, os.stat(sysmap_path).st_mtime_ns)
+        index = cls.__new__(cls)
+        index._init(sysmap_path, doc_cache, parsed)
+        return index
+
+    def _contains(self, entry: SysmapEntry, addr: int) -> bool:
+        """Check whether the address is in the block."""
+        if entry.size is not None or addr == entry.base:
+            return addr in entry
+        # The last block ends with the last register of its RDB doc
+        doc = self.doc(entry)
+        return doc is not None and entry.base <= addr <= entry.base + doc.size
+
+    def _find(self, addr: int) -> SysmapEntry | None:
+        """Find the block containing the given address."""
+        if stats.enabled:
+            stats.count("sysmap.lookups")
+        i = bisect_right(self._bases, addr) - 1
+        if i < 0:
+            return None
+        i = bisect_left(self._bases, self._bases[i])
+        entry = self._sorted[i]
+        if not self._contains(entry, addr):
+            return None
+        return entry
+
+    def lookup(self, addr: int) -> SysmapEntry | None:
+        """Get the block that the given absolute address belongs to."""
+        return self._find(addr)
+
+    def lookup_base(self, base_addr: int) -> SysmapEntry | None:
+        """Get the block with the given base address."""
+        entry = self._find(base_addr)
+        if entry is None or entry.base != base_addr:
+            return None
+        return entry
+
+    def lookup_many(self, addrs: Iterable[int]) -> list[SysmapEntry | None]:
+        """
+        Get the blocks that each of the given absolute addresses belong to.
+
+        The result is in the same order as the addresses.
+        """
+        addrs = list(addrs)
+        stats.count("sysmap.lookups", len(addrs))
+        out: list[SysmapEntry | None] = [None] * len(addrs)
+        bases = self._bases
+        i = 0
+        for n in sorted(range(len(addrs)), key=addrs.__getitem__):
+            addr = addrs[n]
+            # Addresses are visited in ascending order, so the search for
+            # the block can continue from where the previous one ended.
+            while i < len(bases) and bases[i] <= addr:
+                i += 1
+            if i == 0:
+                continue
+            entry = self._sorted[bisect_left(bases, bases[i - 1], 0, i)]
+            if self._contains(entry, addr):
+                out[n] = entry
+        return out
+
+    def doc(self, entry: SysmapEntry) -> "KonaRdbDoc | None":
+        """Get the RDB doc for a block, or None if it could not be loaded."""
+        if entry.name not in self._docs:
+            try:
+                if self.doc_cache is not None:
+                    doc = self.doc_cache.load(
+                        entry.header, KonaRdbDoc, entry.base, entry.header
+                    )
+                else:
+                    doc = KonaRdbDoc(entry.base, entry.header)
+            except (OSError, ValueError):
+                doc = None
+            self._docs[entry.name] = doc
+        return self._docs[entry.name]
+
+    def lookup_register(self, addr: int) -> tuple[SysmapEntry | None, DocAddr | None]:
+        """
+        Get the block and the documented register that the given absolute
+        address belongs to.
+
+        The register is None if the block has no usable RDB header or the
+        address is not documented in it.
+        """
+        entry = self._find(addr)
+        if entry is None:
+            return None, None
+        doc = self.doc(entry)
+        if doc is None:
+            return entry, None
+        return entry, doc[addr - entry.base]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
 def lookup_header_from_sysmap(base_addr: int, sysmap_path: str):
     """
     Get the corresponding header path for the component based on the base
     address and the given sysmap header.
     """
+    entry = SysmapIndex.from_file(sysmap_path).lookup_base(base_addr)
+    if entry is None:
+        return None
+    return entry.header
 
-    # brcm_rdb_sysmap.h includes a list of defines for each component's base
-    # address, with a comment listing the relevant header file for internal
-    # offsets.
 
-    header_parsed = HeaderParser(sysmap_path).data
+@dataclass(slots=True)
+class RdbLoadResult:
+    """Result of loading the RDB doc for a block; see load_rdb_docs."""
 
-    for key, val in header_parsed.items():
-        if int(val.split("/*")[0].strip(), 16) == base_addr:
-            return os.path.join(
-                os.path.dirname(sysmap_path),
-                val.split("*")[1].strip()
-            )
+    #: Block the doc belongs to.
+    entry: SysmapEntry
 
-    return None
+    #: The loaded doc, or None if loading failed.
+    doc: KonaRdbDoc | None = None
+
+    #: Name of the exception raised while loading the doc, if any.
+    error_type: str | None = None
+
+    #: Message of the exception raised while loading the doc, if any.
+    error: str | None = None
+
+    def __bool__(self):
+        return self.doc is not None
+
+
+def _load_rdb_doc(entry: SysmapEntry, doc_cache: DocCache | None = None) -> RdbLoadResult:
+    """Load the RDB doc for a single block; used by load_rdb_docs."""
+    try:
+        if doc_cache is not None:
+            doc = doc_cache.load(entry.header, KonaRdbDoc, entry.base, entry.header)
+        else:
+            doc = KonaRdbDoc(entry.base, entry.header)
+    except (OSError, ValueError) as e:
+        return RdbLoadResult(
+            entry=entry, error_type=type(e).__name__, error=str(e)
+        )
+    return RdbLoadResult(entry=entry, doc=doc)
 
 
-def gen_dump_commands(sysmap_path: str):
+def load_rdb_docs(
+    sysmap_path: str,
+    processes: int | None = None,
+    doc_cache: DocCache | None = None
+) -> list[RdbLoadResult]:
     """
-    Get a list of dump commands to run for each address listed in the sysmap.
+    Load the RDB docs for all blocks listed in the sysmap, in parallel.
+
+    :param sysmap_path: Path to the sysmap header
+    :param processes: Amount of worker processes; defaults to the amount of
+                      CPUs, 1 loads the docs in the current process
+    :param doc_cache: Cache to load the docs through, if any
+    :returns: One result per block, in the order the blocks are listed in
+              the sysmap; blocks that failed to load have the error set
     """
+    entries = SysmapIndex.from_file(sysmap_path).entries
+    load = partial(_load_rdb_doc, doc_cache=doc_cache)
 
-    # brcm_rdb_sysmap.h includes a list of defines for each component's base
-    # address, with a comment listing the relevant header file for internal
-    # offsets.
+    if processes == 1 or len(entries) < 2:
+        return [load(entry) for entry in entries]
 
-    header_parsed = HeaderParser(sysmap_path).data
+    # Imported here, as multiprocessing takes a while to import and most
+    # users of this module never need it
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(load, entries, chunksize=4))
 
-    for key, val in header_parsed.items():
-        print("#", key)
-        addr = int(val.split("/*")[0].strip(), 16)
-        rdb = os.path.join(
-            os.path.dirname(sysmap_path),
-            val.split("*")[1].strip()
-        )
-        try:
-            doc = KonaRdbDoc(addr, rdb)
-        except:
-            print("# failed to find rdb")
+
+def gen_dump_commands(sysmap_path: str, processes: int | None = None):
+    """
+    Get a list of dump commands to run for each address listed in the sysmap.
+    """
+    for result in load_rdb_docs(sysmap_path, processes=processes):
+        print("#", result.entry.name)
+        if not result:
+            print(f"# failed to load rdb: {result.error_type}: {result.error}")
             continue
         print(f"echo ''")
-        print(f"echo '!! {key}'")
-        print(f"sudo ./devmem-read-block.sh {hex(addr)} {hex(doc.size)}")
+        print(f"echo '!! {result.entry.name}'")
+        print(f"sudo ./devmem-read-block.sh {hex(result.entry.base)} {hex(result.doc.size)}")
 
     return None
@@ -1,29 +1,709 @@
 # SPDX-License-Identifier: MIT
 
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+import os
+import re
+
+from . import stats
+
+# Matches, in order: a complete block comment, a block comment that continues
+# on the next line, a line comment and a string literal (so that comment
+# delimiters inside strings are skipped).
+_COMMENT_RE = re.compile(r'(/\*.*?\*/)|(/\*.*)|(//.*)|("(?:\\.|[^"\\])*")')
+
+# Matches a run of lines that are either empty or a plain "#define NAME VALUE"
+# with a single-token value and no comments. Most lines of generated headers
+# look like this, and such runs can be split up without going through them
+# line by line.
+_PLAIN_DEFINES_RE = re.compile(
+    r"^(?:[ \t]*#define[ \t]+[A-Za-z_]\w*[ \t]+[^\s/\\]+[ \t]*(?:\n|\Z)|[ \t]*\n)+", re.M
+)
+
+_DEFINE_RE = re.compile(r"([A-Za-z_]\w*)(\(([^)]*)\))?\s*(.*)", re.S)
+
+_TOKEN_RE = re.compile(
+    r"\s*(?:"
+    r"(0[xX][0-9a-fA-F]+|\d+)[uUlL]*"
+    r"|([A-Za-z_]\w*)"
+    r"|(<<|>>|<=|>=|==|!=|&&|\|\||[-+*/%()~!<>&^|?:,])"
+    r")"
+)
+
+#: Type names that are skipped when used in casts, e.g. "(UInt32)0x1".
+TYPE_NAMES = frozenset((
+    "char", "short", "int", "long", "signed", "unsigned",
+    "UInt8", "UInt16", "UInt32", "UInt64", "Int8", "Int16", "Int32", "Int64",
+    "uint8_t", "uint16_t", "uint32_t", "uint64_t",
+    "int8_t", "int16_t", "int32_t", "int64_t",
+    "u8", "u16", "u32", "u64", "s8", "s16", "s32", "s64",
+))
+
+_BINARY_PRECEDENCE = {
+    "||": 1, "&&": 2, "|": 3, "^": 4, "&": 5,
+    "==": 6, "!=": 6, "<": 7, "<=": 7, ">": 7, ">=": 7,
+    "<<": 8, ">>": 8, "+": 9, "-": 9, "*": 10, "/": 10, "%": 10,
+}
+
+#: Directives the preprocessor acts on; all others are dropped by the lexer.
+DIRECTIVES = frozenset((
+    "define", "undef", "include", "if", "ifdef", "ifndef", "elif", "else", "endif",
+))
+
+#: Pseudo-directive used by the lexer for a run of plain defines; its
+#: arguments are a list of (name, value) tuples.
+DEFINES = "defines"
+
+#: Approximate amount of characters the lexer reads at once.
+LEX_CHUNK_SIZE = 16 * 1024
+
+#: Maximum amount of lexed included files that are kept in memory.
+LEX_CACHE_SIZE = 64
+
+
+def _strip_comments(line: str) -> tuple[str, list[str], str | None]:
+    """
+    Remove the comments from a line.
+
+    Returns the line without comments, the text of the comments and, if the
+    line ends inside a block comment, the start of that comment.
+    """
+    comments = []
+    open_comment = None
+
+    def replace_comment(match):
+        nonlocal open_comment
+        closed, unclosed, line_comment, string = match.groups()
+        if string is not None:
+            return string
+        if unclosed is not None:
+            open_comment = unclosed
+        else:
+            comments.append(closed or line_comment)
+        return " "
+
+    return _COMMENT_RE.sub(replace_comment, line), comments, open_comment
+
+
+def _comment_text(comments: list[str]) -> str:
+    """Join the text of comments, without the comment delimiters."""
+    return " ".join(comment.strip("/*").strip() for comment in comments)
+
+
+def _plain_defines(chunk: str) -> list[tuple[str, str]] | None:
+    """
+    Get the defines in a chunk of lines, if every line in it is either
+    empty or a plain "#define NAME VALUE" line, with a single-token value
+    and no comments. Returns None otherwise.
+
+    This is checked before looking for runs of plain defines in the chunk
+    with _PLAIN_DEFINES_RE, which takes longer.
+    """
+    if "/" in chunk or "\\" in chunk:
+        return None
+    lines = chunk.split("\n")
+    count = len(lines) - lines.count("")
+    if chunk.count("\n#define") + chunk.startswith("#define") != count:
+        return None
+    # Each line starts with "#define" and there are no other "#define"
+    # tokens, so three tokens per define mean three tokens on every line
+    tokens = chunk.split()
+    if (len(tokens) != 3 * count or tokens.count("#define") != count
+            or tokens[::3].count("#define") != count):
+        return None
+    names = tokens[1::3]
+    # Function-like macros have a parenthesis right after the name
+    if "(" in "".join(names):
+        return None
+    return list(zip(names, tokens[2::3]))
+
+
+def _lex(chunks: Iterable[str]) -> Iterator[tuple[str, str | list, str]]:
+    """
+    Get the preprocessor directives from a file, read in chunks of whole
+    lines.
+
+    Yields (directive, arguments, comment) tuples for the directives in
+    DIRECTIVES, with line continuations joined, comments removed from the
+    arguments and whitespace in them collapsed. Runs of plain defines are
+    yielded as a single (DEFINES, [(name, value), ...], "") tuple instead, so
+    that they do not need to be handled line by line.
+    """
+    # Set while inside a block comment that started on an earlier line
+    in_comment = False
+    # (directive, arguments, comments) of a directive whose trailing block
+    # comment continues on the next lines; the lines of the open comment
+    # are added to its comments once it ends
+    pending = None
+    comment_lines = []
+    continued = []
+
+    def lex_lines(text):
+        nonlocal in_comment, pending
+        for line in text.splitlines():
+            if line.endswith("\\"):
+                continued.append(line[:-1])
+                continue
+            if continued:
+                continued.append(line)
+                line = "".join(continued)
+                continued.clear()
+
+            if in_comment:
+                end = line.find("*/")
+                if end == -1:
+                    if pending is not None:
+                        comment_lines.append(line)
+                    continue
+                in_comment = False
+                if pending is not None:
+                    comment_lines.append(line[:end + 2])
+                    directive, args, comments = pending
+                    comments.append("\n".join(comment_lines))
+                    yield directive, args, _comment_text(comments)
+                    pending = None
+                    comment_lines.clear()
+                # Whatever follows the comment is not a directive, but it
+                # may start another comment
+                line = line[end + 2:]
+                if "/*" in line:
+                    in_comment = _strip_comments(line)[2] is not None
+                continue
+
+            stripped = line.lstrip()
+            if not stripped.startswith("#"):
+                if "/*" in line:
+                    in_comment = _strip_comments(line)[2] is not None
+                continue
+
+            comments = None
+            open_comment = None
+            if "/" in stripped:
+                stripped, comments, open_comment = _strip_comments(stripped)
+                in_comment = open_comment is not None
+
+            split = stripped[1:].split()
+            if not split or split[0] not in DIRECTIVES:
+                continue
+            directive = split[0]
+            args = " ".join(split[1:])
+
+            if open_comment is not None:
+                pending = (directive, args, comments)
+                comment_lines.append(open_comment)
+            else:
+                yield directive, args, _comment_text(comments) if comments else ""
+
+    for chunk in chunks:
+        if not (in_comment or continued):
+            defines = _plain_defines(chunk)
+            if defines is not None:
+                if defines:
+                    yield DEFINES, defines, ""
+                continue
+
+        pos = 0
+        for match in _PLAIN_DEFINES_RE.finditer(chunk):
+            start, end = match.span()
+            if start != pos:
+                yield from lex_lines(chunk[pos:start])
+            pos = end
+            # Inside a comment or a continued line, the run is not made of
+            # defines after all
+            if in_comment or continued:
+                yield from lex_lines(chunk[start:end])
+                continue
+            # Every non-empty line in the run has exactly three tokens
+            tokens = match.group().split()
+            if tokens:
+                yield DEFINES, list(zip(tokens[1::3], tokens[2::3])), ""
+        if pos != len(chunk):
+            yield from lex_lines(chunk[pos:])
+
+    if pending is not None:
+        # The comment is never closed
+        directive, args, comments = pending
+        comments.append("\n".join(comment_lines))
+        yield directive, args, _comment_text(comments)
+
+
+def _lex_file(path: str) -> Iterator[tuple[str, str | list, str]]:
+    """Lex a file as it is read; see _lex."""
+    with open(path, errors="replace") as header_file:
+        stats.count("header_parser.files_lexed")
+        stats.count("header_parser.bytes_read", os.fstat(header_file.fileno()).st_size)
+        # Chunks are extended to the end of their last line
+        chunks = iter(lambda: header_file.read(LEX_CHUNK_SIZE) + header_file.readline(), "")
+        yield from _lex(chunks)
+
+
+@lru_cache(maxsize=LEX_CACHE_SIZE)
+def _lex_cached(path: str, mtime_ns: int) -> tuple[tuple[str, str | list, str], ...]:
+    """Lex a file and keep the result; see _lex_included."""
+    return tuple(_lex_file(path))
+
+
+def _lex_included(path: str) -> tuple[tuple[str, str | list, str], ...]:
+    """
+    Get the preprocessor directives of an included file.
+
+    Included files are often shared between many headers, so the results
+    for the LEX_CACHE_SIZE most recently used ones are kept until the files
+    change.
+    """
+    path = os.path.abspath(path)
+    hits = _lex_cached.cache_info().hits
+    directives = _lex_cached(path, os.stat(path).st_mtime_ns)
+    if _lex_cached.cache_info().hits != hits:
+        stats.count("header_parser.lex_cache_hits")
+    return directives
+
+
 class HeaderParser:
     """
     Turns a header into a dictionary.
 
-    (Note: currently very rudimentary.)
+    Runs a small in-process C preprocessor over the header: comments and
+    line continuations are handled, #ifdef/#ifndef/#if/#elif/#else/#endif
+    blocks are evaluated, and #include directives are followed. Macro values
+    can be evaluated as integer constant expressions with HeaderParser.eval.
     """
 
-    def __init__(self, path: str, flags: dict[str, str] | None = None):
-        if flags:
-            raise NotImplementedError(
-                "TODO - shell out to a compiler to handle ifdefs"
+    def __init__(
+        self,
+        path: str,
+        flags: dict[str, str] | None = None,
+        include_dirs: list[str] | None = None
+    ):
+        """
+        :param path: Path to the header
+        :param flags: Macros to define before parsing, like -D compiler flags;
+                      use an empty string as the value for plain flags
+        :param include_dirs: Directories to search for included files, like
+                             -I compiler flags
+        """
+        self.path = path
+        self.include_dirs = include_dirs or []
+
+        #: Object-like macros defined in the header itself (not in included
+        #: files), in definition order, with comments removed from the values.
+        self.data: dict[str, str] = {}
+
+        #: Trailing comments of the defines in HeaderParser.data.
+        self.comments: dict[str, str] = {}
+
+        #: All object-like macros, including ones from flags and included files.
+        self.macros: dict[str, str] = dict(flags or {})
+
+        #: All function-like macros, as (parameters, body) tuples.
+        self.functions: dict[str, tuple[list[str], str]] = {}
+
+        #: Included files that could not be found.
+        self.missing_includes: list[str] = []
+
+        #: Files read while parsing: the header itself and the included files.
+        self.files: list[str] = [path]
+
+        #: Paths that were searched for included files but did not exist;
+        #: the result of parsing changes if any of them is created.
+        self.missing_files: list[str] = []
+
+        self._memo: dict[str, int] = {}
+
+        # Until a macro is defined by anything other than the header itself,
+        # HeaderParser.data and HeaderParser.macros hold the same macros, so
+        # they share a dict to avoid adding every define twice
+        if not self.macros:
+            self.data = self.macros
+
+        with stats.timer("header_parser.parse"):
+            self._preprocess(path, _lex_file(path), depth=0)
+            if self.data is self.macros:
+                self.data = dict(self.macros)
+
+    def _preprocess(self, path: str, directives: Iterable[tuple[str, str | list, str]], depth: int):
+        """Run the preprocessor over the directives of a file."""
+        if depth > 64:
+            raise ValueError(f"#include nested too deeply in {path}")
+
+        # Each entry is (parent_active, branch_taken, active)
+        stack: list[tuple[bool, bool, bool]] = []
+        active = True
+        define = self._define
+        top_level = depth == 0
+
+        for directive, args, comment in directives:
+            # Defines make up nearly all of a header, so they are checked first
+            if directive == DEFINES:
+                if active:
+                    self._define_plain(args, top_level)
+                continue
+            if directive == "define":
+                if active:
+                    define(args, comment, top_level)
+                continue
+
+            if directive in ("ifdef", "ifndef", "if"):
+                if not active:
+                    stack.append((False, True, False))
+                    continue
+                if directive == "if":
+                    cond = self._evaluate_condition(args)
+                else:
+                    name = args.strip()
+                    cond = name in self.macros or name in self.functions
+                    if directive == "ifndef":
+                        cond = not cond
+                stack.append((True, cond, cond))
+                active = cond
+                continue
+
+            if directive in ("elif", "else", "endif"):
+                if not stack:
+                    raise ValueError(f"#{directive} without #if in {path}")
+                parent_active, taken, _ = stack.pop()
+                if directive == "endif":
+                    active = parent_active
+                    continue
+                if directive == "elif":
+                    cond = (parent_active and not taken
+                            and self._evaluate_condition(args))
+                else:
+                    cond = parent_active and not taken
+                stack.append((parent_active, taken or cond, cond))
+                active = cond
+                continue
+
+            if not active:
+                continue
+
+            if directive == "undef":
+                name = args.strip()
+                for d in self.data, self.comments, self.macros, self.functions:
+                    d.pop(name, None)
+                self._memo.clear()
+            elif directive == "include":
+                self._include(path, args.strip(), depth)
+
+        if stack:
+            raise ValueError(f"unterminated #if in {path}")
+
+    def _define(self, args: str, comment: str, top_level: bool):
+        """Handle a #define directive."""
+        if self._memo:
+            self._memo.clear()
+
+        name, _, value = args.partition(" ")
+        # Function-like macros and anything unusual go through the regex
+        if not name.isidentifier():
+            match = _DEFINE_RE.match(args)
+            if match is None:
+                return
+            name, is_function, params, value = match.groups()
+            if is_function:
+                self.functions[name] = (
+                    [p.strip() for p in params.split(",") if p.strip()], value
+                )
+                return
+
+        if top_level:
+            self.data[name] = value
+            if comment:
+                self.comments[name] = comment
+        elif self.data is self.macros:
+            self.data = dict(self.macros)
+        self.macros[name] = value
+
+    def _define_plain(self, defines: list[tuple[str, str]], top_level: bool):
+        """Handle a run of plain defines from the lexer."""
+        self._memo.clear()
+        if top_level:
+            self.data.update(defines)
+            if self.data is self.macros:
+                return
+        elif self.data is self.macros:
+            self.data = dict(self.macros)
+        self.macros.update(defines)
+
+    def _include(self, path: str, target: str, depth: int):
+        """Handle an #include directive."""
+        if target.startswith('"') and target.endswith('"'):
+            search = [os.path.dirname(path), *self.include_dirs]
+        elif target.startswith("<") and target.endswith(">"):
+            search = self.include_dirs
+        else:
+            # Computed includes are not supported
+            return
+
+        for include_dir in search:
+            include_path = os.path.join(include_dir, target[1:-1])
+            if os.path.isfile(include_path):
+                self.files.append(include_path)
+                self._preprocess(include_path, _lex_included(include_path), depth + 1)
+                return
+            self.missing_files.append(include_path)
+        self.missing_includes.append(target[1:-1])
+
+    #
+    # Expression evaluation
+    #
+
+    @staticmethod
+    def _tokenize(expr: str) -> list[str]:
+        """Split a C expression into tokens."""
+        tokens = []
+        pos = 0
+        expr = expr.rstrip()
+        while pos < len(expr):
+            match = _TOKEN_RE.match(expr, pos)
+            if match is None or match.end() == pos:
+                raise ValueError(f"invalid token in expression: {expr!r}")
+            tokens.append(match.group(1) or match.group(2) or match.group(3))
+            pos = match.end()
+        return tokens
+
+    def _expand(self, tokens: list[str], hide: frozenset = frozenset()) -> list[str]:
+        """Expand the macros in a list of tokens."""
+        out = []
+        i = 0
+        while i < len(tokens):
+            tok = tokens[i]
+            if tok in hide:
+                out.append(tok)
+                i += 1
+            elif tok in self.macros:
+                out.extend(self._expand(
+                    self._tokenize(self.macros[tok]), hide | {tok}
+                ))
+                i += 1
+            elif tok in self.functions and i + 1 < len(tokens) and tokens[i + 1] == "(":
+                params, body = self.functions[tok]
+                args: list[list[str]] = [[]]
+                depth = 0
+                i += 2
+                while i < len(tokens):
+                    arg_tok = tokens[i]
+                    i += 1
+                    if arg_tok == "(":
+                        depth += 1
+                    elif arg_tok == ")":
+                        if depth == 0:
+                            break
+                        depth -= 1
+                    elif arg_tok == "," and depth == 0:
+                        args.append([])
+                        continue
+                    args[-1].append(arg_tok)
+                else:
+                    raise ValueError(f"unterminated call to macro {tok}")
+
+                if args == [[]]:
+                    args = []
+                if len(args) != len(params):
+                    raise ValueError(
+                        f"macro {tok} takes {len(params)} arguments, got {len(args)}"
+                    )
+                expanded_args = {
+                    param: self._expand(arg, hide)
+                    for param, arg in zip(params, args)
+                }
+                body_tokens = []
+                for body_tok in self._tokenize(body):
+                    if body_tok in expanded_args:
+                        body_tokens.extend(["(", *expanded_args[body_tok], ")"])
+                    else:
+                        body_tokens.append(body_tok)
+                out.extend(self._expand(body_tokens, hide | {tok}))
+            else:
+                out.append(tok)
+                i += 1
+        return out
+
+    def _evaluate_condition(self, expr: str) -> bool:
+        """Evaluate the condition of an #if or #elif directive."""
+        tokens = self._tokenize(expr)
+
+        # "defined" needs to be resolved before macros get expanded
+        resolved = []
+        i = 0
+        while i < len(tokens):
+            if tokens[i] != "defined":
+                resolved.append(tokens[i])
+                i += 1
+                continue
+            if i + 1 < len(tokens) and tokens[i + 1] == "(":
+                name = tokens[i + 2] if i + 2 < len(tokens) else ""
+                i += 4
+            else:
+                name = tokens[i + 1] if i + 1 < len(tokens) else ""
+                i += 2
+            resolved.append(
+                "1" if name in self.macros or name in self.functions else "0"
             )
 
-        with open(path) as header_file:
-            self._raw = header_file.read()
+        return bool(_ExprParser(self._expand(resolved), strict=False).parse())
+
+    def evaluate(self, expr: str) -> int:
+        """
+        Evaluate a C integer constant expression, expanding macros.
+
+        Raises ValueError if the expression is not a constant expression.
+        Values are not truncated to any integer width.
+        """
+        return _ExprParser(self._expand(self._tokenize(expr)), strict=True).parse()
 
-        self.data = {}
-        for line in self._raw.split("\n"):
-            line = line.strip().replace("\t", " ")
-            if line.startswith("#define"):
-                split = line.split()
-                self.data[split[1]] = ' '.join(split[2:])
+    def eval(self, name: str) -> int:
+        """
+        Evaluate the value of a macro as an integer constant expression.
+
+        Results are memoized. Raises KeyError if the macro is not defined,
+        and ValueError if its value is not a constant expression.
+        """
+        if name not in self._memo:
+            self._memo[name] = self.evaluate(self.macros[name])
+        return self._memo[name]
 
     def __getitem__(self, index: str):
         return self.data[index]
 
 
+class _ExprParser:
+    """Precedence-climbing parser for C integer constant expressions."""
+
+    def __init__(self, tokens: list[str], strict: bool):
+        """
+        :param tokens: Tokens of the expression, with macros expanded
+        :param strict: If False, unknown identifiers evaluate to 0 (as in
+                       #if conditions); if True, they raise ValueError
+        """
+        self.tokens = tokens
+        self.strict = strict
+        self.pos = 0
+        # Nonzero while parsing an operand whose value is not used, like the
+        # right operand of "0 && ..."; errors in its evaluation are ignored
+        self.skip = 0
+
+    def _peek(self) -> str | None:
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def _next(self) -> str:
+        tok = self._peek()
+        if tok is None:
+            raise ValueError("unexpected end of expression")
+        self.pos += 1
+        return tok
+
+    def _expect(self, tok: str):
+        if self._next() != tok:
+            raise ValueError(f"expected {tok!r} in expression")
+
+    def parse(self) -> int:
+        if not self.tokens:
+            raise ValueError("empty expression")
+        value = self._ternary()
+        # Comma operator: the last value wins
+        while self._peek() == ",":
+            self._next()
+            value = self._ternary()
+        if self._peek() is not None:
+            raise ValueError(f"unexpected {self._peek()!r} in expression")
+        return value
+
+    def _ternary(self) -> int:
+        cond = self._binary(1)
+        if self._peek() != "?":
+            return cond
+        self._next()
+        if_true = self._operand(bool(cond), self._ternary)
+        self._expect(":")
+        if_false = self._operand(not cond, self._ternary)
+        return if_true if cond else if_false
+
+    def _binary(self, min_prec: int) -> int:
+        left = self._unary()
+        while True:
+            op = self._peek()
+            prec = _BINARY_PRECEDENCE.get(op)
+            if prec is None or prec < min_prec:
+                return left
+            self._next()
+            if op == "&&":
+                right = self._operand(bool(left), lambda: self._binary(prec + 1))
+            elif op == "||":
+                right = self._operand(not left, lambda: self._binary(prec + 1))
+            else:
+                right = self._binary(prec + 1)
+            left = 0 if self.skip else self._apply(op, left, right)
+
+    def _operand(self, evaluate: bool, parse) -> int:
+        """
+        Parse an operand of && or || or a branch of ?:, only evaluating it if
+        evaluate is set; otherwise it is only checked for syntax.
+        """
+        if evaluate:
+            return parse()
+        self.skip += 1
+        try:
+            parse()
+        finally:
+            self.skip -= 1
+        return 0
+
+    @staticmethod
+    def _apply(op: str, a: int, b: int) -> int:
+        if op in ("/", "%"):
+            if b == 0:
+                raise ValueError("division by zero in expression")
+            # C division truncates towards zero
+            quot = abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1)
+            return quot if op == "/" else a - b * quot
+        if op in ("<<", ">>") and b < 0:
+            raise ValueError("negative shift in expression")
+        return {
+            "||": lambda: int(bool(a) or bool(b)),
+            "&&": lambda: int(bool(a) and bool(b)),
+            "|": lambda: a | b, "^": lambda: a ^ b, "&": lambda: a & b,
+            "==": lambda: int(a == b), "!=": lambda: int(a != b),
+            "<": lambda: int(a < b), "<=": lambda: int(a <= b),
+            ">": lambda: int(a > b), ">=": lambda: int(a >= b),
+            "<<": lambda: a << b, ">>": lambda: a >> b,
+            "+": lambda: a + b, "-": lambda: a - b, "*": lambda: a * b,
+        }[op]()
+
+    def _unary(self) -> int:
+        tok = self._next()
+        if tok == "-":
+            return -self._unary()
+        if tok == "+":
+            return self._unary()
+        if tok == "~":
+            return ~self._unary()
+        if tok == "!":
+            return int(not self._unary())
+        if tok == "(":
+            # Casts to known types are skipped
+            end = self.pos
+            while end < len(self.tokens) and self.tokens[end] in TYPE_NAMES:
+                end += 1
+            if end > self.pos and end < len(self.tokens) and self.tokens[end] == ")":
+                self.pos = end + 1
+                return self._unary()
+            value = self._ternary()
+            while self._peek() == ",":
+                self._next()
+                value = self._ternary()
+            self._expect(")")
+            return value
+        if tok[0].isdigit():
+            if tok[:2] in ("0x", "0X"):
+                return int(tok, 16)
+            if tok.startswith("0") and len(tok) > 1:
+                return int(tok, 8)
+            return int(tok)
+        if tok[0].isalpha() or tok[0] == "_":
+            if self.strict and not self.skip:
+                raise ValueError(f"unknown identifier {tok!r} in expression")
+            return 0
+        raise ValueError(f"unexpected {tok!r} in expression")
@@ -0,0 +1,297 @@
+# SPDX-License-Identifier: MIT
+"""
+On-device access to I2C devices through the kernel's i2c-dev interface.
+
+Register access goes through a transport, so that a FakeTransport holding
+an in-memory register map can stand in for a real bus in tests.
+"""
+
+from abc import ABC, abstractmethod
+from array import array
+import ctypes
+import fcntl
+import os
+
+from .dump import Dump
+
+# ioctls and flags from <linux/i2c-dev.h> and <linux/i2c.h>
+I2C_SLAVE = 0x0703
+I2C_SLAVE_FORCE = 0x0706
+I2C_FUNCS = 0x0705
+I2C_RDWR = 0x0707
+I2C_SMBUS = 0x0720
+
+I2C_M_RD = 0x0001
+
+I2C_FUNC_I2C = 0x00000001
+I2C_FUNC_SMBUS_READ_BYTE_DATA = 0x00080000
+I2C_FUNC_SMBUS_READ_I2C_BLOCK = 0x04000000
+
+I2C_SMBUS_READ = 1
+I2C_SMBUS_WRITE = 0
+I2C_SMBUS_BYTE_DATA = 2
+I2C_SMBUS_I2C_BLOCK_DATA = 8
+I2C_SMBUS_BLOCK_MAX = 32
+
+#: Default amount of registers to read in one transaction.
+DEFAULT_BLOCK_SIZE = I2C_SMBUS_BLOCK_MAX
+
+
+class _I2cMsg(ctypes.Structure):
+    _fields_ = [
+        ("addr", ctypes.c_uint16),
+        ("flags", ctypes.c_uint16),
+        ("len", ctypes.c_uint16),
+        ("buf", ctypes.POINTER(ctypes.c_uint8)),
+    ]
+
+
+class _I2cRdwrIoctlData(ctypes.Structure):
+    _fields_ = [
+        ("msgs", ctypes.POINTER(_I2cMsg)),
+        ("nmsgs", ctypes.c_uint32),
+    ]
+
+
+class _I2cSmbusData(ctypes.Union):
+    _fields_ = [
+        ("byte", ctypes.c_uint8),
+        ("word", ctypes.c_uint16),
+        ("block", ctypes.c_uint8 * (I2C_SMBUS_BLOCK_MAX + 2)),
+    ]
+
+
+class _I2cSmbusIoctlData(ctypes.Structure):
+    _fields_ = [
+        ("read_write", ctypes.c_uint8),
+        ("command", ctypes.c_uint8),
+        ("size", ctypes.c_uint32),
+        ("data", ctypes.POINTER(_I2cSmbusData)),
+    ]
+
+
+class I2CTransport(ABC):
+    """
+    Register access to a single I2C device with 8-bit registers.
+
+    Transports raise OSError for failed transactions.
+    """
+
+    #: Maximum amount of registers read_block can read at once.
+    max_block = 1
+
+    @abstractmethod
+    def read_byte(self, reg: int) -> int:
+        """Read a single register."""
+
+    def read_block(self, reg: int, length: int) -> bytes:
+        """
+        Read length consecutive registers, starting at reg, in a single
+        transaction.
+        """
+        if length == 1:
+            return bytes((self.read_byte(reg),))
+        raise OSError("block reads are not supported")
+
+    @abstractmethod
+    def write_byte(self, reg: int, value: int):
+        """Write a single register."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SMBusTransport(I2CTransport):
+    """
+    Transport over /dev/i2c-N.
+
+    Block reads are done as combined write/read I2C transfers if the adapter
+    supports plain I2C, or as SMBus I2C block reads (of up to 32 bytes)
+    otherwise.
+    """
+
+    def __init__(self, bus: int, dev_addr: int, force: bool = True):
+        """
+        :param bus: Number of the I2C bus
+        :param dev_addr: 7-bit address of the device
+        :param force: Access the device even if a driver has claimed it,
+                      like i2cget -f
+        """
+        self.bus = bus
+        self.dev_addr = dev_addr
+        self._fd = os.open(f"/dev/i2c-{bus}", os.O_RDWR)
+        try:
+            fcntl.ioctl(self._fd, I2C_SLAVE_FORCE if force else I2C_SLAVE, dev_addr)
+            funcs = ctypes.c_ulong()
+            fcntl.ioctl(self._fd, I2C_FUNCS, funcs)
+        except OSError:
+            os.close(self._fd)
+            raise
+        self.funcs = funcs.value
+
+        if self.funcs & I2C_FUNC_I2C:
+            # Limited by the 16-bit length of i2c_msg
+            self.max_block = 0xffff
+        elif self.funcs & I2C_FUNC_SMBUS_READ_I2C_BLOCK:
+            self.max_block = I2C_SMBUS_BLOCK_MAX
+
+    def _smbus(self, read_write: int, command: int, size: int, data: _I2cSmbusData):
+        args = _I2cSmbusIoctlData(
+            read_write=read_write, command=command, size=size,
+            data=ctypes.pointer(data)
+        )
+        fcntl.ioctl(self._fd, I2C_SMBUS, args)
+
+    def read_byte(self, reg: int) -> int:
+        data = _I2cSmbusData()
+        self._smbus(I2C_SMBUS_READ, reg, I2C_SMBUS_BYTE_DATA, data)
+        return data.byte
+
+    def read_block(self, reg: int, length: int) -> bytes:
+        if length > self.max_block:
+            raise ValueError(f"can read at most {self.max_block} registers at once")
+
+        if self.funcs & I2C_FUNC_I2C:
+            reg_buf = (ctypes.c_uint8 * 1)(reg)
+            read_buf = (ctypes.c_uint8 * length)()
+            msgs = (_I2cMsg * 2)(
+                _I2cMsg(self.dev_addr, 0, 1, reg_buf),
+                _I2cMsg(self.dev_addr, I2C_M_RD, length, read_buf),
+            )
+            fcntl.ioctl(self._fd, I2C_RDWR, _I2cRdwrIoctlData(msgs, 2))
+            return bytes(read_buf)
+
+        if self.funcs & I2C_FUNC_SMBUS_READ_I2C_BLOCK:
+            data = _I2cSmbusData()
+            data.block[0] = length
+            self._smbus(I2C_SMBUS_READ, reg, I2C_SMBUS_I2C_BLOCK_DATA, data)
+            if data.block[0] != length:
+                raise OSError(f"short block read ({data.block[0]} of {length} bytes)")
+            return bytes(data.block[1:length + 1])
+
+        return super().read_block(reg, length)
+
+    def write_byte(self, reg: int, value: int):
+        data = _I2cSmbusData()
+        data.byte = value
+        self._smbus(I2C_SMBUS_WRITE, reg, I2C_SMBUS_BYTE_DATA, data)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class FakeTransport(I2CTransport):
+    """
+    In-memory stand-in for an I2C device, for testing.
+
+    Accessing a register that is not in the register map fails, as does any
+    block read that touches one.
+    """
+
+    def __init__(self, registers: dict[int, int], max_block: int = I2C_SMBUS_BLOCK_MAX):
+        """
+        :param registers: Register map; missing registers are unreadable
+        :param max_block: Maximum amount of registers per block read, or 1
+                          to emulate a device without block reads
+        """
+        self.registers = registers
+        self.max_block = max_block
+
+        #: Amount of transactions done so far, including failed ones.
+        self.transactions = 0
+
+    def read_byte(self, reg: int) -> int:
+        self.transactions += 1
+        try:
+            return self.registers[reg]
+        except KeyError:
+            raise OSError(f"no such register: {hex(reg)}") from None
+
+    def read_block(self, reg: int, length: int) -> bytes:
+        if length > self.max_block:
+            raise ValueError(f"can read at most {self.max_block} registers at once")
+        self.transactions += 1
+        try:
+            return bytes(self.registers[r] for r in range(reg, reg + length))
+        except KeyError as e:
+            raise OSError(f"no such register: {hex(e.args[0])}") from None
+
+    def write_byte(self, reg: int, value: int):
+        self.transactions += 1
+        if reg not in self.registers:
+            raise OSError(f"no such register: {hex(reg)}")
+        self.registers[reg] = value
+
+
+def read_i2c_block(
+    transport: I2CTransport,
+    size: int = 0xff,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    bus: int | None = None,
+    dev_addr: int | None = None
+) -> Dump:
+    """
+    Dump the registers of an I2C device, from 0 to size inclusive.
+
+    Registers are read in blocks of up to block_size registers; only blocks
+    whose read fails are re-read one register at a time, and registers that
+    still fail are marked as unreadable.
+
+    :param transport: Transport to access the device through
+    :param size: Last register to read
+    :param block_size: Maximum amount of registers to read at once; capped
+                       to what the transport supports
+    :param bus: I2C bus number to write into the dump header, if any
+    :param dev_addr: Device address to write into the dump header, if any
+    """
+    header = {"fmt": "dump", "type": "i2c"}
+    if bus is None and isinstance(transport, SMBusTransport):
+        bus = transport.bus
+    if dev_addr is None and isinstance(transport, SMBusTransport):
+        dev_addr = transport.dev_addr
+    if bus is not None:
+        header["i2c_bus"] = str(bus)
+    if dev_addr is not None:
+        header["dev_addr"] = f"0x{dev_addr:02x}"
+    header.update({
+        "base_addr": "0x00",
+        "size": hex(size),
+        "addr_bits": "8",
+        "val_bits": "8",
+    })
+
+    count = size + 1
+    values = array("B", bytes(count))
+    valid = bytearray((count + 7) // 8)
+
+    def mark_valid(start: int, end: int):
+        for i in range(start, end):
+            valid[i >> 3] |= 1 << (i & 7)
+
+    block_size = max(min(block_size, transport.max_block), 1)
+    for start in range(0, count, block_size):
+        length = min(block_size, count - start)
+        try:
+            values[start:start + length] = array("B", transport.read_block(start, length))
+        except OSError:
+            if length == 1:
+                # Re-reading it on its own would not help
+                continue
+        else:
+            mark_valid(start, start + length)
+            continue
+
+        for reg in range(start, start + length):
+            try:
+                values[reg] = transport.read_byte(reg)
+            except OSError:
+                continue
+            mark_valid(reg, reg + 1)
+
+    return Dump.from_arrays(header, values, valid)
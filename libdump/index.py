@@ -0,0 +1,432 @@
+# SPDX-License-Identifier: MIT
+"""
+Inverted index over a collection of dumps.
+
+For every register of every indexed block, the index records which dumps
+had which value, and which dumps had each bit set. Sets of dumps are stored
+as bitmaps in Python integers (bit n set = dump n is in the set), so that
+queries come down to a few big-integer ANDs and never touch the dump files.
+
+Removed dumps leave unused bits behind in the postings; once they make up
+more than COMPACT_RATIO of all ids, the remaining dumps are renumbered and
+the unused bits are dropped.
+
+Layout of an index directory:
+
+* dumps: marshal-serialized list of the indexed dumps and of the blocks;
+* blocks/NAME: marshal-serialized postings of a single block.
+"""
+
+from collections.abc import Callable, Iterable, Iterator
+import marshal
+from operator import itemgetter
+import os
+
+from .doc import Doc, DocAddr, DocAddrRange
+from .dump import Dump
+
+#: Version of the on-disk index format; bump when it changes.
+INDEX_VERSION = 2
+
+#: Fraction of removed dump ids above which the index is compacted.
+COMPACT_RATIO = 0.25
+
+# Fields of a register's postings
+_READABLE = 0
+_VALUES = 1
+_BITS = 2
+
+
+def block_key(dump: Dump) -> str:
+    """
+    Get the name a dump's block is indexed under, e.g. "mmio:0x3e000000"
+    or "i2c:0:0x08".
+    """
+    if dump.type == "i2c" and "dev_addr" in dump.header:
+        return f"i2c:{dump.header.get('i2c_bus', '?')}:{dump.header['dev_addr']}"
+    return f"{dump.type}:{dump.base_addr:#x}"
+
+
+def _iter_bits(bitmap: int) -> Iterator[int]:
+    """Iterate over the indices of the set bits of an integer."""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+def _squeezer(dead: set[int], count: int) -> Callable[[int], int]:
+    """
+    Get a function that drops the bits of the given dump ids from bitmaps of
+    count ids, shifting the bits above each of them down.
+    """
+    # Bitmaps are formatted as binary strings, most significant bit first;
+    # the character for id n is at index count - 1 - n
+    keep = [count - 1 - n for n in range(count - 1, -1, -1) if n not in dead]
+    fmt = f"0{count}b"
+    if len(keep) < 2:
+        # itemgetter only returns a tuple for two or more items
+        def squeeze(bitmap: int) -> int:
+            bits = format(bitmap, fmt)
+            return int("".join(bits[i] for i in keep) or "0", 2)
+        return squeeze
+
+    getter = itemgetter(*keep)
+
+    def squeeze(bitmap: int) -> int:
+        if not bitmap:
+            return 0
+        return int("".join(getter(format(bitmap, fmt))), 2)
+
+    return squeeze
+
+
+class DumpIndex:
+    """
+    Persistent inverted index over dumps; see the module documentation.
+
+    Queries take the name of a block (see block_key) and the absolute
+    address of a register, and return the paths of the matching dumps.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        """
+        :param path: Index directory; created if it does not exist
+        """
+        self.path = os.fspath(path)
+        self._blocks_dir = os.path.join(self.path, "blocks")
+        os.makedirs(self._blocks_dir, exist_ok=True)
+
+        #: Indexed dumps, by id: (path, mtime_ns, size, block) tuples, or
+        #: None for dumps that were removed from the index.
+        self.dumps: list[tuple[str, int, int, str] | None] = []
+
+        # Names of all blocks that have postings
+        self._block_names: set[str] = set()
+
+        try:
+            with open(os.path.join(self.path, "dumps"), "rb") as dumps_file:
+                version, dumps, block_names = marshal.load(dumps_file)
+        except FileNotFoundError:
+            pass
+        else:
+            if version != INDEX_VERSION:
+                raise ValueError(f"unsupported index version {version}")
+            self.dumps = [tuple(d) if d is not None else None for d in dumps]
+            self._block_names = set(block_names)
+
+        self._ids = {d[0]: i for i, d in enumerate(self.dumps) if d is not None}
+        self._blocks: dict[str, dict[int, list]] = {}
+        self._dirty: set[str] = set()
+
+    # -- Storage --
+
+    def _block_path(self, block: str) -> str:
+        return os.path.join(self._blocks_dir, block.replace(":", "_"))
+
+    def _block(self, block: str) -> dict[int, list]:
+        """Get the postings of a block, loading them if needed."""
+        postings = self._blocks.get(block)
+        if postings is None:
+            try:
+                with open(self._block_path(block), "rb") as block_file:
+                    postings = marshal.load(block_file)
+            except FileNotFoundError:
+                postings = {}
+            self._blocks[block] = postings
+        return postings
+
+    @staticmethod
+    def _write_file(path: str, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as out_file:
+            marshal.dump(data, out_file)
+        os.replace(tmp_path, path)
+
+    def save(self):
+        """
+        Write the changes made to the index to disk, compacting it first if
+        needed.
+        """
+        self._maybe_compact()
+        for block in self._dirty:
+            self._write_file(self._block_path(block), self._blocks[block])
+        self._dirty.clear()
+        self._write_file(
+            os.path.join(self.path, "dumps"),
+            (INDEX_VERSION, self.dumps, sorted(self._block_names))
+        )
+
+    def _maybe_compact(self):
+        """Compact the index if enough dumps were removed from it."""
+        if len(self.dumps) - len(self._ids) > COMPACT_RATIO * len(self.dumps):
+            self.compact()
+
+    def compact(self):
+        """
+        Renumber the dumps in the index so that the ids of removed dumps are
+        no longer used, and drop them from the postings.
+
+        This loads the postings of every block. The index is not saved; see
+        DumpIndex.save.
+        """
+        dead = {dump_id for dump_id, d in enumerate(self.dumps) if d is None}
+        if not dead:
+            return
+        squeeze = _squeezer(dead, len(self.dumps))
+
+        for block in list(self._block_names):
+            postings = self._block(block)
+            for addr, entry in list(postings.items()):
+                readable = squeeze(entry[_READABLE])
+                if not readable:
+                    del postings[addr]
+                    continue
+                entry[_READABLE] = readable
+                for bitmaps in entry[_VALUES], entry[_BITS]:
+                    for key, bitmap in list(bitmaps.items()):
+                        bitmap = squeeze(bitmap)
+                        if bitmap:
+                            bitmaps[key] = bitmap
+                        else:
+                            del bitmaps[key]
+            self._dirty.add(block)
+
+        self.dumps = [d for d in self.dumps if d is not None]
+        self._ids = {d[0]: i for i, d in enumerate(self.dumps)}
+
+    # -- Updating --
+
+    def add(self, dump: Dump) -> int:
+        """
+        Add a dump to the index. The index is not saved; see DumpIndex.save.
+
+        :return: Id of the dump in the index
+        """
+        path = os.path.abspath(dump.filename)
+        if path in self._ids:
+            self.remove(path)
+
+        try:
+            stat = os.stat(path)
+            mtime_ns, size = stat.st_mtime_ns, stat.st_size
+        except OSError:
+            mtime_ns = size = 0
+
+        block = block_key(dump)
+        dump_id = len(self.dumps)
+        self.dumps.append((path, mtime_ns, size, block))
+        self._ids[path] = dump_id
+
+        bit = 1 << dump_id
+        postings = self._block(block)
+        self._dirty.add(block)
+        self._block_names.add(block)
+        values = dump.values
+        valid = dump.valid
+        base_addr, stride = dump.base_addr, dump.stride
+
+        for i in range(dump.count):
+            if not valid[i >> 3] >> (i & 7) & 1:
+                continue
+            addr = base_addr + i * stride
+            entry = postings.get(addr)
+            if entry is None:
+                entry = postings[addr] = [0, {}, {}]
+            entry[_READABLE] |= bit
+
+            value = values[i]
+            value_postings = entry[_VALUES]
+            value_postings[value] = value_postings.get(value, 0) | bit
+
+            bit_postings = entry[_BITS]
+            for n in _iter_bits(value):
+                bit_postings[n] = bit_postings.get(n, 0) | bit
+
+        return dump_id
+
+    def remove(self, path: str | os.PathLike):
+        """
+        Remove a dump from the index.
+
+        The dump's id is retired rather than reused, and its bits are masked
+        out of all query results until the index is compacted; see
+        DumpIndex.compact and COMPACT_RATIO.
+        """
+        dump_id = self._ids.pop(os.path.abspath(path))
+        self.dumps[dump_id] = None
+        self._maybe_compact()
+
+    def update(self, paths: Iterable[str | os.PathLike]) -> tuple[int, int]:
+        """
+        Bring the index up to date with a set of directories and files, and
+        save it.
+
+        Directories are searched recursively. Files that are not dumps are
+        skipped; dumps that are new or were modified since they were indexed
+        are (re-)indexed, and indexed dumps that no longer exist or cannot be
+        read are removed.
+
+        :return: Amount of (re-)indexed dumps and amount of removed dumps
+        """
+        seen = set()
+        added = removed = 0
+
+        def candidates() -> Iterator[str]:
+            for path in paths:
+                path = os.path.abspath(path)
+                if not os.path.isdir(path):
+                    yield path
+                    continue
+                for dirpath, dirnames, filenames in os.walk(path):
+                    if os.path.abspath(dirpath) == os.path.abspath(self.path):
+                        dirnames.clear()
+                        continue
+                    dirnames.sort()
+                    for filename in sorted(filenames):
+                        yield os.path.join(dirpath, filename)
+
+        for path in candidates():
+            seen.add(path)
+            dump_id = self._ids.get(path)
+            try:
+                if dump_id is not None:
+                    stat = os.stat(path)
+                    _path, mtime_ns, size, _block = self.dumps[dump_id]
+                    if (mtime_ns, size) == (stat.st_mtime_ns, stat.st_size):
+                        continue
+                dump = Dump(path)
+                dump.values
+            except (OSError, ValueError, KeyError, UnicodeDecodeError):
+                # Also covers files that disappeared while updating
+                if dump_id is not None:
+                    self.remove(path)
+                    removed += 1
+                continue
+            self.add(dump)
+            added += 1
+
+        for path in list(self._ids):
+            if path not in seen and not os.path.exists(path):
+                self.remove(path)
+                removed += 1
+
+        self.save()
+        return added, removed
+
+    # -- Queries --
+
+    @property
+    def _live(self) -> int:
+        """Bitmap of all dumps that are currently in the index."""
+        out = 0
+        for dump_id in self._ids.values():
+            out |= 1 << dump_id
+        return out
+
+    def _paths(self, bitmap: int) -> list[str]:
+        bitmap &= self._live
+        return [self.dumps[dump_id][0] for dump_id in _iter_bits(bitmap)]
+
+    def blocks(self) -> dict[str, int]:
+        """Get the indexed blocks, with the amount of dumps of each."""
+        out: dict[str, int] = {}
+        for dump_id in self._ids.values():
+            block = self.dumps[dump_id][3]
+            out[block] = out.get(block, 0) + 1
+        return dict(sorted(out.items()))
+
+    def readable(self, block: str, addr: int) -> list[str]:
+        """Get the dumps in which a register is readable."""
+        entry = self._block(block).get(addr)
+        return self._paths(entry[_READABLE]) if entry else []
+
+    def values(self, block: str, addr: int) -> dict[int, list[str]]:
+        """Get every value a register has in the dumps, and where."""
+        entry = self._block(block).get(addr)
+        if entry is None:
+            return {}
+        out = {}
+        for value, bitmap in sorted(entry[_VALUES].items()):
+            paths = self._paths(bitmap)
+            if paths:
+                out[value] = paths
+        return out
+
+    def with_value(self, block: str, addr: int, value: int) -> list[str]:
+        """Get the dumps in which a register has the given value."""
+        entry = self._block(block).get(addr)
+        return self._paths(entry[_VALUES].get(value, 0)) if entry else []
+
+    def with_mask(self, block: str, addr: int, mask: int, value: int | None = None) -> list[str]:
+        """
+        Get the dumps in which the masked bits of a register have the given
+        value; by default, the dumps in which all masked bits are set.
+        """
+        entry = self._block(block).get(addr)
+        if entry is None:
+            return []
+        if value is None:
+            value = mask
+        bitmap = entry[_READABLE]
+        bit_postings = entry[_BITS]
+        for n in _iter_bits(mask):
+            if value >> n & 1:
+                bitmap &= bit_postings.get(n, 0)
+            else:
+                bitmap &= ~bit_postings.get(n, 0)
+            if not bitmap:
+                break
+        return self._paths(bitmap)
+
+    def with_field(
+        self,
+        block: str,
+        doc: Doc,
+        field: str,
+        value: int | None = None,
+        base_addr: int | None = None
+    ) -> list[str]:
+        """
+        Get the dumps in which a documented field has the given value; by
+        default, the dumps in which all of the field's bits are set.
+
+        :param block: Block to look in
+        :param doc: Doc to look the field up in
+        :param field: Name of the field, either on its own or as
+                      "REGISTER.FIELD" if it is ambiguous
+        :param value: Value of the field (not shifted into place)
+        :param base_addr: Base address of the block, which doc addresses are
+                          relative to; defaults to the doc's base address
+        """
+        if base_addr is None:
+            base_addr = doc.base_addr
+        doc_addr, r = find_field(doc, field)
+        mask = ((1 << (r.end_bit - r.start_bit + 1)) - 1) << r.start_bit
+        if value is not None:
+            value <<= r.start_bit
+        return self.with_mask(block, base_addr + doc_addr.addr, mask, value)
+
+
+def find_field(doc: Doc, field: str) -> tuple[DocAddr, DocAddrRange]:
+    """
+    Find a field in a doc by name.
+
+    :param field: Name of the field, either on its own or as
+                  "REGISTER.FIELD"
+    :raises KeyError: if the field is not documented
+    :raises ValueError: if more than one register has a field of that name
+    """
+    addr_name, _, range_name = field.rpartition(".")
+    matches = [
+        (addr, r) for addr in doc.addresses for r in addr.ranges
+        if r.name == range_name and (not addr_name or addr.name == addr_name)
+    ]
+    if not matches:
+        raise KeyError(field)
+    if len(matches) > 1:
+        raise ValueError(
+            f"field {field} is ambiguous; use one of: " +
+            ", ".join(f"{addr.name}.{r.name}" for addr, r in matches)
+        )
+    return matches[0]
@@ -0,0 +1,294 @@
+# SPDX-License-Identifier: MIT
+"""
+On-device access to MMIO blocks through /dev/mem.
+
+Any file can be used in place of /dev/mem, which allows testing on a normal
+machine with a regular file standing in for physical memory.
+"""
+
+from array import array
+import faulthandler
+import mmap
+import os
+import signal
+import stat
+import sys
+
+from . import stats
+from .dump import Dump, _typecode_for_bits
+
+#: Path to the physical memory device.
+DEV_MEM = "/dev/mem"
+
+
+class MemMap:
+    """
+    Memory-mapped window of a block of physical memory (or of a file).
+
+    Pages are mapped individually if the block cannot be mapped at once;
+    pages that cannot be mapped at all (and, for regular files, anything
+    past the end of the file) are reported as unreadable.
+    """
+
+    def __init__(
+        self,
+        base_addr: int,
+        size: int,
+        path: str = DEV_MEM,
+        writable: bool = False
+    ):
+        """
+        :param base_addr: Physical address of the start of the block
+        :param size: Size of the block in bytes
+        :param path: Memory device, or a regular file for testing
+        :param writable: Whether to map the block for writing
+        """
+        self.base_addr = base_addr
+        self.size = size
+        self.path = path
+
+        page_size = mmap.PAGESIZE
+        self._page_size = page_size
+        self._start = base_addr - base_addr % page_size
+        end = base_addr + size
+        self._end = end + -end % page_size
+
+        flags = os.O_RDWR if writable else os.O_RDONLY
+        if hasattr(os, "O_SYNC"):
+            # Makes the kernel map /dev/mem uncached
+            flags |= os.O_SYNC
+        self._fd = os.open(path, flags)
+
+        prot = mmap.PROT_READ | (mmap.PROT_WRITE if writable else 0)
+        end = self._end
+        st = os.fstat(self._fd)
+        if stat.S_ISREG(st.st_mode):
+            end = min(end, st.st_size)
+
+        #: Mapping of the whole block, if it could be mapped at once.
+        self._whole: mmap.mmap | None = None
+        self._whole_end = self._start
+
+        #: Mappings of single pages, if the block could not be mapped at
+        #: once; None for pages that could not be mapped either.
+        self._pages: dict[int, mmap.mmap | None] = {}
+
+        try:
+            if end <= self._start:
+                raise OSError("block is past the end of the file")
+            self._whole = mmap.mmap(
+                self._fd, end - self._start, mmap.MAP_SHARED, prot,
+                offset=self._start
+            )
+            self._whole_end = end
+        except (OSError, ValueError):
+            for page in range(self._start, self._end, page_size):
+                page_end = min(page + page_size, end)
+                try:
+                    if page_end <= page:
+                        raise OSError("page is past the end of the file")
+                    self._pages[page] = mmap.mmap(
+                        self._fd, page_end - page, mmap.MAP_SHARED, prot,
+                        offset=page
+                    )
+                except (OSError, ValueError):
+                    self._pages[page] = None
+
+    def close(self):
+        """Unmap the block and close the memory device."""
+        if self._whole is not None:
+            self._whole.close()
+            self._whole = None
+        for page in self._pages.values():
+            if page is not None:
+                page.close()
+        self._pages = {}
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def view(self, addr: int, width: int) -> memoryview | None:
+        """
+        Get a view of the single value at the given physical address.
+
+        Accessing the view reads or writes the value with one native load
+        or store of the given width (in bits). Returns None if the address
+        is unreadable.
+        """
+        nbytes = width // 8
+        if self._whole is not None:
+            buf, offset = self._whole, addr - self._start
+        else:
+            page = addr - addr % self._page_size
+            buf, offset = self._pages.get(page), addr - page
+        if buf is None or offset < 0 or offset + nbytes > len(buf):
+            return None
+        return memoryview(buf)[offset:offset + nbytes].cast(_typecode_for_bits(width))
+
+    def read(self, addr: int, width: int) -> int | None:
+        """Read a value; returns None if the address is unreadable."""
+        view = self.view(addr, width)
+        if view is None:
+            return None
+        value = view[0]
+        view.release()
+        return value
+
+    def write(self, addr: int, width: int, value: int):
+        """Write a value; raises OSError if the address is unmapped."""
+        view = self.view(addr, width)
+        if view is None:
+            raise OSError(f"address {hex(addr)} is not mapped")
+        view[0] = value
+        view.release()
+
+
+def _read_words(
+    mem: MemMap,
+    base_addr: int,
+    stride: int,
+    width: int,
+    values,
+    valid,
+    start: int,
+    progress=None
+):
+    """
+    Read the registers from index start on into values and valid.
+
+    If progress is given, the index of each register is stored in
+    progress[0] before it is read, so that a fault can be tied back to it.
+    """
+    for i in range(start, len(values)):
+        if progress is not None:
+            progress[0] = i
+        value = mem.read(base_addr + i * stride, width)
+        if value is not None:
+            values[i] = value
+            valid[i >> 3] |= 1 << (i & 7)
+
+
+def _read_words_isolated(
+    mem: MemMap,
+    base_addr: int,
+    stride: int,
+    width: int,
+    values: array,
+    valid: bytearray
+) -> int:
+    """
+    Read the registers in forked children, so that registers that fault on
+    access are marked unreadable instead of killing the process.
+
+    A child reads the registers into memory shared with the parent. If it
+    is killed by SIGBUS or SIGSEGV, the register it was reading is skipped
+    and a new child carries on with the next one. Returns the amount of
+    registers that faulted.
+    """
+    count = len(values)
+    values_len = count * values.itemsize
+    # progress, values and valid, in that order; progress comes first to
+    # keep the values aligned
+    shared = mmap.mmap(-1, 8 + values_len + len(valid))
+    view = memoryview(shared)
+    progress = view[:8].cast("q")
+    shared_values = view[8:8 + values_len].cast(values.typecode)
+    shared_valid = view[8 + values_len:]
+
+    faults = 0
+    start = 0
+    try:
+        while start < count:
+            pid = os.fork()
+            if pid == 0:
+                # Let faults kill the child without running any handlers
+                status = 1
+                try:
+                    faulthandler.disable()
+                    for sig in signal.SIGBUS, signal.SIGSEGV:
+                        signal.signal(sig, signal.SIG_DFL)
+                    _read_words(
+                        mem, base_addr, stride, width,
+                        shared_values, shared_valid, start, progress
+                    )
+                    status = 0
+                except BaseException:
+                    sys.excepthook(*sys.exc_info())
+                finally:
+                    os._exit(status)
+
+            _, wait_status = os.waitpid(pid, 0)
+            if os.WIFEXITED(wait_status) and os.WEXITSTATUS(wait_status) == 0:
+                break
+            if not (os.WIFSIGNALED(wait_status)
+                    and os.WTERMSIG(wait_status) in (signal.SIGBUS, signal.SIGSEGV)):
+                raise OSError(f"reader process failed with status {wait_status}")
+            faults += 1
+            start = progress[0] + 1
+
+        values[:] = array(values.typecode, shared_values)
+        valid[:] = shared_valid
+    finally:
+        progress.release()
+        shared_values.release()
+        shared_valid.release()
+        view.release()
+        shared.close()
+    return faults
+
+
+def read_mmio_block(
+    base_addr: int,
+    size: int,
+    path: str = DEV_MEM,
+    width: int = 32,
+    addr_bits: int = 32,
+    isolate_faults: bool = True
+) -> Dump:
+    """
+    Dump an MMIO block in one pass over a single mapping of memory.
+
+    Registers are read every addr_bits / 8 bytes (the dump format's address
+    stride) from base_addr to base_addr + size inclusive, each with a single
+    access of the given width. Registers that are not mapped, or that fault
+    on access (SIGBUS or SIGSEGV), are marked unreadable.
+
+    :param base_addr: Physical address of the block
+    :param size: Size of the block, i.e. offset of the last register
+    :param path: Memory device, or a regular file for testing
+    :param width: Access width in bits; 8, 16, 32 or 64
+    :param addr_bits: Amount of bits in addresses, as in the dump header
+    :param isolate_faults: Whether to read the registers in a child process,
+                           which is needed to survive faulting registers;
+                           ignored where os.fork is not available
+    """
+    if width not in (8, 16, 32, 64):
+        raise ValueError(f"unsupported access width: {width}")
+
+    header = {
+        "fmt": "dump",
+        "type": "mmio",
+        "base_addr": f"0x{base_addr:08x}",
+        "size": hex(size),
+        "addr_bits": str(addr_bits),
+        "val_bits": str(width),
+    }
+    stride = max(addr_bits // 8, 1)
+    count = size // stride + 1
+
+    values = array(_typecode_for_bits(width))
+    values.frombytes(bytes(count * values.itemsize))
+    valid = bytearray((count + 7) // 8)
+
+    with MemMap(base_addr, count * stride - stride + width // 8, path) as mem:
+        if isolate_faults and hasattr(os, "fork"):
+            faults = _read_words_isolated(mem, base_addr, stride, width, values, valid)
+            stats.count("mmio.faults", faults)
+        else:
+            _read_words(mem, base_addr, stride, width, values, valid, 0)
+
+    return Dump.from_arrays(header, values, valid, filename=path)
@@ -0,0 +1,201 @@
+# SPDX-License-Identifier: MIT
+"""
+Patches: lists of register writes that turn one captured state into another.
+
+A patch file has the same header as a dump (with "fmt" set to "patch"),
+followed by one write per line, in ascending address order:
+
+    0x0000f004 0x00000012
+    0x0000f008 0x00000010 0x000000f0
+
+The optional third column is a mask; only the bits set in it are written,
+and the other bits of the register are kept (read-modify-write).
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+import os
+
+from .diff import DumpDiff, diff_dumps
+from .dump import Dump
+from .i2c import I2CTransport
+from .mmio import DEV_MEM, MemMap
+
+#: Value of the "fmt" header key for patches.
+PATCH_FMT = "patch"
+
+
+@dataclass(slots=True)
+class PatchEntry:
+    """A single register write."""
+
+    #: Address of the register.
+    addr: int
+
+    #: Value to write.
+    value: int
+
+    #: Bits to write, or None to write the whole register.
+    mask: int | None = None
+
+
+class Patch:
+    """List of register writes for a single block, in address order."""
+
+    def __init__(self, header: dict[str, str], entries: Iterable[PatchEntry]):
+        """
+        :param header: Header, as in a dump
+        :param entries: Writes; sorted by address
+        """
+        self.header = dict(header)
+        self.header["fmt"] = PATCH_FMT
+        self.entries = sorted(entries, key=lambda entry: entry.addr)
+
+    @property
+    def type(self) -> str:
+        """Type of the patched block. One of "mmio", "i2c", "unknown"."""
+        return self.header.get("type", "unknown")
+
+    @property
+    def addr_bits(self) -> int:
+        """Amount of bits that the addresses have."""
+        return int(self.header["addr_bits"])
+
+    @property
+    def val_bits(self) -> int:
+        """Amount of bits that the values have."""
+        return int(self.header["val_bits"])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __repr__(self):
+        return f"<Patch {self.type} ({len(self.entries)} writes)>"
+
+
+def diff_to_patch(
+    foo: Dump,
+    bar: Dump,
+    diff: DumpDiff | None = None,
+    masked: bool = False
+) -> Patch:
+    """
+    Create a patch that turns the state captured in foo into the one in bar.
+
+    Registers that changed, or that were unreadable in foo but readable in
+    bar, are written. Registers that are unreadable in bar cannot be
+    restored and are left out.
+
+    :param foo: Dump of the current state
+    :param bar: Dump of the state to restore
+    :param diff: Result of diff_dumps(foo, bar), if already computed
+    :param masked: Only write the bits that changed, keeping the others as
+                   they are on the device (read-modify-write); registers that
+                   were unreadable in foo are always written in full
+    """
+    if diff is None:
+        diff = diff_dumps(foo, bar)
+
+    full_mask = (1 << bar.val_bits) - 1
+    entries = []
+    for addr, xor in zip(diff.changed, diff.xor):
+        mask = xor if masked and xor != full_mask else None
+        entries.append(PatchEntry(addr, bar.data[addr], mask))
+    for addr in diff.became_readable:
+        entries.append(PatchEntry(addr, bar.data[addr]))
+
+    return Patch(bar.header, entries)
+
+
+def load_patch(path: str | os.PathLike) -> Patch:
+    """Read a patch file."""
+    header = {}
+    entries = []
+    with open(path) as patch_file:
+        for line in patch_file:
+            line = line.rstrip("\n")
+            if line == "--- header_end ---":
+                break
+            key, val = line.split(" ")
+            header[key] = val
+
+        if header.get("fmt") != PATCH_FMT:
+            raise ValueError(f"\"fmt\" must be set to \"{PATCH_FMT}\"")
+
+        for line in patch_file:
+            fields = line.split()
+            if len(fields) == 2:
+                entries.append(PatchEntry(int(fields[0], 16), int(fields[1], 16)))
+            elif len(fields) == 3:
+                entries.append(PatchEntry(
+                    int(fields[0], 16), int(fields[1], 16), int(fields[2], 16)
+                ))
+
+    return Patch(header, entries)
+
+
+def patch_to_file(patch: Patch, out_path: str | os.PathLike):
+    """Write a patch to a file."""
+    addr_digits = (patch.addr_bits + 3) // 4
+    val_digits = (patch.val_bits + 3) // 4
+    with open(out_path, "w") as out_file:
+        for key, val in patch.header.items():
+            out_file.write(f"{key} {val}\n")
+        out_file.write("--- header_end ---\n")
+        for entry in patch.entries:
+            line = f"0x{entry.addr:0{addr_digits}x} 0x{entry.value:0{val_digits}x}"
+            if entry.mask is not None:
+                line += f" 0x{entry.mask:0{val_digits}x}"
+            out_file.write(line + "\n")
+
+
+def apply_patch(patch: Patch, target: MemMap | I2CTransport) -> int:
+    """
+    Apply a patch to a device.
+
+    Writes are done in address order; masked writes read the register first
+    and only change the masked bits.
+
+    :param patch: Patch to apply
+    :param target: For MMIO patches, a writable MemMap covering every
+                   patched register (see patch_mem_map); for I2C patches, a
+                   transport for the device
+    :return: Amount of registers written
+    """
+    if isinstance(target, MemMap):
+        width = patch.val_bits
+
+        def read(addr: int) -> int | None:
+            return target.read(addr, width)
+
+        def write(addr: int, value: int):
+            target.write(addr, width, value)
+    else:
+        read, write = target.read_byte, target.write_byte
+
+    for entry in patch.entries:
+        value = entry.value
+        if entry.mask is not None:
+            current = read(entry.addr)
+            if current is None:
+                raise OSError(f"address {hex(entry.addr)} is not mapped")
+            value = current & ~entry.mask | value & entry.mask
+        write(entry.addr, value)
+
+    return len(patch.entries)
+
+
+def patch_mem_map(patch: Patch, path: str = DEV_MEM) -> MemMap:
+    """
+    Map the memory range covered by an MMIO patch for writing.
+
+    :param path: Memory device, or a regular file for testing
+    """
+    if patch.val_bits not in (8, 16, 32, 64):
+        raise ValueError(f"unsupported access width: {patch.val_bits}")
+    if not patch.entries:
+        raise ValueError("patch is empty")
+
+    start = patch.entries[0].addr
+    end = patch.entries[-1].addr + patch.val_bits // 8
+    return MemMap(start, end - start, path, writable=True)
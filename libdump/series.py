@@ -0,0 +1,222 @@
+# SPDX-License-Identifier: MIT
+
+from array import array
+from collections.abc import Sequence
+from functools import cached_property
+
+from .doc import Doc
+from .dump import Dump, _typecode_for_bits
+
+# The bulk operations below treat a whole block of packed values as a single
+# Python integer. AND, OR and XOR never carry between bits, so applying them
+# to the packed integers gives the same result as applying them to every
+# register separately, at the speed of a single big-integer operation.
+
+
+def _to_int(buf) -> int:
+    """Get a buffer's contents as one (little-endian) integer."""
+    return int.from_bytes(memoryview(buf).cast("B"), "little")
+
+
+class DumpSeries:
+    """
+    Series of snapshots of the same block, e.g. taken across power states.
+
+    Snapshots can be labelled to form groups (such as "screen-on" and
+    "screen-off") that can be compared against each other.
+    """
+
+    def __init__(self, dumps: Sequence[Dump], labels: Sequence[str | None] | None = None):
+        """
+        :param dumps: Snapshots; must all cover the same block
+        :param labels: Group label for each snapshot, or None for no group
+        """
+        if not dumps:
+            raise ValueError("a series needs at least one dump")
+        first = dumps[0]
+        for dump in dumps[1:]:
+            if (dump.base_addr, dump.stride, dump.count, dump.val_bits) != \
+               (first.base_addr, first.stride, first.count, first.val_bits):
+                raise ValueError(
+                    f"{dump.filename} does not cover the same block as "
+                    f"{first.filename}"
+                )
+        if labels is not None and len(labels) != len(dumps):
+            raise ValueError("expected one label per dump")
+
+        self.dumps = list(dumps)
+        self.labels = list(labels) if labels is not None else [None] * len(dumps)
+        self.base_addr = first.base_addr
+        self.stride = first.stride
+        self.count = first.count
+        self.val_bits = first.val_bits
+
+        typecode = _typecode_for_bits(self.val_bits)
+        self._itemsize = array(typecode).itemsize
+
+        #: Values of all snapshots, one row of Dump.count values per
+        #: snapshot; see DumpSeries.row.
+        self.values = array(typecode)
+        for dump in self.dumps:
+            # Dumps built with Dump.from_arrays may hold any sequence, or
+            # an array with wider items than needed
+            if getattr(dump.values, "itemsize", None) == self._itemsize:
+                self.values.frombytes(memoryview(dump.values).cast("B"))
+            else:
+                self.values.extend(array(typecode, dump.values))
+
+    def row(self, n: int) -> memoryview:
+        """Get the values of the n-th snapshot."""
+        return memoryview(self.values)[n * self.count:(n + 1) * self.count]
+
+    def _row_int(self, n: int) -> int:
+        """Get the values of the n-th snapshot as one packed integer."""
+        return _to_int(self.row(n))
+
+    def _unpack(self, packed: int) -> array:
+        """Turn a packed integer back into an array of per-register values."""
+        out = array(self.values.typecode)
+        out.frombytes(packed.to_bytes(self.count * self._itemsize, "little"))
+        return out
+
+    @cached_property
+    def always_valid(self) -> bytes:
+        """Validity bitmap of registers that are readable in every snapshot."""
+        packed = _to_int(self.dumps[0].valid)
+        for dump in self.dumps[1:]:
+            packed &= _to_int(dump.valid)
+        return packed.to_bytes(len(self.dumps[0].valid), "little")
+
+    def is_always_valid(self, index: int) -> bool:
+        """Check whether the register at the index is readable everywhere."""
+        return bool(self.always_valid[index >> 3] >> (index & 7) & 1)
+
+    @cached_property
+    def toggled(self) -> array:
+        """
+        Mask of bits that are not the same in every snapshot, per register.
+
+        Indexed the same way as Dump.values. Unreadable values count as 0.
+        """
+        first = self._row_int(0)
+        packed = 0
+        for n in range(1, len(self.dumps)):
+            packed |= first ^ self._row_int(n)
+        return self._unpack(packed)
+
+    def _addr(self, index: int) -> int:
+        return self.base_addr + index * self.stride
+
+    def constant_registers(self) -> list[int]:
+        """Get the addresses of registers that never change."""
+        return [
+            self._addr(i) for i, mask in enumerate(self.toggled)
+            if not mask and self.is_always_valid(i)
+        ]
+
+    def toggling_registers(self) -> list[tuple[int, int]]:
+        """
+        Get the registers that change between snapshots.
+
+        Returns (addr, mask) pairs, where mask has the bits that change set.
+        Registers that are unreadable in any snapshot are left out.
+        """
+        return [
+            (self._addr(i), mask) for i, mask in enumerate(self.toggled)
+            if mask and self.is_always_valid(i)
+        ]
+
+    def groups(self) -> dict[str, list[int]]:
+        """Get the indices of the snapshots in each labelled group."""
+        out: dict[str, list[int]] = {}
+        for n, label in enumerate(self.labels):
+            if label is not None:
+                out.setdefault(label, []).append(n)
+        return out
+
+    def _group_and_or(self, label: str) -> tuple[int, int]:
+        """Get the AND and the OR of the packed values of a group."""
+        members = self.groups().get(label)
+        if not members:
+            raise KeyError(label)
+        packed_and = packed_or = self._row_int(members[0])
+        for n in members[1:]:
+            row = self._row_int(n)
+            packed_and &= row
+            packed_or |= row
+        return packed_and, packed_or
+
+    def group_diff(self, a: str, b: str) -> list[tuple[int, int, int, int]]:
+        """
+        Get the bits that are constant within two groups of snapshots, but
+        have a different value in each group.
+
+        Returns (addr, mask, value_a, value_b) tuples, where mask has the
+        differing bits set and value_a/value_b are the register values in
+        the first snapshot of each group.
+        """
+        and_a, or_a = self._group_and_or(a)
+        and_b, or_b = self._group_and_or(b)
+        # A bit is constant within a group if its AND equals its OR
+        packed = ~(and_a ^ or_a) & ~(and_b ^ or_b) & (and_a ^ and_b)
+        masks = self._unpack(packed)
+
+        first_a = self.row(self.groups()[a][0])
+        first_b = self.row(self.groups()[b][0])
+        return [
+            (self._addr(i), mask, first_a[i], first_b[i])
+            for i, mask in enumerate(masks)
+            if mask and self.is_always_valid(i)
+        ]
+
+    def report(self, doc: Doc | None = None) -> str:
+        """
+        Summarize the series as text: which registers toggle, and how the
+        labelled groups differ.
+
+        :param doc: Doc to resolve register and field names with, if any
+        """
+        hex_digits = (self.val_bits + 3) // 4
+
+        def describe(addr: int, mask: int) -> str:
+            doc_addr = doc[addr - self.base_addr] if doc else None
+            out = f"0x{addr:x}"
+            if doc_addr:
+                out += f" {doc_addr.name}"
+            out += f": bits 0x{mask:0{hex_digits}x}"
+            if doc_addr:
+                fields = []
+                for bit in range(mask.bit_length()):
+                    r = doc_addr[bit] if mask >> bit & 1 else None
+                    if r is not None and r.name not in fields:
+                        fields.append(r.name)
+                if fields:
+                    out += f" ({', '.join(fields)})"
+            return out
+
+        readable = sum(self.is_always_valid(i) for i in range(self.count))
+        toggling = self.toggling_registers()
+
+        lines = [
+            f"Series of {len(self.dumps)} snapshots of "
+            f"0x{self.base_addr:x} ({self.count} registers)",
+            f"Readable in all snapshots: {readable}",
+            f"Constant: {readable - len(toggling)}",
+            f"Toggling: {len(toggling)}",
+        ]
+        for addr, mask in toggling:
+            lines.append(f"  {describe(addr, mask)}")
+
+        labels = list(self.groups())
+        for i, a in enumerate(labels):
+            for b in labels[i + 1:]:
+                diff = self.group_diff(a, b)
+                lines.append("")
+                lines.append(f"Differences between {a} and {b}: {len(diff)}")
+                for addr, mask, val_a, val_b in diff:
+                    lines.append(
+                        f"  {describe(addr, mask)}: "
+                        f"{a}=0x{val_a:0{hex_digits}x} {b}=0x{val_b:0{hex_digits}x}"
+                    )
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,262 @@
+# SPDX-License-Identifier: MIT
+"""
+Opt-in instrumentation: named timers, counters and peak memory use for the
+stages of a run (parsing, doc loading, rendering...).
+
+Collection is disabled by default. While it is disabled, timer() returns a
+shared no-op context manager and count() returns right away; code in hot
+loops should check stats.enabled before doing any bookkeeping of its own.
+
+The peak memory use of each stage is measured with tracemalloc, which slows
+down everything else, so it is only collected if memory tracing is enabled
+as well; see enable().
+"""
+
+import argparse
+import atexit
+from collections.abc import Callable, Iterable, Iterator
+import functools
+import json
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+#: Whether statistics are being collected.
+enabled = False
+
+#: Whether the peak memory use of each stage is being measured.
+tracing_memory = False
+
+# Whether tracemalloc was started by enable(), and is to be stopped again by
+# disable()
+_started_tracemalloc = False
+
+# Timers that are currently entered, innermost last; only kept while
+# tracing memory
+_active: list["_Timer"] = []
+
+#: Total time spent in each timer, in seconds.
+timers: dict[str, float] = {}
+
+#: Amount of times each timer was entered.
+calls: dict[str, int] = {}
+
+#: Value of each counter.
+counters: dict[str, int] = {}
+
+#: Peak amount of memory allocated by each timed stage (as traced by
+#: tracemalloc, on top of what was allocated when the stage was entered),
+#: in bytes; the maximum over all calls. Only collected while tracing memory.
+memory: dict[str, int] = {}
+
+
+def enable(trace_memory: bool = False):
+    """
+    Start collecting statistics.
+
+    :param trace_memory: Also measure the peak memory use of each stage
+    """
+    global enabled, tracing_memory, _started_tracemalloc
+    enabled = True
+    if trace_memory and not tracing_memory:
+        tracing_memory = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracemalloc = True
+
+
+def disable():
+    """Stop collecting statistics. Collected statistics are kept."""
+    global enabled, tracing_memory, _started_tracemalloc
+    enabled = False
+    tracing_memory = False
+    _active.clear()
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def reset():
+    """Clear all collected statistics."""
+    timers.clear()
+    calls.clear()
+    counters.clear()
+    memory.clear()
+
+
+def max_rss() -> int | None:
+    """
+    Get the maximum resident set size of the process so far, in bytes; the
+    process-wide high-water mark, not tied to any stage.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes on Linux, but in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("name", "start", "start_mem", "peak_mem")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        if tracing_memory:
+            # tracemalloc only keeps a single peak, so the peak so far is
+            # handed to the enclosing stage before it is reset for this one
+            current, peak = tracemalloc.get_traced_memory()
+            if _active:
+                parent = _active[-1]
+                parent.peak_mem = max(parent.peak_mem, peak)
+            tracemalloc.reset_peak()
+            self.start_mem = self.peak_mem = current
+            _active.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        name = self.name
+        timers[name] = timers.get(name, 0.0) + elapsed
+        calls[name] = calls.get(name, 0) + 1
+        if tracing_memory and self in _active:
+            # Usually the innermost stage, unless stages in generators end
+            # out of order
+            _active.remove(self)
+            peak = max(self.peak_mem, tracemalloc.get_traced_memory()[1])
+            if _active:
+                parent = _active[-1]
+                parent.peak_mem = max(parent.peak_mem, peak)
+            memory[name] = max(memory.get(name, 0), peak - self.start_mem)
+
+
+def timer(name: str) -> _Timer | _NullTimer:
+    """
+    Get a context manager that adds the time spent in it to a named timer.
+
+    Timers can be nested; the time of the inner timer is included in the
+    outer one.
+    """
+    if not enabled:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator that times every call of a function in a named timer."""
+    def wrap(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+def count(name: str, n: int = 1):
+    """Add n to a named counter."""
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+
+def counted(items: Iterable, name: str) -> Iterator:
+    """
+    Pass through the items of an iterable, counting them in a named counter
+    once the iteration ends.
+    """
+    n = 0
+    try:
+        for n, item in enumerate(items, 1):
+            yield item
+    finally:
+        count(name, n)
+
+
+def as_dict() -> dict:
+    """Get the collected statistics as a JSON-compatible dict."""
+    return {
+        "timers": {
+            name: {"time": timers[name], "calls": calls[name]}
+            for name in timers
+        },
+        "counters": dict(counters),
+        "peak_memory": dict(memory),
+        "max_rss": max_rss(),
+    }
+
+
+def report() -> str:
+    """Get the collected statistics as a human-readable table."""
+    lines = []
+    if timers:
+        header = f"{'stage':<32} {'calls':>7} {'time (ms)':>12}"
+        if memory:
+            header += f" {'peak mem (MiB)':>15}"
+        lines.append(header)
+        for name in sorted(timers):
+            line = f"{name:<32} {calls[name]:>7} {timers[name] * 1000:>12.2f}"
+            if memory:
+                mem = memory.get(name)
+                line += f" {mem / (1024 * 1024) if mem is not None else float('nan'):>15.1f}"
+            lines.append(line)
+    if counters:
+        if lines:
+            lines.append("")
+        lines.append(f"{'counter':<32} {'value':>12}")
+        for name in sorted(counters):
+            lines.append(f"{name:<32} {counters[name]:>12}")
+    rss = max_rss()
+    if rss is not None:
+        if lines:
+            lines.append("")
+        lines.append(f"process max RSS: {rss / (1024 * 1024):.1f} MiB")
+    return "\n".join(lines) + "\n"
+
+
+def add_arguments(argparser: argparse.ArgumentParser):
+    """Add the --profile and --stats-json options to a script's arguments."""
+    argparser.add_argument("--profile", action="store_true",
+                           help="print a per-stage breakdown of time and counters to stderr, and the per-stage peak memory use along with --stats-json")
+    argparser.add_argument("--stats-json", metavar="FILE",
+                           help="write the per-stage breakdown, including the peak memory use of each stage, to a JSON file; tracing memory slows down the run")
+
+
+def setup_from_args(args: argparse.Namespace):
+    """
+    Enable statistics if requested by the options added by add_arguments,
+    and output them when the script exits.
+    """
+    if not (args.profile or args.stats_json):
+        return
+
+    def output():
+        if args.profile:
+            sys.stderr.write(report())
+        if args.stats_json:
+            with open(args.stats_json, "w") as stats_file:
+                json.dump(as_dict(), stats_file, indent=2)
+
+    enable(trace_memory=bool(args.stats_json))
+    atexit.register(output)
@@ -0,0 +1,45 @@
+# SPDX-License-Identifier: MIT
+"""
+Loading of the HTML templates used by the diff tools.
+
+Compiled templates are cached as bytecode on disk, so that they are only
+compiled from source when the template changes. jinja2 is imported when the
+first template is loaded, not when this module is imported.
+"""
+
+import os
+
+#: Directory containing the templates.
+TEMPLATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: Default location of the template bytecode cache.
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "libdump", "templates"
+)
+
+_environments = {}
+
+
+def load_template(name: str, cache_dir: str | os.PathLike | None = DEFAULT_CACHE_DIR):
+    """
+    Load a template from TEMPLATE_DIR.
+
+    :param name: Filename of the template, e.g. "_generate_dump_diff_tmpl.html"
+    :param cache_dir: Directory to cache compiled templates in, or None to
+                      always compile them from source
+    :return: The jinja2.Template
+    """
+    environment = _environments.get(cache_dir)
+    if environment is None:
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+        bytecode_cache = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(os.fspath(cache_dir))
+        environment = _environments[cache_dir] = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            bytecode_cache=bytecode_cache,
+        )
+    return environment.get_template(name)
@@ -0,0 +1,273 @@
+# SPDX-License-Identifier: MIT
+"""
+Annotation of MMIO access traces with block, register and field names.
+
+Two trace formats are understood:
+
+* simple: "R ADDR VALUE" or "W ADDR VALUE" (or "read"/"write"), with the
+  address and value as hex numbers; anything after the value is kept;
+* mmiotrace: the kernel's mmiotrace format, i.e.
+  "R WIDTH TIMESTAMP MAP_ID ADDR VALUE PC PID" (and "W ..." for writes).
+
+Lines in neither format are passed through unchanged.
+"""
+
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+import itertools
+
+from . import stats
+from .doc import Doc, DocAddr
+from .ext.doc_kona_rdb import SysmapIndex
+
+#: Amount of lines processed at once by annotate_trace.
+DEFAULT_BATCH_SIZE = 4096
+
+#: Maximum amount of annotations cached by format_trace.
+SUFFIX_CACHE_SIZE = 1 << 16
+
+#: Function that maps an absolute address to the name of its block and its
+#: documented register (either of which can be None).
+Lookup = Callable[[int], tuple[str | None, DocAddr | None]]
+
+_OPS = {
+    "R": "R", "r": "R", "read": "R", "READ": "R",
+    "W": "W", "w": "W", "write": "W", "WRITE": "W",
+}
+
+
+@dataclass(slots=True)
+class TraceAccess:
+    """A single annotated access in a trace."""
+
+    #: Line of the trace, without the line break.
+    line: str
+
+    #: "R" for reads, "W" for writes.
+    op: str
+
+    #: Absolute address of the access.
+    addr: int
+
+    #: Value read or written.
+    value: int
+
+    #: Name of the block the address belongs to, if known.
+    block: str | None = None
+
+    #: Documented register at the address, if any.
+    register: DocAddr | None = None
+
+    #: Fields whose value differs from the last access to the same
+    #: register, as (old, new) tuples. Empty for the first access.
+    changed: dict[str, tuple[int, int]] = field(default_factory=dict)
+
+    #: Whether this is the first access to the register in the trace.
+    first: bool = False
+
+    @property
+    def fields(self) -> dict[str, int]:
+        """Value of each field of the register in this access."""
+        if self.register is None:
+            return {}
+        return self.register.extract(self.value)
+
+    def format(self, all_fields: bool = False) -> str:
+        """
+        Format the access as the original line followed by its annotation.
+
+        :param all_fields: List all field values, not just the ones that
+                           changed (the first access to a register always
+                           lists all of them)
+        """
+        if self.block is None and self.register is None:
+            return self.line
+        out = [self.line, "  #"]
+        if self.block is not None:
+            out.append(f" {self.block}")
+        if self.register is not None:
+            out.append(f" {self.register.name}")
+            if all_fields or self.first:
+                out.extend(
+                    f" {name}={value:#x}" for name, value in self.fields.items()
+                )
+            out.extend(
+                f" {name}:{old:#x}->{new:#x}"
+                for name, (old, new) in self.changed.items()
+            )
+        return "".join(out)
+
+
+def sysmap_lookup(index: SysmapIndex) -> Lookup:
+    """Get a Lookup that finds blocks and registers through a sysmap."""
+    def lookup(addr: int) -> tuple[str | None, DocAddr | None]:
+        entry, register = index.lookup_register(addr)
+        return (entry.name if entry else None), register
+    return lookup
+
+
+def doc_lookup(doc: Doc, name: str | None = None, base_addr: int | None = None) -> Lookup:
+    """
+    Get a Lookup that finds registers in a single doc.
+
+    :param doc: Doc of the block
+    :param name: Name to report for the block; defaults to the doc's name
+    :param base_addr: Absolute address of the block; defaults to the doc's
+                      base address
+    """
+    if base_addr is None:
+        base_addr = doc.base_addr
+    block = name if name is not None else (doc.name or None)
+    end = base_addr + doc.size
+
+    def lookup(addr: int) -> tuple[str | None, DocAddr | None]:
+        if not base_addr <= addr <= end:
+            return None, None
+        return block, doc[addr - base_addr]
+    return lookup
+
+
+def annotate_trace(
+    lines: Iterable[str],
+    lookup: Lookup,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[TraceAccess | str]:
+    """
+    Annotate the accesses in a trace.
+
+    Yields a TraceAccess for every access, and lines that are not accesses
+    as they are (without the line break). Lines are consumed batch_size at
+    a time, so a trace file can be annotated while it is read.
+
+    Lookups are cached per address, so memory use depends on the amount of
+    distinct addresses accessed, not on the length of the trace.
+
+    :param lines: Lines of the trace, e.g. an open trace file
+    :param lookup: Function to find the block and register of an address;
+                   see sysmap_lookup and doc_lookup
+    :param batch_size: Amount of lines to process at once
+    """
+    for item in _accesses(lines, lookup, batch_size):
+        if type(item) is str:
+            yield item
+            continue
+        line, op, addr, value, block, register, fields, prev = item
+        access = TraceAccess(line, op, addr, value, block, register)
+        if fields:
+            if prev is None:
+                access.first = True
+            elif prev != value:
+                access.changed = _changed_fields(fields, prev, value)
+        yield access
+
+
+def format_trace(
+    lines: Iterable[str],
+    lookup: Lookup,
+    all_fields: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[str]:
+    """
+    Annotate the accesses in a trace, yielding every line as it would be
+    formatted by TraceAccess.format (without the line break).
+
+    This skips creating a TraceAccess for every access, and caches the
+    annotation of recurring (address, previous value, value) combinations,
+    which makes up most of a trace that polls registers.
+
+    :param all_fields: List all field values, not just the ones that changed
+    """
+    # (addr, prev, value) -> annotation
+    suffixes: dict[tuple[int, int | None, int], str] = {}
+
+    for item in _accesses(lines, lookup, batch_size):
+        if type(item) is str:
+            yield item
+            continue
+        line, op, addr, value, block, register, fields, prev = item
+        if block is None and register is None:
+            yield line
+            continue
+
+        key = (addr, prev, value)
+        suffix = suffixes.get(key)
+        if suffix is None:
+            access = TraceAccess(line, op, addr, value, block, register)
+            if fields:
+                if prev is None:
+                    access.first = True
+                elif prev != value:
+                    access.changed = _changed_fields(fields, prev, value)
+            suffix = access.format(all_fields)[len(line):]
+            if len(suffixes) >= SUFFIX_CACHE_SIZE:
+                suffixes.clear()
+            suffixes[key] = suffix
+        yield line + suffix
+
+
+def _changed_fields(fields: list, prev: int, value: int) -> dict[str, tuple[int, int]]:
+    xor = prev ^ value
+    return {
+        name: (prev >> shift & mask, value >> shift & mask)
+        for name, shift, mask in fields
+        if xor >> shift & mask
+    }
+
+
+def _accesses(lines: Iterable[str], lookup: Lookup, batch_size: int) -> Iterator:
+    """
+    Parse and look up the accesses in a trace.
+
+    Yields lines that are not accesses as they are, and (line, op, addr,
+    value, block, register, fields, prev) tuples for accesses, where fields
+    are the register's (name, shift, mask) tuples and prev is the last value
+    of the register (None for its first access, or if it has no fields).
+    """
+    # addr -> (block, register, fields as (name, shift, mask) tuples)
+    resolved: dict[int, tuple[str | None, DocAddr | None, list]] = {}
+    # addr -> last value read from or written to the register
+    last: dict[int, int] = {}
+
+    ops = _OPS
+    lines = iter(lines)
+    while batch := list(itertools.islice(lines, batch_size)):
+        if stats.enabled:
+            stats.count("trace.lines", len(batch))
+        for line in batch:
+            line = line.rstrip("\n")
+
+            # Parsing is inlined, as it is done for every line
+            split = line.split()
+            op = ops.get(split[0]) if len(split) >= 3 else None
+            if op is None:
+                yield line
+                continue
+            try:
+                if len(split) >= 6 and "." in split[2]:
+                    # mmiotrace: R WIDTH TIMESTAMP MAP_ID ADDR VALUE ...
+                    addr, value = int(split[4], 16), int(split[5], 16)
+                else:
+                    addr, value = int(split[1], 16), int(split[2], 16)
+            except ValueError:
+                yield line
+                continue
+
+            info = resolved.get(addr)
+            if info is None:
+                block, register = lookup(addr)
+                if register is not None:
+                    fields = register.fields
+                else:
+                    fields = []
+                info = resolved[addr] = (block, register, fields)
+            block, register, fields = info
+
+            if fields:
+                prev = last.get(addr)
+                last[addr] = value
+            else:
+                prev = None
+            yield line, op, addr, value, block, register, fields, prev
+
+    if stats.enabled:
+        stats.count("trace.registers", len(resolved))
@@ -0,0 +1,359 @@
+# SPDX-License-Identifier: MIT
+"""
+Incremental reading of dumps that are still being written, e.g. while a
+block is being captured on a device and the dump is copied back piece by
+piece.
+
+A DumpFollower remembers how far it parsed a text dump, so that an update
+only parses the records appended since the last one. The parsed part of the
+file is split into blocks of about BLOCK_SIZE bytes, each with a CRC of its
+contents; when a file is rewritten instead of appended to, only the blocks
+whose contents changed are parsed again.
+
+A DiffWatcher follows two dumps and keeps their DumpDiff up to date.
+"""
+
+from array import array
+import mmap
+import os
+import zlib
+
+from . import stats
+from .diff import DumpDiff, diff_dumps, update_diff
+from .dump import TEXT_FMT, Dump, _typecode_for_bits
+
+#: Approximate size of the blocks a followed file is split into, in bytes.
+BLOCK_SIZE = 64 * 1024
+
+_HEADER_END = b"--- header_end ---\n"
+
+
+class DumpFollower:
+    """
+    Follows a dump file that is being written; see the module documentation.
+
+    Binary dumps are written in one go, so they are simply reloaded when
+    they change.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        """
+        :param path: Path of the dump file; it does not need to exist yet
+        """
+        self.path = os.fspath(path)
+
+        #: Dump with the records parsed so far; None until the file has a
+        #: complete header.
+        self.dump: Dump | None = None
+
+        self._stat: os.stat_result | None = None
+        # Raw header of the current dump, up to and including header_end
+        self._header_bytes = b""
+        # End of the last complete record line that was parsed
+        self._offset = 0
+        # (start, end, crc, first index, last index) of each parsed block;
+        # the indices are those of the first and last record in the block
+        self._blocks: list[tuple[int, int, int, int, int]] = []
+        # Whether the records so far were in ascending address order, which
+        # is needed for re-parsing only parts of a rewritten file
+        self._sorted = True
+        # Index of the last parsed record
+        self._prev_index = -1
+
+    def update(self, verify: bool = False) -> list[int] | None:
+        """
+        Read the changes made to the file since the last update.
+
+        By default, a file that grew is assumed to only have been appended to
+        if it is the same file as before and the last parsed block is
+        unchanged, so that the time an update takes only depends on the
+        amount of new data; pass verify=True to also check all other blocks
+        for changes.
+
+        :return: Sorted indices (in Dump.values) of the registers whose
+                 value or readability changed, or None if the dump was
+                 (re)loaded from scratch, e.g. on the first update or when
+                 the header changed
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        old_stat, self._stat = self._stat, stat
+        if old_stat is not None and self.dump is not None and (
+            stat.st_ino, stat.st_size, stat.st_mtime_ns
+        ) == (old_stat.st_ino, old_stat.st_size, old_stat.st_mtime_ns) and not verify:
+            return []
+        if stat.st_size == 0:
+            return []
+
+        with open(self.path, "rb") as dump_file, \
+             mmap.mmap(dump_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_end = mm.find(_HEADER_END)
+            if header_end < 0:
+                return []
+            data_offset = header_end + len(_HEADER_END)
+
+            if self.dump is None or mm[:data_offset] != self._header_bytes:
+                return self._load(mm, data_offset)
+            if self.dump.header["fmt"] != TEXT_FMT:
+                return self._load(mm, data_offset)
+
+            end = mm.rfind(b"\n", 0, len(mm)) + 1
+            appended = (
+                old_stat is not None and stat.st_ino == old_stat.st_ino
+                and end >= self._offset
+                and (not self._blocks or self._block_unchanged(mm, self._blocks[-1]))
+            )
+            if appended and (verify or stat.st_size == old_stat.st_size):
+                # A file that changed without growing was rewritten somewhere
+                appended = all(self._block_unchanged(mm, b) for b in self._blocks)
+
+            if appended:
+                changed: set[int] = set()
+                self._parse_blocks(mm, self._offset, end, changed)
+                self._offset = end
+                return sorted(changed)
+            if not self._sorted:
+                return self._load(mm, data_offset)
+            return self._reparse(mm, data_offset, end)
+
+    @staticmethod
+    def _block_unchanged(mm: mmap.mmap, block: tuple[int, int, int, int, int]) -> bool:
+        start, end, crc, _first, _last = block
+        return end <= len(mm) and zlib.crc32(mm[start:end]) == crc
+
+    def _load(self, mm: mmap.mmap, data_offset: int) -> None:
+        """Load the dump from scratch."""
+        header_bytes = mm[:data_offset]
+        header = {}
+        for line in header_bytes.decode().splitlines()[:-1]:
+            if line:
+                key, val = line.split(" ")
+                header[key] = val
+
+        self._header_bytes = header_bytes
+        self._blocks = []
+        self._sorted = True
+        self._prev_index = -1
+        if header.get("fmt") != TEXT_FMT:
+            self.dump = Dump(self.path)
+            self._offset = len(mm)
+            return None
+
+        # The storage is allocated up front for the whole block, and filled
+        # in as records come in.
+        dump = Dump.__new__(Dump)
+        dump.filename = self.path
+        dump.header = header
+        dump._check_validity()
+        values = array(_typecode_for_bits(dump.val_bits))
+        values.frombytes(bytes(dump.count * values.itemsize))
+        dump._store = (values, bytearray((dump.count + 7) // 8))
+        self.dump = dump
+
+        end = mm.rfind(b"\n", data_offset, len(mm)) + 1
+        end = max(end, data_offset)
+        self._parse_blocks(mm, data_offset, end, set())
+        self._offset = end
+        return None
+
+    def _parse_blocks(self, mm: mmap.mmap, start: int, end: int, changed: set[int]):
+        """
+        Parse the record lines between two offsets, adding them to the list
+        of blocks. The last block is extended if it is smaller than
+        BLOCK_SIZE.
+        """
+        if start >= end:
+            return
+        if self._blocks and self._blocks[-1][1] == start \
+           and start - self._blocks[-1][0] < BLOCK_SIZE:
+            block_start, _block_end, crc, first, last = self._blocks.pop()
+        else:
+            block_start, crc, first, last = start, 0, None, None
+
+        pos = start
+        while pos < end:
+            block_end = min(block_start + BLOCK_SIZE, end)
+            if block_end < end:
+                block_end = mm.find(b"\n", block_end - 1, end) + 1 or end
+            data = mm[pos:block_end]
+            crc = zlib.crc32(data, crc)
+            block_last = self._parse_records(data, changed)
+            if block_last is not None:
+                if first is None:
+                    first = self._first_index(data)
+                last = block_last
+            # Blocks without any records are not tracked
+            if first is not None:
+                self._blocks.append((block_start, block_end, crc, first, last))
+            pos = block_start = block_end
+            crc, first, last = 0, None, None
+        stats.count("watch.bytes_parsed", end - start)
+
+    def _first_index(self, data: bytes) -> int | None:
+        for line in data.split(b"\n"):
+            try:
+                addr_str, _val_str = line.split(b" ")
+            except ValueError:
+                continue
+            return self.dump.index(int(addr_str, 16))
+        return None
+
+    def _parse_records(self, data: bytes, changed: set[int]) -> int | None:
+        """
+        Parse record lines into the dump, adding the indices of the
+        registers that changed to a set.
+
+        :return: Index of the last record, if any
+        """
+        dump = self.dump
+        values, valid = dump._store
+        base_addr, stride, count = dump.base_addr, dump.stride, dump.count
+        prev = self._prev_index
+        index = None
+        for line in data.split(b"\n"):
+            try:
+                addr_str, val_str = line.split(b" ")
+            except ValueError:
+                continue
+            addr = int(addr_str, 16)
+            index, rem = divmod(addr - base_addr, stride)
+            if index < 0 or rem or index >= count:
+                raise ValueError(
+                    f"address {hex(addr)} is outside of the dumped block"
+                )
+            if index <= prev:
+                self._sorted = False
+            prev = index
+
+            was_valid = valid[index >> 3] >> (index & 7) & 1
+            if val_str == b"-":
+                if was_valid:
+                    valid[index >> 3] &= ~(1 << (index & 7))
+                    changed.add(index)
+                continue
+            val = int(val_str, 16)
+            if not was_valid or values[index] != val:
+                try:
+                    values[index] = val
+                except OverflowError:
+                    raise ValueError(
+                        f"value {hex(val)} at {hex(addr)} does not fit in "
+                        f"{dump.val_bits} bits"
+                    ) from None
+                valid[index >> 3] |= 1 << (index & 7)
+                changed.add(index)
+        self._prev_index = prev
+        stats.count("watch.records_parsed", data.count(b"\n"))
+        return index
+
+    def _reparse(self, mm: mmap.mmap, data_offset: int, end: int) -> list[int]:
+        """
+        Handle a file that was rewritten: re-parse the blocks whose contents
+        changed, and anything appended after the old end of the file.
+        """
+        values, valid = self.dump._store
+        stale = [b for b in self._blocks if not self._block_unchanged(mm, b)]
+        if self._offset > end:
+            stale.extend(b for b in self._blocks if b[1] > end and b not in stale)
+
+        # Forget the registers covered by the stale blocks, remembering
+        # their old state to tell which ones actually changed.
+        old = {}
+        for _start, _end, _crc, first, last in stale:
+            for i in range(first, last + 1):
+                if i not in old:
+                    is_valid = valid[i >> 3] >> (i & 7) & 1
+                    old[i] = values[i] if is_valid else None
+                    valid[i >> 3] &= ~(1 << (i & 7))
+
+        # Re-parse the parts of the new file that the stale blocks covered,
+        # extended to full lines, and the rest of the file after the end of
+        # the old one.
+        ranges = [(start, block_end) for start, block_end, _crc, _first, _last in stale]
+        if self._offset < end:
+            ranges.append((self._offset, end))
+
+        scratch: set[int] = set()
+        for start, range_end in ranges:
+            start = max(mm.rfind(b"\n", data_offset, max(start, data_offset)) + 1, data_offset)
+            range_end = min(range_end, end)
+            if range_end < end:
+                range_end = mm.find(b"\n", max(range_end - 1, start), end) + 1 or end
+            if start < range_end:
+                self._parse_records(mm[start:range_end], scratch)
+
+        # The block boundaries may have moved, so the block list is rebuilt
+        # from the new file; this only reads the first and last record of
+        # every block.
+        self._rebuild_blocks(mm, data_offset, end)
+        self._offset = end
+
+        changed = set()
+        for i, old_value in old.items():
+            is_valid = valid[i >> 3] >> (i & 7) & 1
+            if (values[i] if is_valid else None) != old_value:
+                changed.add(i)
+        changed.update(i for i in scratch if i not in old)
+        return sorted(changed)
+
+    def _rebuild_blocks(self, mm: mmap.mmap, start: int, end: int):
+        self._blocks = []
+        self._sorted = True
+        pos = start
+        prev = -1
+        while pos < end:
+            block_end = min(pos + BLOCK_SIZE, end)
+            if block_end < end:
+                block_end = mm.find(b"\n", block_end - 1, end) + 1 or end
+            data = mm[pos:block_end]
+            first = self._first_index(data)
+            if first is not None:
+                last_line = data.rstrip(b"\n").rsplit(b"\n", 1)[-1]
+                try:
+                    last = self.dump.index(int(last_line.split(b" ")[0], 16))
+                except (ValueError, KeyError):
+                    # The block ends with something other than a record;
+                    # don't rely on the file being sorted from now on.
+                    last = first
+                    self._sorted = False
+                if first <= prev or last < first:
+                    self._sorted = False
+                prev = last
+                self._blocks.append((pos, block_end, zlib.crc32(data), first, last))
+            pos = block_end
+        self._prev_index = prev
+
+
+class DiffWatcher:
+    """Follows two dumps that are being written, and keeps their diff up to date."""
+
+    def __init__(self, foo_path: str | os.PathLike, bar_path: str | os.PathLike):
+        self.foo = DumpFollower(foo_path)
+        self.bar = DumpFollower(bar_path)
+
+        #: Diff of the two dumps; None until both have a complete header.
+        self.diff: DumpDiff | None = None
+
+    def update(self, verify: bool = False) -> tuple[list[int], list[int]] | None:
+        """
+        Read the changes made to both files since the last update, and
+        update the diff.
+
+        :param verify: See DumpFollower.update
+        :return: Sorted indices of the registers that changed in either dump,
+                 and sorted addresses whose entry in the diff changed; or None
+                 if the diff was computed from scratch
+        """
+        foo_changed = self.foo.update(verify)
+        bar_changed = self.bar.update(verify)
+        if self.foo.dump is None or self.bar.dump is None:
+            return [], []
+
+        if foo_changed is None or bar_changed is None or self.diff is None:
+            self.diff = diff_dumps(self.foo.dump, self.bar.dump)
+            return None
+
+        indices = sorted(set(foo_changed).union(bar_changed))
+        return indices, update_diff(self.diff, self.foo.dump, self.bar.dump, indices)
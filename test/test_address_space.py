@@ -0,0 +1,139 @@
+# SPDX-License-Identifier: MIT
+"""Tests for assembling dumps into an address space."""
+
+from array import array
+import random
+
+import pytest
+
+from libdump.address_space import AddressSpace
+from libdump.dump import Dump
+
+
+def _make_dump(base_addr, count, tag, dump_type="mmio"):
+    """Create a dump of count registers whose values encode tag and index."""
+    header = {
+        "fmt": "dump",
+        "type": dump_type,
+        "base_addr": hex(base_addr),
+        "size": hex((count - 1) * 4),
+        "addr_bits": "32",
+        "val_bits": "32",
+    }
+    values = array("I", [tag << 16 | i for i in range(count)])
+    valid = bytearray(b"\xff" * ((count + 7) // 8))
+    return Dump.from_arrays(header, values, valid, filename=f"dump{tag}")
+
+
+def _naive_owners(dumps):
+    """Map each covered address to the dump added last that covers it."""
+    owners = {}
+    for dump in dumps:
+        for i in range(dump.count):
+            owners[dump.base_addr + i * 4] = dump
+    return owners
+
+
+def _naive_holes(owners, start, end):
+    holes = []
+    for addr in range(start, end, 4):
+        if addr not in owners:
+            if holes and holes[-1][1] == addr:
+                holes[-1][1] = addr + 4
+            else:
+                holes.append([addr, addr + 4])
+    return [tuple(hole) for hole in holes]
+
+
+def _check(space, dumps, start=0, end=0x400):
+    owners = _naive_owners(dumps)
+    for addr in range(start, end, 4):
+        assert space.find(addr) is owners.get(addr)
+        if addr in owners:
+            dump = owners[addr]
+            assert space[addr] == dump.data[addr]
+        else:
+            assert space.get(addr) is None
+
+    # Segments are sorted, do not overlap and merge nothing they should not
+    regions = space.regions()
+    for a, b in zip(regions, regions[1:]):
+        assert a.end <= b.start
+    for region in regions:
+        assert all(owners[addr] is region.dump for addr, _ in region.items())
+
+    if owners:
+        first, last = min(owners), max(owners) + 4
+        assert space.holes() == _naive_holes(owners, first, last)
+        assert space.holes(start, end) == _naive_holes(owners, start, end)
+
+
+def test_overlap_cases():
+    a = _make_dump(0x100, 16, 1)
+    space = AddressSpace([a])
+    assert space.holes(0xf0, 0x150) == [(0xf0, 0x100), (0x140, 0x150)]
+
+    # Inside a: splits it in three
+    b = _make_dump(0x110, 4, 2)
+    space.add(b)
+    assert len(space) == 3
+    _check(space, [a, b])
+
+    # Spans the end of a and beyond
+    c = _make_dump(0x138, 8, 3)
+    space.add(c)
+    _check(space, [a, b, c])
+
+    # Covers everything so far
+    d = _make_dump(0x0fc, 40, 4)
+    space.add(d)
+    assert len(space) == 1
+    assert space.dumps == [d]
+    _check(space, [a, b, c, d])
+
+    assert [(o.start, o.end, o.hidden, o.dump) for o in space.overlaps] == [
+        (0x110, 0x120, a, b),
+        (0x138, 0x140, a, c),
+        (0x100, 0x110, a, d),
+        (0x110, 0x120, b, d),
+        (0x120, 0x138, a, d),
+        (0x138, 0x158, c, d),
+    ]
+
+
+def test_adjacent_dumps():
+    a = _make_dump(0x100, 4, 1)
+    b = _make_dump(0x110, 4, 2)
+    c = _make_dump(0x130, 4, 3)
+    space = AddressSpace([b, c, a])
+
+    assert space.overlaps == []
+    assert space.dumps == [a, b, c]
+    assert space.holes() == [(0x120, 0x130)]
+    assert space.holes(0x0f0, 0x150) == [(0x0f0, 0x100), (0x120, 0x130), (0x140, 0x150)]
+    _check(space, [a, b, c])
+
+
+def test_random_dumps():
+    rng = random.Random(0)
+    for _ in range(50):
+        dumps = [
+            _make_dump(rng.randrange(0, 0x100) * 4, rng.randrange(1, 40), tag)
+            for tag in range(rng.randrange(1, 8))
+        ]
+        space = AddressSpace()
+        for n, dump in enumerate(dumps):
+            space.add(dump)
+            _check(space, dumps[:n + 1])
+
+
+def test_empty():
+    space = AddressSpace()
+    assert space.holes() == []
+    assert space.holes(0, 0x10) == [(0, 0x10)]
+    assert space.find(0) is None
+
+
+def test_i2c_rejected():
+    with pytest.raises(ValueError):
+        AddressSpace().add(_make_dump(0, 4, 1, dump_type="i2c"))
@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the dump archive."""
+
+import random
+
+import pytest
+
+from libdump.archive import CHUNK_SIZE, Archive
+from libdump.dump import Dump
+
+
+def _write_dump(path, values, base_addr="0000f000"):
+    """Write a text dump; None values are unreadable."""
+    with open(path, "w") as f:
+        f.write(
+            f"fmt dump\ntype test\nbase_addr {base_addr}\n"
+            f"size {hex((len(values) - 1) * 4)}\naddr_bits 32\nval_bits 32\n"
+            "--- header_end ---\n"
+        )
+        for i, value in enumerate(values):
+            f.write(f"0x{0xf000 + i * 4:08x} ")
+            f.write("-\n" if value is None else f"0x{value:08x}\n")
+    return Dump(str(path))
+
+
+def _assert_same(a, b):
+    assert a.header == b.header
+    assert list(a.values) == list(b.values)
+    assert bytes(a.valid) == bytes(b.valid)
+
+
+@pytest.fixture
+def dumps(tmp_path):
+    rng = random.Random(1)
+    values = [rng.getrandbits(32) for _ in range(3 * CHUNK_SIZE + 5)]
+    changed = list(values)
+    changed[3] = None
+    changed[2 * CHUNK_SIZE] = 7
+    changed_again = list(changed)
+    changed_again[-1] = 1
+    return [
+        _write_dump(tmp_path / name, v)
+        for name, v in (("a", values), ("b", changed), ("c", changed_again))
+    ]
+
+
+def test_delta_chain(tmp_path, dumps):
+    archive = Archive(tmp_path / "archive")
+    archive.add(dumps[0], "a")
+    full_size = archive.disk_usage()
+    archive.add(dumps[1], "b", base="a")
+    archive.add(dumps[2], "c", base="b")
+
+    # Deltas only store the changed registers, not whole chunks
+    assert archive.disk_usage() - full_size < full_size // 10
+    assert archive.base_of("c") == "b"
+    for name, dump in zip("abc", dumps):
+        _assert_same(archive[name], dump)
+
+
+def test_remove_base(tmp_path, dumps):
+    archive = Archive(tmp_path / "archive")
+    archive.add(dumps[0], "a")
+    archive.add(dumps[1], "b", base="a")
+    archive.add(dumps[2], "c", base="b")
+
+    archive.remove("a")
+    archive.gc()
+
+    assert archive.names() == ["b", "c"]
+    assert archive.base_of("b") is None
+    _assert_same(archive["b"], dumps[1])
+    _assert_same(archive["c"], dumps[2])
+
+
+def test_delta_block_check(tmp_path, dumps):
+    archive = Archive(tmp_path / "archive")
+    archive.add(dumps[0], "a")
+
+    # Zero-padded and prefixed base addresses are the same block
+    same = _write_dump(tmp_path / "same", list(dumps[0].values), base_addr="0x0000f000")
+    archive.add(same, "same", base="a")
+    assert archive["same"].header["base_addr"] == "0x0000f000"
+
+    shorter = _write_dump(tmp_path / "shorter", list(dumps[0].values)[:-1])
+    with pytest.raises(ValueError):
+        archive.add(shorter, "shorter", base="a")
+    moved = _write_dump(tmp_path / "moved", list(dumps[0].values), base_addr="0000f004")
+    with pytest.raises(ValueError):
+        archive.add(moved, "moved", base="a")
@@ -0,0 +1,38 @@
+# SPDX-License-Identifier: MIT
+"""Smoke test for benchmark.py, on the smallest block size."""
+
+import json
+import os
+import subprocess
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TEST_DIR)
+
+
+def _benchmark(*argv):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    return subprocess.run(
+        [sys.executable, os.path.join(REPO_DIR, "benchmark.py"), "-s", "1K", "-r", "1", *argv],
+        env=env, capture_output=True, text=True
+    )
+
+
+def test_benchmark(tmp_path):
+    output = tmp_path / "results.json"
+    # Timings of a single run on tiny inputs are noisy, so only check that
+    # every benchmark runs, not how fast
+    result = _benchmark("-o", str(output), "-t", "1000")
+    assert result.returncode == 0, result.stderr
+
+    results = json.loads(output.read_text())["results"]
+    assert results
+    assert all(name.endswith("[1K]") for name in results)
+    assert all(r["time"] > 0 and r["peak_mem"] >= 0 for r in results.values())
+    assert "header_parser.parse[1K] vs header_parser.reference" in result.stdout
+
+    # The results can serve as a baseline for the next run
+    result = _benchmark("-b", str(output), "-t", "1000", "-k", "dump.")
+    assert result.returncode == 0, result.stderr
+    assert f"Comparison against {output}:" in result.stdout
+    assert "dump.parse_text[1K]: time x" in result.stdout
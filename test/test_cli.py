@@ -0,0 +1,195 @@
+# SPDX-License-Identifier: MIT
+"""Smoke tests for the command-line tools."""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from libdump import config
+from libdump.__main__ import main
+from libdump.cli import COMMANDS
+from libdump.dump import Dump
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TEST_DIR)
+DUMP1 = os.path.join(TEST_DIR, "dump1.test")
+DUMP2 = os.path.join(TEST_DIR, "dump2.test")
+
+SYSMAP = """\
+#define BLK0_BASE_ADDR 0x12340000 /* brcm_rdb_blk0.h */
+#define BLK1_BASE_ADDR 0x12350000 /* brcm_rdb_blk1.h */
+"""
+
+RDB = """\
+#define BLK0_CTRL_OFFSET 0x00000000
+#define BLK0_CTRL_TYPE UInt32
+#define BLK0_CTRL_RESERVED_MASK 0x00000000
+#define    BLK0_CTRL_MODE_SHIFT 0
+#define    BLK0_CTRL_MODE_MASK 0x0000000F
+#define BLK0_STATUS_OFFSET 0x00000004
+#define BLK0_STATUS_TYPE UInt32
+#define BLK0_STATUS_RESERVED_MASK 0x00000000
+#define    BLK0_STATUS_READY_SHIFT 0
+#define    BLK0_STATUS_READY_MASK 0x00000001
+"""
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch, tmp_path):
+    for var in list(os.environ):
+        if var.startswith("LIBDUMP_"):
+            monkeypatch.delenv(var)
+    monkeypatch.setattr(config, "DEFAULT_CONFIG_PATH", str(tmp_path / "missing.ini"))
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture
+def rdb_dir(tmp_path):
+    """RDB directory whose sysmap lists BLK0, documented, and BLK1, without a header."""
+    path = tmp_path / "rdb"
+    path.mkdir()
+    (path / config.SYSMAP_NAME).write_text(SYSMAP)
+    (path / "brcm_rdb_blk0.h").write_text(RDB)
+    return str(path)
+
+
+def _run(capsys, *argv):
+    main(list(argv))
+    return capsys.readouterr().out
+
+
+def test_commands_registered():
+    # Every tool module follows the interface described in libdump.cli
+    for name in COMMANDS:
+        with pytest.raises(SystemExit) as excinfo:
+            main([name, "--help"])
+        assert excinfo.value.code == 0
+
+
+def test_diff(capsys, tmp_path, rdb_dir):
+    _run(capsys, "diff", DUMP1, DUMP2, "--rdb-dir", rdb_dir,
+         "--no-open", "--no-template-cache", "--no-doc-cache")
+    [html] = os.listdir(tmp_path / "generated-dumps")
+    text = (tmp_path / "generated-dumps" / html).read_text()
+    assert "CTRL" in text and "STATUS" in text
+
+
+def test_diff_without_rdb_dir(capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main(["diff", DUMP1, DUMP2, "--no-open", "--no-template-cache", "--no-doc-cache"])
+    assert excinfo.value.code == 2
+    assert "--rdb-dir" in capsys.readouterr().err
+
+
+def test_commands(capsys, tmp_path):
+    assert _run(capsys, "commands", DUMP1, DUMP2).splitlines() == [
+        "sudo devmem2 0x12340000 b 0x1",
+        "sudo devmem2 0x12340008 b 0x0",
+    ]
+    _run(capsys, "commands", DUMP1, DUMP2, "-p", str(tmp_path / "patch"))
+    assert (tmp_path / "patch").exists()
+
+
+def test_split(capsys, tmp_path):
+    with open(tmp_path / "capture", "w") as capture:
+        for name, path in ("BLK0", DUMP1), ("BLK1", DUMP2):
+            capture.write(f"!! {name}\n")
+            with open(path) as dump_file:
+                capture.write(dump_file.read())
+    _run(capsys, "split", str(tmp_path / "capture"), str(tmp_path / "split"))
+    assert sorted(os.listdir(tmp_path / "split")) == ["BLK0.val", "BLK1.val"]
+    assert list(Dump(str(tmp_path / "split" / "BLK1.val")).data.items()) == \
+        list(Dump(DUMP2).data.items())
+
+
+def test_symbols(capsys, rdb_dir):
+    main(["symbols", "--rdb-dir", rdb_dir, "--no-doc-cache", "-j", "1"])
+    out, err = capsys.readouterr()
+    assert out.splitlines() == ["BLK0_CTRL 0x12340000", "BLK0_STATUS 0x12340004"]
+    assert "BLK1_BASE_ADDR: failed to load rdb" in err
+
+
+def test_annotate(capsys, tmp_path, rdb_dir):
+    (tmp_path / "trace").write_text("R 12340000 5\nW 12340004 1\nunrelated\n")
+    out = _run(capsys, "annotate", str(tmp_path / "trace"), "--rdb-dir", rdb_dir, "--no-doc-cache")
+    lines = out.splitlines()
+    assert len(lines) == 3
+    assert "CTRL" in lines[0] and "MODE" in lines[0]
+    assert "STATUS" in lines[1]
+    assert lines[2] == "unrelated"
+
+
+def test_convert(capsys, tmp_path):
+    binary, text = str(tmp_path / "dump.bin"), str(tmp_path / "dump.txt")
+    _run(capsys, "convert", DUMP1, binary)
+    _run(capsys, "convert", binary, text)
+    assert Dump(binary).header["fmt"] == "bindump"
+    assert Dump(text).header["fmt"] == "dump"
+    assert list(Dump(text).data.items()) == list(Dump(DUMP1).data.items())
+
+
+def test_archive(capsys, tmp_path):
+    archive = str(tmp_path / "archive")
+    assert _run(capsys, "archive", archive, "add", DUMP1) == "Added dump1.test\n"
+    _run(capsys, "archive", archive, "add", DUMP2, "-b", "dump1.test")
+    assert _run(capsys, "archive", archive, "list").splitlines() == [
+        "dump1.test", "dump2.test (delta against dump1.test)",
+    ]
+    _run(capsys, "archive", archive, "extract", "dump2.test", str(tmp_path / "out"))
+    assert list(Dump(str(tmp_path / "out")).data.items()) == list(Dump(DUMP2).data.items())
+
+    with pytest.raises(SystemExit) as excinfo:
+        main(["archive", archive, "add", DUMP1, DUMP2, "-n", "name"])
+    assert excinfo.value.code == 2
+
+
+def test_index(capsys, tmp_path):
+    dumps = tmp_path / "dumps"
+    dumps.mkdir()
+    shutil.copy(DUMP1, dumps)
+    shutil.copy(DUMP2, dumps)
+    index = str(tmp_path / "index")
+    assert _run(capsys, "index", index, "update", str(dumps)) == "Indexed 2 dumps, removed 0 dumps\n"
+    [block] = _run(capsys, "index", index, "blocks").splitlines()
+    block = block.split(" (")[0]
+    out = _run(capsys, "index", index, "query", block, "0x12340000", "-v", "1")
+    assert out == f"{dumps / 'dump2.test'}\n"
+
+    with pytest.raises(SystemExit) as excinfo:
+        main(["index", index, "query", block, "0x12340000"])
+    assert excinfo.value.code == 2
+
+
+def test_series(capsys):
+    out = _run(capsys, "series", "-g", "a", DUMP1, "-g", "b", DUMP2)
+    assert "Series of 2 snapshots" in out
+    with pytest.raises(SystemExit) as excinfo:
+        main(["series"])
+    assert excinfo.value.code == 2
+
+
+def test_space(capsys, tmp_path):
+    out = _run(capsys, "space", "map", DUMP1)
+    assert out == f"0x12340000-0x1234000f {DUMP1}\n"
+    out = _run(capsys, "space", "read", "0x12340000", "0x12340010", DUMP1)
+    assert out.splitlines()[0] == "0x12340000 0x0"
+    out = _run(capsys, "space", "diff", DUMP1, DUMP2)
+    assert out == "0x12340000: 2 changed, 0 became unreadable, 0 became readable\n"
+
+
+@pytest.mark.parametrize("script", [
+    "generate-dump-diff.py", "dump-diff-to-commands.py", "split-dumpall-dumps.py",
+    "annotate-trace.py", "convert-dump.py", "dump-archive.py", "dump-index.py",
+    "dump-series-report.py", "address-space.py", os.path.join("tools-misc", "kona-symbol-map-gen.py"),
+])
+def test_scripts(script):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    result = subprocess.run(
+        [sys.executable, os.path.join(REPO_DIR, script), "--help"],
+        env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.startswith("usage:")
@@ -0,0 +1,98 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the configuration of the command-line tools."""
+
+import argparse
+import os
+
+import pytest
+
+from libdump import config
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch, tmp_path):
+    for var in list(os.environ):
+        if var.startswith("LIBDUMP_"):
+            monkeypatch.delenv(var)
+    monkeypatch.setattr(config, "DEFAULT_CONFIG_PATH", str(tmp_path / "missing.ini"))
+
+
+def _from_args(*argv):
+    argparser = argparse.ArgumentParser()
+    config.add_arguments(argparser)
+    return config.from_args(argparser.parse_args(argv))
+
+
+def _write_config(path, **settings):
+    lines = ["[libdump]"] + [f"{key} = {value}" for key, value in settings.items()]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_defaults():
+    cfg = config.load_config()
+    assert cfg == config.Config()
+    assert cfg.rdb_dir is None
+    assert cfg.doc_cache and cfg.template_cache
+
+
+def test_missing_rdb_dir():
+    cfg = config.load_config()
+    with pytest.raises(config.ConfigError) as excinfo:
+        cfg.sysmap_path
+    message = str(excinfo.value)
+    for option in ("--rdb-dir", "LIBDUMP_RDB_DIR", "rdb_dir", "--sysmap", "LIBDUMP_SYSMAP"):
+        assert option in message
+
+
+def test_precedence(tmp_path, monkeypatch):
+    path = _write_config(tmp_path / "config.ini", rdb_dir="/file/rdb", doc_cache="no")
+    monkeypatch.setenv("LIBDUMP_CONFIG", path)
+    cfg = _from_args()
+    assert cfg.rdb_dir == "/file/rdb"
+    assert not cfg.doc_cache
+    assert cfg.sysmap_path == os.path.join("/file/rdb", config.SYSMAP_NAME)
+
+    # The environment overrides the config file...
+    monkeypatch.setenv("LIBDUMP_RDB_DIR", "/env/rdb")
+    monkeypatch.setenv("LIBDUMP_DOC_CACHE", "yes")
+    cfg = _from_args()
+    assert cfg.rdb_dir == "/env/rdb"
+    assert cfg.doc_cache
+
+    # ...and options override both
+    cfg = _from_args("--rdb-dir", "/flag/rdb", "--no-doc-cache")
+    assert cfg.rdb_dir == "/flag/rdb"
+    assert not cfg.doc_cache
+
+    # The sysmap, from any source, takes precedence over the RDB directory
+    monkeypatch.setenv("LIBDUMP_SYSMAP", "/env/sysmap.h")
+    assert _from_args("--rdb-dir", "/flag/rdb").sysmap_path == "/env/sysmap.h"
+    assert _from_args("-s", "/flag/sysmap.h").sysmap_path == "/flag/sysmap.h"
+
+
+def test_config_option(tmp_path, monkeypatch):
+    env_path = _write_config(tmp_path / "env.ini", rdb_dir="/env-file/rdb")
+    flag_path = _write_config(tmp_path / "flag.ini", rdb_dir="~/flag-file/rdb")
+    monkeypatch.setenv("LIBDUMP_CONFIG", env_path)
+    assert _from_args("--config", flag_path).rdb_dir == os.path.expanduser("~/flag-file/rdb")
+    with pytest.raises(FileNotFoundError):
+        _from_args("--config", str(tmp_path / "missing-explicit.ini"))
+
+
+def test_default_config_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DEFAULT_CONFIG_PATH",
+                        _write_config(tmp_path / "default.ini", template_cache="off"))
+    assert not config.load_config().template_cache
+
+
+@pytest.mark.parametrize("settings", [{"doc_cache": "maybe"}, {"unknown": "1"}])
+def test_invalid_config(tmp_path, settings):
+    with pytest.raises(config.ConfigError):
+        config.load_config(_write_config(tmp_path / "config.ini", **settings))
+
+
+def test_invalid_environment(monkeypatch):
+    monkeypatch.setenv("LIBDUMP_TEMPLATE_CACHE", "sometimes")
+    with pytest.raises(config.ConfigError):
+        config.load_config()
@@ -0,0 +1,215 @@
+# SPDX-License-Identifier: MIT
+"""Tests for comparing dumps."""
+
+from array import array
+import random
+
+import pytest
+
+from libdump.diff import CHUNK_SIZE, diff_dumps, diff_rows
+from libdump.dump import Dump, _typecode_for_bits
+
+
+def _make_dump(values, val_bits=32, base_addr=0x1000):
+    """Create a 32-bit address dump from a list of values; None is unreadable."""
+    header = {
+        "fmt": "dump",
+        "type": "test",
+        "base_addr": f"0x{base_addr:08x}",
+        "size": hex((len(values) - 1) * 4),
+        "addr_bits": "32",
+        "val_bits": str(val_bits),
+    }
+    valid = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is not None:
+            valid[i >> 3] |= 1 << (i & 7)
+    typed = array(_typecode_for_bits(val_bits), [value or 0 for value in values])
+    return Dump.from_arrays(header, typed, valid)
+
+
+def _naive_diff(foo, bar):
+    """Compare two dumps register by register, through Dump.data."""
+    changed, unreadable, readable = [], [], []
+    for addr in sorted(set(foo.data) | set(bar.data)):
+        foo_val = foo.data[addr] if addr in foo.data else -1
+        bar_val = bar.data[addr] if addr in bar.data else -1
+        if foo_val != -1 and bar_val != -1:
+            if foo_val != bar_val:
+                changed.append((addr, foo_val ^ bar_val))
+        elif foo_val != -1:
+            unreadable.append(addr)
+        elif bar_val != -1:
+            readable.append(addr)
+    return changed, unreadable, readable
+
+
+def _assert_matches_naive(foo, bar):
+    diff = diff_dumps(foo, bar)
+    changed, unreadable, readable = _naive_diff(foo, bar)
+    assert list(zip(diff.changed, diff.xor)) == changed
+    assert list(diff.changed_bits) == [xor.bit_count() for _addr, xor in changed]
+    assert list(diff.became_unreadable) == unreadable
+    assert list(diff.became_readable) == readable
+    assert bool(diff) == bool(changed or unreadable or readable)
+    return diff
+
+
+def _random_values(rng, count, val_bits=32):
+    return [
+        None if rng.random() < 0.05 else rng.getrandbits(val_bits)
+        for _ in range(count)
+    ]
+
+
+def test_equal_dumps():
+    values = _random_values(random.Random(0), 2 * CHUNK_SIZE + 3)
+    diff = _assert_matches_naive(_make_dump(values), _make_dump(values))
+    assert not diff
+
+
+@pytest.mark.parametrize("index", [
+    0, 7, 8, CHUNK_SIZE - 1, CHUNK_SIZE, CHUNK_SIZE + 1,
+    2 * CHUNK_SIZE - 1, 2 * CHUNK_SIZE, 3 * CHUNK_SIZE + 4,
+])
+def test_chunk_boundaries(index):
+    values = _random_values(random.Random(index), 3 * CHUNK_SIZE + 5)
+    values[index] = 0x0f
+    foo = _make_dump(values)
+
+    for change in 0xff, None:
+        changed = list(values)
+        changed[index] = change
+        diff = _assert_matches_naive(foo, _make_dump(changed))
+        assert diff.changed_addrs() == [0x1000 + index * 4]
+        # And the other way around
+        _assert_matches_naive(_make_dump(changed), foo)
+
+
+def test_random_changes():
+    rng = random.Random(1)
+    for _ in range(20):
+        count = rng.randrange(1, 3 * CHUNK_SIZE)
+        values = _random_values(rng, count)
+        changed = list(values)
+        for i in rng.sample(range(count), min(count, 10)):
+            changed[i] = rng.choice([None, rng.getrandbits(32)])
+        _assert_matches_naive(_make_dump(values), _make_dump(changed))
+
+
+@pytest.mark.parametrize("foo_count, bar_count", [
+    (CHUNK_SIZE, CHUNK_SIZE + 1),
+    (CHUNK_SIZE + 1, CHUNK_SIZE),
+    (5, 2 * CHUNK_SIZE + 3),
+    (2 * CHUNK_SIZE + 3, 1),
+])
+def test_different_lengths(foo_count, bar_count):
+    rng = random.Random(foo_count * bar_count)
+    values = _random_values(rng, max(foo_count, bar_count))
+    foo = _make_dump(values[:foo_count])
+    bar = _make_dump(values[:bar_count])
+
+    diff = _assert_matches_naive(foo, bar)
+    assert not diff.changed
+
+
+def test_different_value_widths():
+    # Values stored with different item sizes skip the chunk fast path
+    rng = random.Random(2)
+    values = [rng.getrandbits(16) for _ in range(CHUNK_SIZE + 9)]
+    changed = list(values)
+    changed[CHUNK_SIZE + 1] ^= 0x100
+    _assert_matches_naive(_make_dump(values, 16), _make_dump(changed, 32))
+
+
+def test_different_blocks():
+    with pytest.raises(ValueError):
+        diff_dumps(_make_dump([1, 2]), _make_dump([1, 2], base_addr=0x2000))
+
+
+def _rows(foo, bar, **kwargs):
+    """Get the (index, skipped) of the rows of a rendered diff."""
+    return [
+        ((row.addr - 0x1000) // 4, row.skipped)
+        for row in diff_rows(foo, bar, **kwargs)
+    ]
+
+
+def _naive_rows(foo_values, bar_values, changed_only=False, context=0, window=None):
+    """Select the rows of a rendered diff register by register."""
+    count = len(foo_values)
+    if window is None:
+        window = range(count)
+    changes = [
+        i for i in range(count)
+        if None not in (foo_values[i], bar_values[i]) and foo_values[i] != bar_values[i]
+    ]
+    out = []
+    prev = window.start - 1
+    for i in window:
+        if i >= count or foo_values[i] is None or bar_values[i] is None:
+            continue
+        if changed_only and not any(abs(i - c) <= context for c in changes):
+            continue
+        out.append((i, i - prev - 1 if changed_only else 0))
+        prev = i
+    return out
+
+
+def _changed_pair():
+    values = [i * 3 for i in range(40)]
+    changed = list(values)
+    for i in 3, 10, 11, 30:
+        changed[i] ^= 1
+    values[2] = None
+    changed[9] = None
+    return values, changed
+
+
+def test_rows_changed_only():
+    values, changed = _changed_pair()
+    foo, bar = _make_dump(values), _make_dump(changed)
+
+    assert _rows(foo, bar, changed_only=True) == [(3, 3), (10, 6), (11, 0), (30, 18)]
+    # Context rows that are unreadable in either dump count as skipped
+    assert _rows(foo, bar, changed_only=True, context=1) == [
+        (3, 3), (4, 0), (10, 5), (11, 0), (12, 0), (29, 16), (30, 0), (31, 0),
+    ]
+    # Without changed_only, every readable register gets a row
+    assert _rows(foo, bar) == [(i, 0) for i in range(40) if i not in (2, 9)]
+    for context in range(6):
+        assert _rows(foo, bar, changed_only=True, context=context) == \
+            _naive_rows(values, changed, True, context)
+
+
+@pytest.mark.parametrize("window", [
+    range(0, 5), range(4, 10), range(12, 14), range(13, 30), range(31, 40),
+    range(-5, 3), range(35, 100), range(20, 20),
+])
+@pytest.mark.parametrize("context", [0, 1, 2, 5])
+def test_rows_window(window, context):
+    values, changed = _changed_pair()
+    foo, bar = _make_dump(values), _make_dump(changed)
+
+    for changed_only in False, True:
+        rows = _rows(foo, bar, changed_only=changed_only, context=context, window=window)
+        clamped = range(max(window.start, 0), min(window.stop, 40))
+        assert rows == _naive_rows(values, changed, changed_only, context, clamped)
+
+
+@pytest.mark.parametrize("context", [0, 2, 7])
+def test_rows_pages(context):
+    # Changes near page boundaries reach into the neighbouring pages
+    rng = random.Random(context)
+    values = _random_values(rng, 100)
+    changed = list(values)
+    for i in 9, 10, 19, 45, 50, 99:
+        changed[i] = (changed[i] or 0) ^ 1
+    foo, bar = _make_dump(values), _make_dump(changed)
+
+    full = _rows(foo, bar, changed_only=True, context=context)
+    paged = []
+    for start in range(0, 100, 10):
+        paged += _rows(foo, bar, changed_only=True, context=context, window=range(start, start + 10))
+    assert [i for i, _ in paged] == [i for i, _ in full]
+    assert full == _naive_rows(values, changed, True, context)
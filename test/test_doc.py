@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: MIT
+"""Tests for register docs."""
+
+import os
+
+import pytest
+
+from libdump import doc as doc_module
+from libdump.doc import (
+    DFmtDoc, Doc, DocAddr, DocAddrRange, doc_to_dfmt, iter_dfmt, write_dfmt,
+)
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "docs")
+
+
+def test_fields():
+    addr = DocAddr(0x10, "CTRL", [
+        DocAddrRange(start_bit=0, end_bit=3, name="MODE"),
+        DocAddrRange(start_bit=8, end_bit=8, name="ENABLE"),
+    ])
+    assert addr.fields == [("MODE", 0, 0xf), ("ENABLE", 8, 0x1)]
+    assert addr.extract(0x1a5) == {"MODE": 5, "ENABLE": 1}
+
+    # Adding a range rebuilds the fields on next access
+    addr.add_range(DocAddrRange.from_mask(0xf000, "LEVEL"))
+    assert addr.fields[-1] == ("LEVEL", 12, 0xf)
+    assert addr[13].name == "LEVEL"
+
+
+def _doc(count):
+    doc = Doc(base_addr=0x1000, size=(count - 1) * 4, name="test")
+    for i in range(count):
+        doc.add_addr(DocAddr(i * 4, f"REG{i}", [
+            DocAddrRange(start_bit=0, end_bit=i % 8, name=f"LOW{i}"),
+            DocAddrRange(start_bit=16, end_bit=31, name="HIGH FIELD"),
+        ]))
+    return doc
+
+
+def _dump_doc(doc):
+    return [
+        (addr.addr, addr.name, [(r.start_bit, r.end_bit, r.name) for r in addr.ranges])
+        for addr in doc.addresses
+    ]
+
+
+@pytest.mark.parametrize("chunk_size, count", [(1024, 1), (1024, 10), (3, 9), (3, 10), (1, 5)])
+def test_dfmt_round_trip(tmp_path, monkeypatch, chunk_size, count):
+    monkeypatch.setattr(doc_module, "WRITE_CHUNK_SIZE", chunk_size)
+    doc = _doc(count)
+    path = tmp_path / "test.doc"
+    with open(path, "w") as out_file:
+        write_dfmt(doc, out_file, "test")
+
+    parsed = DFmtDoc(path)
+    assert (parsed.base_addr, parsed.size) == (doc.base_addr, doc.size)
+    assert parsed.header["type"] == "test"
+    # Every address comes back, including the last one
+    assert _dump_doc(parsed) == _dump_doc(doc)
+    assert parsed[(count - 1) * 4].name == f"REG{count - 1}"
+    assert doc_to_dfmt(doc, "test") == "".join(iter_dfmt(doc, "test")) == path.read_text()
+
+
+@pytest.mark.parametrize("base_addr, size, expected", [
+    ("0x0000f000", "0x1c", (0xf000, 0x1c)),
+    ("0XF000", "0X1C", (0xf000, 0x1c)),
+    # Older versions of the writer used decimal numbers
+    ("0", "246", (0, 246)),
+    ("61440", "28", (0xf000, 28)),
+    # Bare hex numbers are still accepted
+    ("f000", "1c", (0xf000, 0x1c)),
+])
+def test_dfmt_header_ints(tmp_path, base_addr, size, expected):
+    path = tmp_path / "test.doc"
+    path.write_text(
+        f"fmt doc\ntype test\nbase_addr {base_addr}\nsize {size}\n"
+        f"addr_bits 32\nval_bits 32\n--- header_end ---\n0x0 REG\n"
+    )
+    doc = DFmtDoc(path)
+    assert (doc.base_addr, doc.size) == expected
+    assert isinstance(doc.base_addr, int) and isinstance(doc.size, int)
+
+
+def test_dfmt_bundled_docs():
+    doc = DFmtDoc(os.path.join(DOCS_DIR, "bcm59054_map0.doc"))
+    assert (doc.base_addr, doc.size) == (0, 241)
+    assert doc.addresses
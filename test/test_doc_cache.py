@@ -0,0 +1,133 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the on-disk doc cache."""
+
+import os
+
+from libdump import stats
+from libdump.doc import DFmtDoc
+from libdump.doc_cache import DocCache
+from libdump.ext.doc_kona_rdb import KonaRdbDoc
+
+DFMT = """\
+fmt doc
+type test
+base_addr 0x1000
+size 0x8
+addr_bits 32
+val_bits 32
+--- header_end ---
+0x0 CTRL
+  b 0 3 MODE
+0x4 STATUS
+  b 0 0 READY
+"""
+
+
+def _load(cache, source, cls, *args):
+    stats.reset()
+    stats.enable()
+    try:
+        doc = cache.load(source, cls, *args)
+        return doc, stats.counters.get("doc_cache.hits", 0) == 1
+    finally:
+        stats.disable()
+
+
+def _touch(path, contents):
+    """Rewrite a file, making sure that its mtime changes."""
+    mtime_ns = os.stat(path).st_mtime_ns
+    with open(path, "w") as f:
+        f.write(contents)
+    os.utime(path, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+
+
+def test_dfmt_hit_keeps_attributes(tmp_path):
+    path = tmp_path / "test.dfmt"
+    path.write_text(DFMT)
+    cache = DocCache(tmp_path / "cache")
+
+    parsed, hit = _load(cache, path, DFmtDoc, path)
+    assert not hit
+    cached, hit = _load(cache, path, DFmtDoc, path)
+    assert hit
+
+    assert type(cached) is DFmtDoc
+    assert cached.filename == os.fspath(path)
+    assert cached.header == parsed.header
+    assert cached.raw == DFMT
+    assert [(a.addr, a.name) for a in cached.addresses] == [(0, "CTRL"), (4, "STATUS")]
+
+
+def test_touched_source_stays_cached(tmp_path):
+    path = tmp_path / "test.dfmt"
+    path.write_text(DFMT)
+    cache = DocCache(tmp_path / "cache")
+    _load(cache, path, DFmtDoc, path)
+
+    _touch(path, DFMT)
+    assert _load(cache, path, DFmtDoc, path)[1]
+
+    _touch(path, DFMT.replace("READY", "DONE"))
+    doc, hit = _load(cache, path, DFmtDoc, path)
+    assert not hit
+    assert doc[4].ranges[0].name == "DONE"
+
+
+def test_included_header_invalidates(tmp_path):
+    header = tmp_path / "block.h"
+    fields = tmp_path / "fields.h"
+    header.write_text(
+        '#include "fields.h"\n'
+        "#define BLOCK_CTRL_OFFSET 0x00000000\n"
+        "#ifdef HAS_MODE\n"
+        "#define BLOCK_CTRL_MODE_MASK 0x0000000f\n"
+        "#endif\n"
+    )
+    fields.write_text("")
+    cache = DocCache(tmp_path / "cache")
+
+    doc, hit = _load(cache, header, KonaRdbDoc, 0x1000, str(header))
+    assert not hit
+    assert doc.sources == [str(header), str(fields)]
+    assert _load(cache, header, KonaRdbDoc, 0x1000, str(header))[1]
+
+    assert doc[0].ranges == []
+
+    _touch(fields, "#define HAS_MODE\n")
+    doc, hit = _load(cache, header, KonaRdbDoc, 0x1000, str(header))
+    assert not hit
+    assert [r.name for r in doc[0].ranges] == ["MODE"]
+
+    fields.unlink()
+    doc, hit = _load(cache, header, KonaRdbDoc, 0x1000, str(header))
+    assert not hit
+    assert doc[0].ranges == []
+
+
+def test_missing_include_invalidates(tmp_path):
+    header = tmp_path / "block.h"
+    fields = tmp_path / "fields.h"
+    header.write_text(
+        '#include "fields.h"\n'
+        "#define BLOCK_CTRL_OFFSET 0x00000000\n"
+        "#ifdef HAS_MODE\n"
+        "#define BLOCK_CTRL_MODE_MASK 0x0000000f\n"
+        "#endif\n"
+    )
+    cache = DocCache(tmp_path / "cache")
+
+    doc, hit = _load(cache, header, KonaRdbDoc, 0x1000, str(header))
+    assert not hit
+    assert doc.missing_sources == [str(fields)]
+    doc, hit = _load(cache, header, KonaRdbDoc, 0x1000, str(header))
+    assert hit
+    assert doc.missing_sources == [str(fields)]
+    assert doc[0].ranges == []
+
+    # The include is used as soon as it exists
+    fields.write_text("#define HAS_MODE\n")
+    doc, hit = _load(cache, header, KonaRdbDoc, 0x1000, str(header))
+    assert not hit
+    assert doc.missing_sources == []
+    assert [r.name for r in doc[0].ranges] == ["MODE"]
+    assert _load(cache, header, KonaRdbDoc, 0x1000, str(header))[1]
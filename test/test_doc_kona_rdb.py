@@ -0,0 +1,186 @@
+# SPDX-License-Identifier: MIT
+"""Tests for Kona RDB headers and the sysmap index."""
+
+import os
+import random
+
+import pytest
+
+from libdump.doc_cache import DocCache
+from libdump.ext.doc_kona_rdb import (
+    KonaRdbDoc, SysmapEntry, SysmapIndex, load_rdb_docs,
+)
+
+SYSMAP = """\
+#define BLK_A_BASE_ADDR 0x1000 /* brcm_rdb_a.h */
+#define BLK_B_BASE_ADDR 0x2000 /* brcm_rdb_b.h */
+#define BLK_B_ALIAS_BASE_ADDR 0x2000 /* brcm_rdb_b_alias.h */
+#define BLK_C_BASE_ADDR (BLK_B_BASE_ADDR + 0x1000) /* brcm_rdb_c.h */
+#define BLK_D_BASE_ADDR 20480 /* brcm_rdb_d.h */
+#define NOT_A_BLOCK 0x8000
+#define NOT_A_NUMBER foo /* brcm_rdb_x.h */
+"""
+
+RDB_D = """\
+#define D_CTRL_OFFSET 0x00000000
+#define D_CTRL_TYPE UInt32
+#define D_CTRL_RESERVED_MASK 0x00000000
+#define    D_CTRL_MODE_SHIFT 4
+#define    D_CTRL_MODE_MASK (0x3 << D_CTRL_MODE_SHIFT)
+#define D_STATUS_OFFSET 16
+#define D_STATUS_TYPE UInt32
+#define D_STATUS_RESERVED_MASK 0x00000000
+#define    D_STATUS_READY_SHIFT 31
+#define    D_STATUS_READY_MASK 0x80000000UL
+"""
+
+
+@pytest.fixture
+def sysmap(tmp_path):
+    path = tmp_path / "brcm_rdb_sysmap.h"
+    path.write_text(SYSMAP)
+    (tmp_path / "brcm_rdb_d.h").write_text(RDB_D)
+    return str(path)
+
+
+def test_entries(sysmap, tmp_path):
+    index = SysmapIndex(sysmap)
+    assert [(e.name, e.base, e.size) for e in index] == [
+        ("BLK_A_BASE_ADDR", 0x1000, 0x1000),
+        ("BLK_B_BASE_ADDR", 0x2000, 0x1000),
+        ("BLK_B_ALIAS_BASE_ADDR", 0x2000, 0x1000),
+        ("BLK_C_BASE_ADDR", 0x3000, 0x2000),
+        ("BLK_D_BASE_ADDR", 0x5000, None),
+    ]
+    assert len(index) == 5
+    assert index.entries[0].header == str(tmp_path / "brcm_rdb_a.h")
+
+
+def test_rdb_doc(tmp_path):
+    path = tmp_path / "brcm_rdb_d.h"
+    path.write_text(RDB_D)
+    doc = KonaRdbDoc(0x5000, str(path))
+    # Values are parsed like the sysmap's, i.e. as C constants
+    assert doc.size == 16
+    assert doc[0].fields == [("MODE", 4, 0x3)]
+    assert doc[16].fields == [("READY", 31, 0x1)]
+
+
+def test_lookup(sysmap):
+    index = SysmapIndex(sysmap)
+    assert index.lookup(0xfff) is None
+    assert index.lookup(0x1000).name == "BLK_A_BASE_ADDR"
+    assert index.lookup(0x1fff).name == "BLK_A_BASE_ADDR"
+    # Blocks sharing a base address resolve to the first one listed
+    assert index.lookup(0x2000).name == "BLK_B_BASE_ADDR"
+    assert index.lookup(0x2ffc).name == "BLK_B_BASE_ADDR"
+    assert index.lookup(0x4fff).name == "BLK_C_BASE_ADDR"
+
+    assert index.lookup_base(0x2000).name == "BLK_B_BASE_ADDR"
+    assert index.lookup_base(0x2004) is None
+    assert index.lookup_base(0x5000).name == "BLK_D_BASE_ADDR"
+
+
+def test_lookup_last_block(sysmap):
+    index = SysmapIndex(sysmap)
+    # The last block ends with the last register of its doc
+    assert index.lookup(0x5000).name == "BLK_D_BASE_ADDR"
+    assert index.lookup(0x5010).name == "BLK_D_BASE_ADDR"
+    assert index.lookup(0x5014) is None
+    assert index.lookup(0xffffffff) is None
+    entry, register = index.lookup_register(0x5010)
+    assert entry.name == "BLK_D_BASE_ADDR"
+    assert register.name == "D_STATUS"
+
+
+def test_lookup_last_block_without_doc(sysmap, tmp_path):
+    os.remove(tmp_path / "brcm_rdb_d.h")
+    index = SysmapIndex(sysmap)
+    assert index.lookup(0x5000).name == "BLK_D_BASE_ADDR"
+    assert index.lookup(0x5004) is None
+    assert index.lookup_register(0x5000) == (index.entries[-1], None)
+
+
+def test_entry_contains():
+    entry = SysmapEntry("A", 0x1000, 0x100, "a.h")
+    assert 0x1000 in entry and 0x10ff in entry
+    assert 0xfff not in entry and 0x1100 not in entry
+    last = SysmapEntry("B", 0x2000, None, "b.h")
+    assert 0x2000 in last
+    assert 0x2004 not in last
+
+
+def test_lookup_many(sysmap):
+    index = SysmapIndex(sysmap)
+    rng = random.Random(1)
+    addrs = [rng.randrange(0, 0x6000) for _ in range(1000)]
+    addrs += [0, 0x1000, 0x2000, 0x5000, 0x5010, 0x5014, 0x1000]
+    assert index.lookup_many(addrs) == [index.lookup(addr) for addr in addrs]
+    assert index.lookup_many([]) == []
+
+
+def test_from_file(sysmap):
+    first = SysmapIndex.from_file(sysmap)
+    second = SysmapIndex.from_file(sysmap)
+    # The parsed sysmap is shared, but loaded docs are not
+    assert first is not second
+    assert first.entries == second.entries
+    assert first.entries[0] is second.entries[0]
+    entry = first.entries[-1]
+    assert first.doc(entry) is first.doc(entry)
+    assert first.doc(entry) is not second.doc(entry)
+
+
+def _assert_loaded(results, tmp_path):
+    assert [r.entry.name for r in results] == [
+        "BLK_A_BASE_ADDR", "BLK_B_BASE_ADDR", "BLK_B_ALIAS_BASE_ADDR",
+        "BLK_C_BASE_ADDR", "BLK_D_BASE_ADDR",
+    ]
+    assert [bool(r) for r in results] == [False, False, True, False, True]
+    missing, bad, alias, _, loaded = results
+
+    assert missing.doc is None
+    assert missing.error_type == "FileNotFoundError"
+    assert "brcm_rdb_a.h" in missing.error
+    assert bad.error_type == "ValueError"
+    assert "Out-of-order" in bad.error
+
+    assert alias.error is None
+    assert [addr.name for addr in alias.doc.addresses] == ["ALIAS_CTRL"]
+    assert loaded.error_type is None and loaded.error is None
+    assert loaded.doc.base_addr == 0x5000
+    assert loaded.doc.size == 16
+
+
+@pytest.fixture
+def rdb_headers(sysmap, tmp_path):
+    (tmp_path / "brcm_rdb_b.h").write_text(
+        "#define B_CTRL_OFFSET 0x0\n#define OTHER_MODE_MASK 0x1\n"
+    )
+    (tmp_path / "brcm_rdb_b_alias.h").write_text(
+        "#define ALIAS_CTRL_OFFSET 0x0\n#define ALIAS_CTRL_MODE_MASK 0x1\n"
+    )
+    return sysmap
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_load_rdb_docs(rdb_headers, tmp_path, processes):
+    results = load_rdb_docs(rdb_headers, processes=processes)
+    _assert_loaded(results, tmp_path)
+
+
+def test_load_rdb_docs_cached(rdb_headers, tmp_path):
+    cache = DocCache(str(tmp_path / "cache"))
+    first = load_rdb_docs(rdb_headers, processes=1, doc_cache=cache)
+    second = load_rdb_docs(rdb_headers, processes=2, doc_cache=cache)
+    _assert_loaded(first, tmp_path)
+    _assert_loaded(second, tmp_path)
+
+
+def test_load_rdb_docs_unexpected_error(rdb_headers, monkeypatch):
+    # Only errors from reading and parsing the headers are captured
+    def fail(self, base_addr, header_path):
+        raise RuntimeError("bug")
+    monkeypatch.setattr(KonaRdbDoc, "_parse", fail)
+    with pytest.raises(RuntimeError):
+        load_rdb_docs(rdb_headers, processes=1)
@@ -0,0 +1,204 @@
+# SPDX-License-Identifier: MIT
+"""Tests for reading and writing dumps."""
+
+import pytest
+
+from libdump.dump import BINARY_ALIGN, BINARY_FMT, TEXT_FMT, Dump, dump_to_file
+
+HEADER = """\
+fmt dump
+type test
+base_addr 0x00001000
+size 0xc
+addr_bits 32
+val_bits {val_bits}
+--- header_end ---
+"""
+
+
+def _write_text(path, val_bits, values):
+    digits = (val_bits + 3) // 4
+    with open(path, "w") as f:
+        f.write(HEADER.format(val_bits=val_bits))
+        for i, value in enumerate(values):
+            f.write(f"0x{0x1000 + i * 4:08x} ")
+            f.write("-\n" if value is None else f"0x{value:0{digits}x}\n")
+
+
+def _values(dump):
+    return [dump.data[addr] for addr in dump.data]
+
+
+@pytest.mark.parametrize("val_bits, val_bytes", [(8, 1), (12, 2), (32, 4), (33, 8), (64, 8)])
+def test_binary_layout(tmp_path, val_bits, val_bytes):
+    values = [(1 << val_bits) - 1, 0, None, 1]
+    _write_text(tmp_path / "in.dump", val_bits, values)
+
+    out = tmp_path / "out.bindump"
+    dump_to_file(Dump(str(tmp_path / "in.dump")), str(out), BINARY_FMT)
+
+    data = out.read_bytes()
+    header_end = data.index(b"--- header_end ---\n") + len("--- header_end ---\n")
+    assert f"val_bytes {val_bytes}\n".encode() in data[:header_end]
+
+    # Fixed-size little-endian values, then the validity bitmap
+    start = header_end + -header_end % BINARY_ALIGN
+    body = data[start:]
+    assert len(body) == 4 * val_bytes + 1
+    assert [
+        int.from_bytes(body[i * val_bytes:(i + 1) * val_bytes], "little")
+        for i in range(4)
+    ] == [(1 << val_bits) - 1, 0, 0, 1]
+    assert body[-1] == 0b1011
+
+    dump = Dump(str(out))
+    assert _values(dump) == [(1 << val_bits) - 1, 0, -1, 1]
+
+
+def test_round_trip(tmp_path):
+    _write_text(tmp_path / "in.dump", 32, [0xdeadbeef, None, 7, 0])
+    text = (tmp_path / "in.dump").read_text()
+
+    dump_to_file(Dump(str(tmp_path / "in.dump")), str(tmp_path / "out.bindump"), BINARY_FMT)
+    dump_to_file(Dump(str(tmp_path / "out.bindump")), str(tmp_path / "out.dump"), TEXT_FMT)
+
+    assert (tmp_path / "out.dump").read_text() == text
+
+
+def test_binary_bad_val_bytes(tmp_path):
+    _write_text(tmp_path / "in.dump", 32, [1, 2, 3, 4])
+    out = tmp_path / "out.bindump"
+    dump_to_file(Dump(str(tmp_path / "in.dump")), str(out), BINARY_FMT)
+    out.write_bytes(out.read_bytes().replace(b"val_bytes 4", b"val_bytes 2"))
+
+    with pytest.raises(ValueError):
+        Dump(str(out)).values
+
+
+def test_data_mapping(tmp_path):
+    _write_text(tmp_path / "in.dump", 32, [0xdeadbeef, None, 7, 0])
+    dump = Dump(str(tmp_path / "in.dump"))
+    data = dump.data
+
+    assert len(data) == 4
+    assert list(data) == [0x1000, 0x1004, 0x1008, 0x100c]
+    assert dict(data) == {0x1000: 0xdeadbeef, 0x1004: -1, 0x1008: 7, 0x100c: 0}
+    assert data[0x1004] == -1
+    assert data.get(0x1010, -1) == -1
+
+    assert 0x1000 in data and 0x100c in data
+    # Addresses outside the block or between two registers are not covered
+    for addr in 0xffc, 0x1002, 0x1010, "0x1000", None:
+        assert addr not in data
+    with pytest.raises(KeyError):
+        data[0x1002]
+    with pytest.raises(TypeError):
+        data[0x1000] = 1
+
+
+def test_valid_bitmap(tmp_path):
+    values = [None if i % 3 == 0 else i for i in range(20)]
+    _write_text(tmp_path / "in.dump", 8, values)
+    (tmp_path / "in.dump").write_text(
+        (tmp_path / "in.dump").read_text().replace("size 0xc", "size 0x4c")
+    )
+    dump = Dump(str(tmp_path / "in.dump"))
+
+    assert len(dump.valid) == 3
+    assert [dump.is_valid(i) for i in range(20)] == [v is not None for v in values]
+    # Unreadable values are stored as 0
+    assert list(dump.values) == [v or 0 for v in values]
+    assert dump.values.itemsize == 1
+
+
+def test_iter_records(tmp_path):
+    path = tmp_path / "in.dump"
+    path.write_text(HEADER.format(val_bits=32) + (
+        "0x0000100C 0xABCD\n"
+        "0x00001000 -\n"
+        "not a record\n"
+        "0x00001004 0x1\n"
+    ))
+    dump = Dump(str(path))
+    records = dump.iter_records()
+    # Records are read as the generator advances, in file order
+    assert next(records) == (0x100c, 0xabcd)
+    assert list(records) == [(0x1000, -1), (0x1004, 0x1)]
+    assert _values(dump) == [-1, 1, -1, 0xabcd]
+
+
+def test_iter_records_in_memory():
+    dump = Dump.from_lines(HEADER.format(val_bits=8).splitlines() + ["0x00001004 0x1"])
+    # Dumps not backed by a text file yield every address they cover
+    assert list(dump.iter_records()) == [(0x1000, -1), (0x1004, 1), (0x1008, -1), (0x100c, -1)]
+
+
+def test_header_streamed(tmp_path):
+    path = tmp_path / "in.dump"
+    path.write_text(HEADER.format(val_bits=32) + "0x00001000 0x1\n0x00002000 0x1\n")
+    dump = Dump(str(path))
+    # Only the header is read until the data is accessed
+    assert dump.header["type"] == "test"
+    assert (dump.base_addr, dump.size, dump.count, dump.stride) == (0x1000, 0xc, 4, 4)
+    with pytest.raises(ValueError):
+        dump.values
+
+
+def test_from_lines():
+    lines = iter([
+        "\n",
+        "fmt dump\n",
+        "type test\n",
+        "\n",
+        "base_addr 0x00001000\n",
+        "size 0x4\n",
+        "addr_bits 32\n",
+        "val_bits 8\n",
+        "--- header_end ---\n",
+        "0x00001004 0x2\n",
+        "0x00001000 -",
+    ])
+    dump = Dump.from_lines(lines, filename="lines")
+    assert dump.filename == "lines"
+    assert dump.header["size"] == "0x4"
+    assert dict(dump.data) == {0x1000: -1, 0x1004: 2}
+    # The lines are consumed
+    assert next(lines, None) is None
+
+    with pytest.raises(ValueError):
+        Dump.from_lines(["fmt dump", "--- header_end ---"])
+    with pytest.raises(ValueError):
+        Dump.from_lines(HEADER.format(val_bits=8).splitlines() + ["0x00001000 0x100"])
+
+
+def test_close(tmp_path):
+    _write_text(tmp_path / "in.dump", 32, [1, 2, None, 4])
+    dump_to_file(Dump(str(tmp_path / "in.dump")), str(tmp_path / "out.bindump"), BINARY_FMT)
+
+    with Dump(str(tmp_path / "out.bindump")) as dump:
+        values = dump.values
+        assert list(values) == [1, 2, 0, 4]
+        mm = dump._mmap
+    assert mm.closed
+    with pytest.raises(ValueError):
+        values[0]
+    # The file is mapped again on the next access
+    assert _values(dump) == [1, 2, -1, 4]
+    dump.close()
+
+    # Text dumps have nothing to close
+    with Dump(str(tmp_path / "in.dump")) as dump:
+        assert _values(dump) == [1, 2, -1, 4]
+    assert _values(dump) == [1, 2, -1, 4]
+
+
+def test_write_lowercase(tmp_path):
+    path = tmp_path / "in.dump"
+    # The capture scripts write uppercase hex digits
+    path.write_text(HEADER.format(val_bits=32) + "".join(
+        f"0x{0x1000 + i * 4:08X} 0x{0xABCDEF00 + i:08X}\n" for i in range(4)
+    ))
+    dump_to_file(Dump(str(path)), str(tmp_path / "out.dump"))
+    text = (tmp_path / "out.dump").read_text()
+    assert "0x0000100c 0xabcdef03\n" in text
+    assert _values(Dump(str(tmp_path / "out.dump"))) == _values(Dump(str(path)))
@@ -0,0 +1,84 @@
+# SPDX-License-Identifier: MIT
+"""Tests for dumpall captures."""
+
+import os
+
+import pytest
+
+from libdump.dump import Dump
+from libdump.dumpall import iter_dumpall, split_dumpall
+
+SECTION = """\
+!! {name}
+fmt dump
+type mmio
+base_addr {base_addr}
+size 0x4
+addr_bits 32
+val_bits 32
+--- header_end ---
+{records}"""
+
+# Output of the script from gen_dump_commands: each block is preceded by
+# the blank line of an echo ''
+CAPTURE = "\n" + "\n".join([
+    SECTION.format(name="BLK0", base_addr="0x1000", records="0x1000 0x1\n0x1004 -\n"),
+    SECTION.format(name="BLK1", base_addr="0x2000", records="0x2000 0xA\n0x2004 0xB\n"),
+    SECTION.format(name="BLK2", base_addr="0x3000", records=""),
+])
+
+MALFORMED = CAPTURE.replace("base_addr 0x2000\n", "")
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = tmp_path / "dumpall.txt"
+    path.write_text(CAPTURE)
+    return str(path)
+
+
+def test_iter_dumpall(capture):
+    dumps = list(iter_dumpall(capture))
+    assert [name for name, _ in dumps] == ["BLK0", "BLK1", "BLK2"]
+    assert [dict(dump.data) for _, dump in dumps] == [
+        {0x1000: 0x1, 0x1004: -1},
+        {0x2000: 0xa, 0x2004: 0xb},
+        {0x3000: -1, 0x3004: -1},
+    ]
+    assert dumps[1][1].filename == f"{capture}:BLK1"
+
+
+def test_iter_dumpall_empty(tmp_path):
+    path = tmp_path / "dumpall.txt"
+    path.write_text("\n\n")
+    assert list(iter_dumpall(path)) == []
+
+
+def test_iter_dumpall_malformed(tmp_path):
+    path = tmp_path / "dumpall.txt"
+    path.write_text(MALFORMED)
+    blocks = iter_dumpall(path)
+    assert next(blocks)[0] == "BLK0"
+    with pytest.raises(ValueError, match="BLK1"):
+        next(blocks)
+
+
+def test_split_dumpall(capture, tmp_path):
+    target = tmp_path / "split"
+    written = split_dumpall(capture, target)
+    assert written == [str(target / f"BLK{i}.val") for i in range(3)]
+
+    # Each file starts with the section's "!!" line, and parses the same as
+    # the block read with iter_dumpall
+    assert (target / "BLK1.val").read_text().startswith("!! BLK1\nfmt dump\n")
+    for path, (_, dump) in zip(written, iter_dumpall(capture)):
+        assert dict(Dump(path).data) == dict(dump.data)
+
+
+def test_split_dumpall_malformed(tmp_path):
+    # Splitting does not parse the blocks, so malformed ones are written too
+    path = tmp_path / "dumpall.txt"
+    path.write_text(MALFORMED)
+    written = split_dumpall(path, tmp_path / "split")
+    assert [os.path.basename(p) for p in written] == ["BLK0.val", "BLK1.val", "BLK2.val"]
+    assert "base_addr" not in (tmp_path / "split" / "BLK1.val").read_text()
@@ -0,0 +1,346 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the in-process header preprocessor."""
+
+import os
+import re
+
+import pytest
+
+from libdump import header_parser, stats
+from libdump.ext.doc_bcm590xx_reg import BCM59054RegDoc
+from libdump.header_parser import HeaderParser
+
+
+def _parse(tmp_path, text, **kwargs):
+    path = tmp_path / "test.h"
+    path.write_text(text)
+    return HeaderParser(str(path), **kwargs)
+
+
+@pytest.mark.parametrize("expr, value", [
+    ("0 && (1 / 0)", 0),
+    ("1 || (1 % 0)", 1),
+    ("1 ? 2 : 1 / 0", 2),
+    ("0 ? 1 / 0 : 3", 3),
+    ("(0 && 1 << -1) + 4", 4),
+    ("0 && 1 ? 7 : 8", 8),
+    ("2 && 3", 1),
+    ("0 || 5", 1),
+])
+def test_evaluate_short_circuit(tmp_path, expr, value):
+    parser = _parse(tmp_path, "")
+    assert parser.evaluate(expr) == value
+
+
+def test_evaluate_short_circuit_strict(tmp_path):
+    parser = _parse(tmp_path, "")
+    # Unknown identifiers are only an error where they are evaluated
+    assert parser.evaluate("0 && UNKNOWN") == 0
+    with pytest.raises(ValueError):
+        parser.evaluate("1 && UNKNOWN")
+    with pytest.raises(ValueError):
+        parser.evaluate("1 && (1 / 0)")
+    # Skipped operands are still checked for syntax
+    with pytest.raises(ValueError):
+        parser.evaluate("0 && (1 +")
+
+
+def test_if_short_circuit(tmp_path):
+    parser = _parse(tmp_path, """\
+#define TWO 2
+#if 0 && (1 / 0)
+#define A 1
+#elif defined(X) && X > 1
+#define B 1
+#elif defined(ZERO) && 4 / ZERO
+#define C 1
+#elif !defined(TWO) || TWO > 1
+#define D 1
+#endif
+""")
+    assert list(parser.data) == ["TWO", "D"]
+
+
+def test_conditionals(tmp_path):
+    parser = _parse(tmp_path, """\
+#define LEVEL 2
+#ifdef LEVEL
+#  if LEVEL > 2
+#    define A 1
+#  elif LEVEL == 2
+#    ifndef FLAG
+#      define B 1
+#    else
+#      define C 1
+#    endif
+#    if defined(MISSING) || (LEVEL << 1) == 4
+#      define D 1
+#    endif
+#  else
+#    define E 1
+#  endif
+#else
+#  ifdef LEVEL
+#    define F 1
+#  else
+#    define G 1
+#  endif
+#endif
+#if 0
+#elif 0
+#else
+#define H 1
+#endif
+""")
+    assert list(parser.data) == ["LEVEL", "B", "D", "H"]
+
+
+def test_flags(tmp_path):
+    text = """\
+#ifdef FLAG
+#define A 1
+#endif
+#if WIDTH == 16
+#define B 1
+#endif
+"""
+    assert list(_parse(tmp_path, text).data) == []
+    parser = _parse(tmp_path, text, flags={"FLAG": "", "WIDTH": "16"})
+    # Flags are macros, but not part of the header's own data
+    assert list(parser.data) == ["A", "B"]
+    assert parser.macros["WIDTH"] == "16"
+
+
+def test_undef(tmp_path):
+    parser = _parse(tmp_path, """\
+#define A 1 /* a */
+#define B 2
+#undef A
+#ifndef A
+#define C 3
+#endif
+""")
+    assert parser.data == {"B": "2", "C": "3"}
+    assert parser.comments == {}
+
+
+@pytest.mark.parametrize("text", [
+    "#if 1\n#define A 1\n",
+    "#endif\n",
+    "#else\n",
+])
+def test_unbalanced_conditionals(tmp_path, text):
+    with pytest.raises(ValueError):
+        _parse(tmp_path, text)
+
+
+def test_comments_and_continuations(tmp_path):
+    parser = _parse(tmp_path, """\
+/*
+#define IN_COMMENT 1
+ */
+// #define IN_LINE_COMMENT 1
+#define A 1 /* first */
+#define B 0x2 // second
+#define C (1 + \\
+           2) /* third */
+#define D 4 /* spans
+               lines */
+#define E /* inner */ 5
+#define S "a /* not a comment */"
+#define F \\
+    6
+/* before */ #define NOT_A_DIRECTIVE 1
+#define G 7
+""")
+    assert parser.data == {
+        "A": "1", "B": "0x2", "C": "(1 + 2)", "D": "4", "E": "5",
+        "S": '"a /* not a comment */"', "F": "6", "G": "7",
+    }
+    assert parser.comments == {
+        "A": "first", "B": "second", "C": "third",
+        "D": "spans\n               lines", "E": "inner",
+    }
+
+
+def test_function_macros(tmp_path):
+    parser = _parse(tmp_path, """\
+#define BIT(n) (1 << (n))
+#define FIELD(hi, lo) ((BIT((hi) - (lo) + 1) - 1) << (lo))
+#define MASK FIELD(7, 4)
+""")
+    assert parser.data == {"MASK": "FIELD(7, 4)"}
+    assert parser.functions == {
+        "BIT": (["n"], "(1 << (n))"),
+        "FIELD": (["hi", "lo"], "((BIT((hi) - (lo) + 1) - 1) << (lo))"),
+    }
+    assert parser.eval("MASK") == 0xf0
+
+
+def test_include(tmp_path):
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "local.h").write_text("#define LOCAL 1\n")
+    (tmp_path / "inc" / "system.h").write_text(
+        '#define SYSTEM 2\n#include "nested.h"\n'
+    )
+    (tmp_path / "inc" / "nested.h").write_text("#define NESTED 3\n")
+    (tmp_path / "inc" / "quoted.h").write_text("#define QUOTED 4\n")
+    parser = _parse(tmp_path, """\
+#include "local.h"
+#include <system.h>
+#include "quoted.h"
+#include "missing.h"
+#include <local.h>
+#if LOCAL + SYSTEM + NESTED == 6
+#define ALL 1
+#endif
+""", include_dirs=[str(tmp_path / "inc")])
+
+    # Only the header's own defines are data
+    assert parser.data == {"ALL": "1"}
+    assert parser.macros == {
+        "LOCAL": "1", "SYSTEM": "2", "NESTED": "3", "QUOTED": "4", "ALL": "1",
+    }
+    # <> includes are only searched for in the include directories
+    assert parser.missing_includes == ["missing.h", "local.h"]
+    assert [os.path.relpath(f, tmp_path) for f in parser.files] == [
+        "test.h", "local.h", os.path.join("inc", "system.h"),
+        os.path.join("inc", "nested.h"), os.path.join("inc", "quoted.h"),
+    ]
+    # Every path that was searched but not found is recorded, including the
+    # ones that would shadow an include found further down the search path
+    assert [os.path.relpath(f, tmp_path) for f in parser.missing_files] == [
+        "quoted.h", "missing.h", os.path.join("inc", "missing.h"),
+        os.path.join("inc", "local.h"),
+    ]
+
+
+def test_include_cycle(tmp_path):
+    (tmp_path / "loop.h").write_text('#include "loop.h"\n')
+    with pytest.raises(ValueError):
+        _parse(tmp_path, '#include "loop.h"\n')
+
+
+def test_include_cache(tmp_path):
+    header_parser._lex_cached.cache_clear()
+    common = tmp_path / "common.h"
+    common.write_text("#define COMMON 1\n")
+    text = '#include "common.h"\n#define VALUE COMMON\n'
+
+    stats.reset()
+    stats.enable()
+    try:
+        first = _parse(tmp_path, text)
+        second = _parse(tmp_path, text)
+        hits = stats.counters.get("header_parser.lex_cache_hits")
+
+        # A changed file is lexed again
+        common.write_text("#define COMMON 2\n")
+        st = common.stat()
+        os.utime(common, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        third = _parse(tmp_path, text)
+        hits_after_change = stats.counters.get("header_parser.lex_cache_hits")
+    finally:
+        stats.disable()
+        stats.reset()
+
+    assert first.eval("VALUE") == second.eval("VALUE") == 1
+    assert hits == 1
+    assert third.eval("VALUE") == 2
+    assert hits_after_change == 1
+
+
+GENERATED = """\
+/*
+ * Generated header
+ */
+#ifndef __TEST_H__
+#define __TEST_H__
+
+{regs}
+#define FUNC(x) ((x) + 1)
+#define COMMENTED 0x1 /* commented */
+#endif
+"""
+
+
+def _generated(count):
+    regs = []
+    for i in range(count):
+        regs.append(f"#define REG{i}_OFFSET 0x{i * 4:08x}")
+        regs.append(f"#define    REG{i}_FIELD_SHIFT {i % 32}")
+        regs.append(f"#define    REG{i}_FIELD_MASK 0x{1 << (i % 32):08x}")
+        if i % 50 == 0:
+            regs.append("")
+            regs.append(f"/* Block {i} */")
+    return GENERATED.format(regs="\n".join(regs))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100, 4096, 16 * 1024])
+def test_fast_path_matches_slow_path(tmp_path, monkeypatch, chunk_size):
+    text = _generated(500)
+    monkeypatch.setattr(header_parser, "LEX_CHUNK_SIZE", chunk_size)
+    fast = _parse(tmp_path, text)
+    directives = [d for d, _, _ in header_parser._lex_file(str(tmp_path / "test.h"))]
+
+    # Without the bulk paths, every line goes through the line lexer
+    monkeypatch.setattr(header_parser, "_plain_defines", lambda chunk: None)
+    monkeypatch.setattr(header_parser, "_PLAIN_DEFINES_RE", re.compile(r"(?!)"))
+    slow = _parse(tmp_path, text)
+    slow_directives = [d for d, _, _ in header_parser._lex_file(str(tmp_path / "test.h"))]
+
+    assert header_parser.DEFINES in directives
+    assert header_parser.DEFINES not in slow_directives
+    assert list(fast.data.items()) == list(slow.data.items())
+    assert fast.comments == slow.comments == {"COMMENTED": "commented"}
+    assert fast.functions == slow.functions == {"FUNC": (["x"], "((x) + 1)")}
+    assert len(fast.data) == 3 * 500 + 2
+
+
+def test_fast_path_single_function_macro(tmp_path, monkeypatch):
+    # A chunk made of a single function-like macro is not a plain define
+    monkeypatch.setattr(header_parser, "LEX_CHUNK_SIZE", 1)
+    parser = _parse(tmp_path, "#define A 1\n#define F(x) (x)\n#define B 2\n")
+    assert parser.data == {"A": "1", "B": "2"}
+    assert parser.functions == {"F": (["x"], "(x)")}
+
+
+def test_eval_memoized(tmp_path):
+    parser = _parse(tmp_path, """\
+#define FOO_SHIFT 4
+#define FOO_MASK (3 << FOO_SHIFT)
+#define BAR_MASK ((UInt32)0x1 << 31)
+#define NOT_CONSTANT foo
+""")
+    assert parser.eval("FOO_MASK") == 0x30
+    assert parser.eval("BAR_MASK") == 0x80000000
+
+    # Results are kept, even if the macros they depend on change
+    parser.macros["FOO_SHIFT"] = "8"
+    assert parser.eval("FOO_MASK") == 0x30
+    assert parser.evaluate("(3 << FOO_SHIFT)") == 0x300
+
+    with pytest.raises(ValueError):
+        parser.eval("NOT_CONSTANT")
+    with pytest.raises(KeyError):
+        parser.eval("MISSING")
+
+
+def test_bcm59054_shift_masks(tmp_path):
+    path = tmp_path / "bcmpmu59054_reg.h"
+    path.write_text("""\
+#define PMU_REG_ENV1 ENC_PMU_REG(FIFO_MODE, MAP0, 0x01)
+#define ENV1_EN_MASK 0x01
+#define ENV1_LEVEL_SHIFT 2
+#define ENV1_LEVEL_MASK (3 << ENV1_LEVEL_SHIFT)
+#define PMU_REG_ENV2 ENC_PMU_REG(FIFO_MODE, MAP1, 0x02)
+#define ENV2_OTHER_MASK 0x10
+#define PMU_REG_ENV3 ENC_PMU_REG(FIFO_MODE, MAP0, 0x03)
+#define ENV3_MODE_SHIFT 4
+#define ENV3_MODE_MASK (0xF << ENV3_MODE_SHIFT)
+""")
+    doc = BCM59054RegDoc(str(path), 0)
+    assert [addr.addr for addr in doc.addresses] == [0x01, 0x03]
+    assert doc[0x01].fields == [("EN", 0, 0x1), ("LEVEL", 2, 0x3)]
+    assert doc[0x03].fields == [("MODE", 4, 0xf)]
+    assert doc.sources == [str(path)]
@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: MIT
+"""Tests for reading I2C devices, using FakeTransport in place of a bus."""
+
+import pytest
+
+from libdump.i2c import FakeTransport, I2CTransport, read_i2c_block
+
+
+def _values(dump):
+    return [dump.data[addr] for addr in dump.data]
+
+
+def test_fake_transport():
+    transport = FakeTransport({0: 0x12, 1: 0x34, 3: 0x56}, max_block=2)
+
+    assert transport.read_byte(1) == 0x34
+    assert transport.read_block(0, 2) == b"\x12\x34"
+    with pytest.raises(OSError):
+        transport.read_block(2, 2)
+    with pytest.raises(ValueError):
+        transport.read_block(0, 3)
+
+    transport.write_byte(3, 0x78)
+    assert transport.registers[3] == 0x78
+    with pytest.raises(OSError):
+        transport.write_byte(2, 0)
+    assert transport.transactions == 5
+
+
+def test_transport_interface():
+    # Transports have to implement single register reads and writes
+    with pytest.raises(TypeError):
+        I2CTransport()
+
+    class ReadOnly(I2CTransport):
+        def read_byte(self, reg):
+            return reg
+
+    with pytest.raises(TypeError):
+        ReadOnly()
+
+    class Echo(ReadOnly):
+        def write_byte(self, reg, value):
+            pass
+
+    with Echo() as transport:
+        assert transport.read_block(5, 1) == b"\x05"
+        with pytest.raises(OSError):
+            transport.read_block(5, 2)
+
+
+def test_full_map():
+    registers = {reg: reg ^ 0xa5 for reg in range(0x100)}
+    transport = FakeTransport(registers)
+
+    dump = read_i2c_block(transport, bus=1, dev_addr=0x08)
+
+    assert _values(dump) == [reg ^ 0xa5 for reg in range(0x100)]
+    assert dump.header["i2c_bus"] == "1"
+    assert dump.header["dev_addr"] == "0x08"
+    assert (dump.base_addr, dump.addr_bits, dump.val_bits) == (0, 8, 8)
+    # 256 registers in blocks of 32
+    assert transport.transactions == 8
+
+
+def test_missing_registers():
+    registers = {reg: reg for reg in range(0x40) if reg not in (5, 0x21)}
+    transport = FakeTransport(registers)
+
+    dump = read_i2c_block(transport, size=0x3f, block_size=16)
+
+    expected = [-1 if reg in (5, 0x21) else reg for reg in range(0x40)]
+    assert _values(dump) == expected
+    # Four blocks, two of which fail and are re-read one register at a time
+    assert transport.transactions == 4 + 2 * 16
+
+
+def test_no_block_reads():
+    registers = {reg: 0xff - reg for reg in range(10)}
+    transport = FakeTransport(registers, max_block=1)
+
+    dump = read_i2c_block(transport, size=11)
+
+    assert _values(dump) == [0xff - reg for reg in range(10)] + [-1, -1]
+    assert transport.transactions == 12
+
+
+@pytest.mark.parametrize("block_size", [0, 1, 7, 32, 1000])
+def test_block_sizes(block_size):
+    registers = {reg: reg * 3 & 0xff for reg in range(0x30)}
+    transport = FakeTransport(registers, max_block=16)
+
+    dump = read_i2c_block(transport, size=0x2f, block_size=block_size)
+
+    assert _values(dump) == [reg * 3 & 0xff for reg in range(0x30)]
+    capped = max(min(block_size, 16), 1)
+    assert transport.transactions == -(-0x30 // capped)
@@ -0,0 +1,132 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the inverted dump index."""
+
+import os
+import random
+
+import pytest
+
+from libdump.index import COMPACT_RATIO, DumpIndex
+
+BLOCK = "mmio:0x1000"
+
+
+def _write_dump(path, values):
+    """Write a text dump of 8-bit values at 0x1000; None is unreadable."""
+    with open(path, "w") as f:
+        f.write(
+            "fmt dump\ntype mmio\nbase_addr 0x00001000\n"
+            f"size {hex((len(values) - 1) * 4)}\naddr_bits 32\nval_bits 8\n"
+            "--- header_end ---\n"
+        )
+        for i, value in enumerate(values):
+            f.write(f"0x{0x1000 + i * 4:08x} ")
+            f.write("-\n" if value is None else f"0x{value:02x}\n")
+
+
+def _check_queries(index, contents):
+    """Compare the index against a naive scan of the dumps' values."""
+    for i in range(4):
+        addr = 0x1000 + i * 4
+        readable = sorted(p for p, v in contents.items() if v[i] is not None)
+        assert sorted(index.readable(BLOCK, addr)) == readable
+        for value in range(4):
+            expected = sorted(p for p, v in contents.items() if v[i] == value)
+            assert sorted(index.with_value(BLOCK, addr, value)) == expected
+        for mask in 1, 2, 3:
+            expected = sorted(
+                p for p, v in contents.items()
+                if v[i] is not None and v[i] & mask == mask
+            )
+            assert sorted(index.with_mask(BLOCK, addr, mask)) == expected
+
+
+@pytest.fixture
+def dumps(tmp_path):
+    rng = random.Random(0)
+    contents = {}
+    os.mkdir(tmp_path / "dumps")
+    for n in range(20):
+        path = str(tmp_path / "dumps" / f"{n:02}.dump")
+        values = [rng.choice([None, 0, 1, 2, 3]) for _ in range(4)]
+        _write_dump(path, values)
+        contents[path] = values
+    return contents
+
+
+def test_update_and_query(tmp_path, dumps):
+    index = DumpIndex(tmp_path / "index")
+    assert index.update([tmp_path / "dumps"]) == (20, 0)
+    _check_queries(index, dumps)
+    assert index.blocks() == {BLOCK: 20}
+
+    # Nothing changed
+    assert index.update([tmp_path / "dumps"]) == (0, 0)
+    _check_queries(DumpIndex(tmp_path / "index"), dumps)
+
+
+def test_removed_dumps_are_compacted(tmp_path, dumps):
+    index = DumpIndex(tmp_path / "index")
+    index.update([tmp_path / "dumps"])
+
+    # Below the threshold, removed ids are only masked out
+    few = int(20 * COMPACT_RATIO)
+    for path in sorted(dumps)[:few]:
+        os.remove(path)
+        del dumps[path]
+    assert index.update([tmp_path / "dumps"]) == (0, few)
+    assert len(index.dumps) == 20
+    _check_queries(index, dumps)
+
+    for path in sorted(dumps)[::3]:
+        os.remove(path)
+        del dumps[path]
+    index.update([tmp_path / "dumps"])
+    assert len(index.dumps) == len(dumps)
+    assert None not in index.dumps
+    _check_queries(index, dumps)
+    _check_queries(DumpIndex(tmp_path / "index"), dumps)
+
+    # New dumps get ids after the compacted ones
+    path = str(tmp_path / "dumps" / "new.dump")
+    _write_dump(path, [3, 3, None, 0])
+    dumps[path] = [3, 3, None, 0]
+    assert index.update([tmp_path / "dumps"]) == (1, 0)
+    _check_queries(DumpIndex(tmp_path / "index"), dumps)
+
+
+def test_compact_everything(tmp_path, dumps):
+    index = DumpIndex(tmp_path / "index")
+    index.update([tmp_path / "dumps"])
+    for path in dumps:
+        index.remove(path)
+    index.save()
+
+    assert index.dumps == []
+    _check_queries(DumpIndex(tmp_path / "index"), {})
+
+
+def test_modified_dump(tmp_path, dumps):
+    index = DumpIndex(tmp_path / "index")
+    index.update([tmp_path / "dumps"])
+
+    path = sorted(dumps)[0]
+    _write_dump(path, [0, 1, 2, 3])
+    os.utime(path, ns=(0, 0))
+    dumps[path] = [0, 1, 2, 3]
+    assert index.update([tmp_path / "dumps"]) == (1, 0)
+    _check_queries(index, dumps)
+
+
+def test_missing_path(tmp_path, dumps):
+    index = DumpIndex(tmp_path / "index")
+    paths = sorted(dumps)
+    index.update(paths)
+
+    # Paths passed explicitly that no longer exist are removed, not fatal
+    os.remove(paths[0])
+    del dumps[paths[0]]
+    assert index.update(paths) == (0, 1)
+    _check_queries(index, dumps)
+
+    assert index.update([tmp_path / "nonexistent.dump"]) == (0, 0)
@@ -0,0 +1,106 @@
+# SPDX-License-Identifier: MIT
+"""Tests for reading MMIO blocks, using regular files in place of /dev/mem."""
+
+import os
+import struct
+
+import pytest
+
+from libdump import mmio
+from libdump.dump import BINARY_FMT, TEXT_FMT, Dump, dump_to_file
+
+
+def _write_words(path, words, width=32):
+    fmt = {8: "B", 16: "H", 32: "I", 64: "Q"}[width]
+    with open(path, "wb") as f:
+        f.write(struct.pack(f"={len(words)}{fmt}", *words))
+
+
+def _values(dump):
+    return [dump.data[addr] for addr in dump.data]
+
+
+@pytest.mark.parametrize("isolate_faults", [True, False])
+def test_read_regular_file(tmp_path, isolate_faults):
+    mem = tmp_path / "mem"
+    _write_words(mem, [0x1000 + i for i in range(8)])
+
+    # The last two registers are past the end of the file
+    dump = mmio.read_mmio_block(0, 0x24, path=str(mem), isolate_faults=isolate_faults)
+
+    assert dump.base_addr == 0
+    assert dump.val_bits == 32
+    assert _values(dump) == [0x1000 + i for i in range(8)] + [-1, -1]
+
+
+@pytest.mark.parametrize("width", [8, 16, 64])
+def test_read_widths(tmp_path, width):
+    mem = tmp_path / "mem"
+    words = [(1 << width) - 1 - i for i in range(4)]
+    _write_words(mem, words, width)
+
+    dump = mmio.read_mmio_block(
+        0, 3 * width // 8, path=str(mem), width=width, addr_bits=width
+    )
+
+    assert _values(dump) == words
+
+
+def test_read_offset_block(tmp_path):
+    mem = tmp_path / "mem"
+    _write_words(mem, list(range(4096)))
+
+    dump = mmio.read_mmio_block(0x2000, 0xc, path=str(mem))
+
+    assert dump.base_addr == 0x2000
+    assert _values(dump) == [0x800, 0x801, 0x802, 0x803]
+
+
+@pytest.mark.parametrize("fmt", [TEXT_FMT, BINARY_FMT])
+def test_write_output(tmp_path, fmt):
+    mem = tmp_path / "mem"
+    _write_words(mem, [0xdeadbeef, 0, 0x12345678])
+    dump = mmio.read_mmio_block(0x0, 0xc, path=str(mem))
+
+    out = tmp_path / f"out.{fmt}"
+    dump_to_file(dump, str(out), fmt)
+    reread = Dump(str(out))
+
+    assert reread.base_addr == 0
+    assert reread.val_bits == 32
+    assert _values(reread) == [0xdeadbeef, 0, 0x12345678, -1]
+    if fmt == TEXT_FMT:
+        lines = out.read_text().splitlines()
+        assert lines[-4:] == [
+            "0x00000000 0xdeadbeef",
+            "0x00000004 0x00000000",
+            "0x00000008 0x12345678",
+            "0x0000000c -",
+        ]
+
+
+class _ShrinkingMemMap(mmio.MemMap):
+    """Truncates the file once mapped, so reads past the new end fault."""
+
+    truncate_to = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        os.truncate(self.path, self.truncate_to)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_faulting_words(tmp_path, monkeypatch):
+    page_size = mmio.mmap.PAGESIZE
+    mem = tmp_path / "mem"
+    _write_words(mem, list(range(page_size // 4 * 2)))
+
+    # Keep the first page plus 16 words of the second page; accessing the
+    # rest of the second page raises SIGBUS, one fault per register
+    monkeypatch.setattr(_ShrinkingMemMap, "truncate_to", page_size)
+    monkeypatch.setattr(mmio, "MemMap", _ShrinkingMemMap)
+
+    base = page_size - 8 * 4
+    dump = mmio.read_mmio_block(base, 8 * 4 + 16 * 4 - 4, path=str(mem))
+
+    assert _values(dump) == [page_size // 4 - 8 + i for i in range(8)] + [-1] * 16
@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: MIT
+"""Tests for creating and applying register patches."""
+
+from array import array
+import struct
+
+from libdump.dump import Dump
+from libdump.i2c import FakeTransport
+from libdump.patch import (
+    PatchEntry, apply_patch, diff_to_patch, load_patch, patch_mem_map, patch_to_file
+)
+
+
+def _make_dump(values, val_bits=8, dump_type="i2c"):
+    """Create a dump from a list of values; None is unreadable."""
+    addr_bits = 8 if val_bits == 8 else 32
+    stride = addr_bits // 8
+    header = {
+        "fmt": "dump",
+        "type": dump_type,
+        "base_addr": "0x00",
+        "size": hex((len(values) - 1) * stride),
+        "addr_bits": str(addr_bits),
+        "val_bits": str(val_bits),
+    }
+    valid = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is not None:
+            valid[i >> 3] |= 1 << (i & 7)
+    typecode = "B" if val_bits == 8 else "I"
+    return Dump.from_arrays(header, array(typecode, [v or 0 for v in values]), valid)
+
+
+FOO = [0x00, 0x0f, 0xf0, None, 0x55, 0xaa]
+BAR = [0x00, 0x1f, 0x0f, 0x33, None, 0x55]
+
+
+def test_diff_to_patch():
+    patch = diff_to_patch(_make_dump(FOO), _make_dump(BAR))
+    assert patch.header["fmt"] == "patch"
+    assert patch.entries == [
+        PatchEntry(1, 0x1f), PatchEntry(2, 0x0f), PatchEntry(3, 0x33), PatchEntry(5, 0x55),
+    ]
+
+
+def test_diff_to_patch_masked():
+    patch = diff_to_patch(_make_dump(FOO), _make_dump(BAR), masked=True)
+    # Only the changed bits are written; registers whose bits all changed
+    # or that became readable are written in full
+    assert patch.entries == [
+        PatchEntry(1, 0x1f, 0x10),
+        PatchEntry(2, 0x0f),
+        PatchEntry(3, 0x33),
+        PatchEntry(5, 0x55),
+    ]
+
+
+def test_patch_file_round_trip(tmp_path):
+    patch = diff_to_patch(_make_dump(FOO), _make_dump(BAR), masked=True)
+    patch_to_file(patch, tmp_path / "out.patch")
+    loaded = load_patch(tmp_path / "out.patch")
+
+    assert loaded.header == patch.header
+    assert loaded.entries == patch.entries
+
+
+def test_apply_masked_i2c():
+    patch = diff_to_patch(_make_dump(FOO), _make_dump(BAR), masked=True)
+    # The device has drifted from FOO in bits the patch does not touch
+    registers = {0: 0x80, 1: 0x8f, 2: 0xf0, 3: 0x01, 4: 0x55, 5: 0xaa}
+    transport = FakeTransport(registers)
+
+    assert apply_patch(patch, transport) == 4
+
+    # Register 1 keeps its unrelated bit 7; the others are written in full
+    assert registers == {0: 0x80, 1: 0x9f, 2: 0x0f, 3: 0x33, 4: 0x55, 5: 0x55}
+
+
+def test_apply_masked_mmio(tmp_path):
+    foo = _make_dump([0x11110000, 0x0000ffff, 0x12345678], val_bits=32, dump_type="mmio")
+    bar = _make_dump([0x11110000, 0x0000f0ff, 0x12345678], val_bits=32, dump_type="mmio")
+    patch = diff_to_patch(foo, bar, masked=True)
+    assert patch.entries == [PatchEntry(4, 0x0000f0ff, 0x00000f00)]
+
+    mem = tmp_path / "mem"
+    mem.write_bytes(struct.pack("=3I", 0x11110000, 0xabcdefff, 0x12345678))
+    with patch_mem_map(patch, str(mem)) as mem_map:
+        assert apply_patch(patch, mem_map) == 1
+
+    assert struct.unpack("=3I", mem.read_bytes()) == (0x11110000, 0xabcde0ff, 0x12345678)
@@ -0,0 +1,110 @@
+# SPDX-License-Identifier: MIT
+"""Tests for series of snapshots of the same block."""
+
+from array import array
+
+import pytest
+
+from libdump.dump import Dump
+from libdump.series import DumpSeries
+
+
+def _make_dump(values, typecode="I", base_addr=0x1000, filename=""):
+    """Create a 32-bit dump from a list of values; None is unreadable."""
+    header = {
+        "fmt": "dump",
+        "type": "test",
+        "base_addr": f"0x{base_addr:08x}",
+        "size": hex((len(values) - 1) * 4),
+        "addr_bits": "32",
+        "val_bits": "32",
+    }
+    valid = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is not None:
+            valid[i >> 3] |= 1 << (i & 7)
+    typed = array(typecode, [value or 0 for value in values])
+    return Dump.from_arrays(header, typed, valid, filename)
+
+
+ROWS = [
+    [0x11, 0x0f, 0x00, 0x80000000, None],
+    [0x11, 0x0a, 0x00, 0x80000001, 0x5],
+    [0x11, 0x0f, 0x00, 0x00000001, 0x5],
+]
+
+
+def _series(typecode="I", labels=None):
+    return DumpSeries([_make_dump(row, typecode) for row in ROWS], labels)
+
+
+@pytest.mark.parametrize("typecode", ["I", "Q", "L"])
+def test_values(typecode):
+    series = _series(typecode)
+    assert series.values.typecode == "I"
+    for n, row in enumerate(ROWS):
+        assert list(series.row(n)) == [value or 0 for value in row]
+
+
+def test_values_from_list():
+    dumps = [_make_dump(row) for row in ROWS]
+    dumps[1]._store = (list(dumps[1].values), dumps[1].valid)
+    series = DumpSeries(dumps)
+    assert list(series.row(1)) == [0x11, 0x0a, 0x00, 0x80000001, 0x5]
+
+
+@pytest.mark.parametrize("typecode", ["I", "Q"])
+def test_constant_and_toggling(typecode):
+    series = _series(typecode)
+    assert series.constant_registers() == [0x1000, 0x1008]
+    # The register at 0x1010 toggles too, but is unreadable in one snapshot
+    assert series.toggling_registers() == [
+        (0x1004, 0x05), (0x100c, 0x80000001),
+    ]
+    assert [series.is_always_valid(i) for i in range(5)] == [
+        True, True, True, True, False,
+    ]
+
+
+def test_single_dump():
+    series = DumpSeries([_make_dump(ROWS[0])])
+    assert series.constant_registers() == [0x1000, 0x1004, 0x1008, 0x100c]
+    assert series.toggling_registers() == []
+
+
+@pytest.mark.parametrize("typecode", ["I", "Q"])
+def test_group_diff(typecode):
+    series = DumpSeries([
+        _make_dump([0x3, 0xf0, 0x1], typecode),
+        _make_dump([0x3, 0xf1, 0x0], typecode),
+        _make_dump([0x1, 0x0f, 0x1], typecode),
+        _make_dump([0x1, 0x0e, 0x1], typecode),
+    ], ["on", "on", "off", "off"])
+    assert series.groups() == {"on": [0, 1], "off": [2, 3]}
+    # Bit 0 of the second register toggles within both groups, and the
+    # third register toggles within "on", so neither counts
+    assert series.group_diff("on", "off") == [
+        (0x1000, 0x2, 0x3, 0x1),
+        (0x1004, 0xfe, 0xf0, 0x0f),
+    ]
+    assert series.group_diff("off", "on") == [
+        (0x1000, 0x2, 0x1, 0x3),
+        (0x1004, 0xfe, 0x0f, 0xf0),
+    ]
+    with pytest.raises(KeyError):
+        series.group_diff("on", "missing")
+
+    report = series.report()
+    assert "Differences between on and off: 2" in report
+    assert "  0x1004: bits 0x000000fe: on=0x000000f0 off=0x0000000f" in report
+
+
+def test_mismatched_dumps():
+    with pytest.raises(ValueError):
+        DumpSeries([])
+    with pytest.raises(ValueError):
+        DumpSeries([_make_dump([1, 2]), _make_dump([1, 2, 3])])
+    with pytest.raises(ValueError):
+        DumpSeries([_make_dump([1]), _make_dump([1], base_addr=0x2000)])
+    with pytest.raises(ValueError):
+        DumpSeries([_make_dump([1]), _make_dump([1])], ["only one"])
@@ -0,0 +1,55 @@
+# SPDX-License-Identifier: MIT
+"""Tests for the opt-in instrumentation."""
+
+import pytest
+
+from libdump import stats
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    stats.reset()
+    yield
+    stats.disable()
+    stats.reset()
+
+
+def test_disabled():
+    with stats.timer("stage"):
+        stats.count("items")
+    assert stats.timers == {} and stats.counters == {}
+
+
+def test_timers_and_counters():
+    stats.enable()
+    for _ in range(3):
+        with stats.timer("stage"):
+            stats.count("items", 2)
+    assert stats.calls == {"stage": 3}
+    assert stats.counters == {"items": 6}
+    # Memory is only measured when tracing it
+    assert stats.memory == {}
+    assert "peak mem" not in stats.report()
+
+
+def test_per_stage_peak_memory():
+    stats.enable(trace_memory=True)
+    mib = 1024 * 1024
+    kept = []
+
+    with stats.timer("outer"):
+        kept.append(bytearray(2 * mib))
+        with stats.timer("big"):
+            data = bytearray(8 * mib)
+            del data
+        with stats.timer("small"):
+            data = bytearray(mib)
+            del data
+
+    # Stages after a big one do not inherit its peak, and the enclosing
+    # stage includes the peaks of the stages in it
+    assert 8 * mib <= stats.memory["big"] < 9 * mib
+    assert mib <= stats.memory["small"] < 2 * mib
+    assert 10 * mib <= stats.memory["outer"] < 11 * mib
+    assert "peak mem" in stats.report()
+    assert stats.as_dict()["peak_memory"] == stats.memory
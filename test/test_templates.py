@@ -0,0 +1,57 @@
+# SPDX-License-Identifier: MIT
+"""Tests for loading the HTML templates."""
+
+import os
+
+import pytest
+
+from libdump import templates
+
+TEMPLATE = "_generate_dump_diff_tmpl.html"
+
+
+@pytest.fixture(autouse=True)
+def fresh_environments(monkeypatch):
+    monkeypatch.setattr(templates, "_environments", {})
+
+
+def test_bytecode_cache(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    template = templates.load_template(TEMPLATE, cache_dir)
+    cached = os.listdir(cache_dir)
+    assert len(cached) == 1
+    assert templates.load_template(TEMPLATE, cache_dir) is template
+
+    # A new environment, like in a new process, loads the cached bytecode
+    # instead of compiling the template
+    monkeypatch.setattr(templates, "_environments", {})
+    import jinja2
+
+    def compile_template(*args, **kwargs):
+        raise AssertionError("template compiled despite the cache")
+
+    monkeypatch.setattr(jinja2.Environment, "compile", compile_template)
+    from_cache = templates.load_template(TEMPLATE, cache_dir)
+    assert from_cache is not template
+    assert os.listdir(cache_dir) == cached
+
+
+def test_no_cache(monkeypatch):
+    import jinja2
+
+    compiled = []
+    compile_template = jinja2.Environment.compile
+
+    def counting_compile(self, *args, **kwargs):
+        compiled.append(args)
+        return compile_template(self, *args, **kwargs)
+
+    monkeypatch.setattr(jinja2.Environment, "compile", counting_compile)
+    template = templates.load_template(TEMPLATE, None)
+    assert templates.load_template(TEMPLATE, None) is template
+    assert len(compiled) == 1
+
+    # Without a cache, a new environment compiles the template again
+    monkeypatch.setattr(templates, "_environments", {})
+    templates.load_template(TEMPLATE, None)
+    assert len(compiled) == 2
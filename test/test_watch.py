@@ -0,0 +1,218 @@
+# SPDX-License-Identifier: MIT
+"""Tests for following dumps that are being written and updating diffs."""
+
+from array import array
+import os
+import random
+
+import pytest
+
+from libdump import watch
+from libdump.diff import diff_dumps, update_diff
+from libdump.dump import Dump
+from libdump.watch import DiffWatcher, DumpFollower
+
+COUNT = 600
+
+HEADER = (
+    "fmt dump\ntype mmio\nbase_addr 0x00002000\n"
+    f"size {hex((COUNT - 1) * 4)}\naddr_bits 32\nval_bits 32\n"
+    "--- header_end ---\n"
+)
+
+
+def _make_dump(values):
+    header = {
+        "fmt": "dump",
+        "type": "mmio",
+        "base_addr": "0x00002000",
+        "size": hex((len(values) - 1) * 4),
+        "addr_bits": "32",
+        "val_bits": "32",
+    }
+    valid = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is not None:
+            valid[i >> 3] |= 1 << (i & 7)
+    return Dump.from_arrays(header, array("I", [v or 0 for v in values]), valid)
+
+
+def _diff_state(diff):
+    return (
+        list(diff.changed), list(diff.xor), list(diff.changed_bits),
+        list(diff.became_unreadable), list(diff.became_readable),
+    )
+
+
+def _random_value(rng):
+    return None if rng.random() < 0.1 else rng.getrandbits(32)
+
+
+def test_update_diff_single_changes():
+    rng = random.Random(0)
+    foo_values = [_random_value(rng) for _ in range(COUNT)]
+    bar_values = list(foo_values)
+    foo, bar = _make_dump(foo_values), _make_dump(bar_values)
+    diff = diff_dumps(foo, bar)
+
+    for _ in range(300):
+        i = rng.randrange(COUNT)
+        dump, values = rng.choice([(foo, foo_values), (bar, bar_values)])
+        values[i] = rng.choice([None, _random_value(rng), values[i]])
+        store_values, valid = dump._store
+        if values[i] is None:
+            valid[i >> 3] &= ~(1 << (i & 7))
+        else:
+            store_values[i] = values[i]
+            valid[i >> 3] |= 1 << (i & 7)
+
+        before = _diff_state(diff)
+        changed = update_diff(diff, foo, bar, [i])
+        expected = diff_dumps(foo, bar)
+        assert _diff_state(diff) == _diff_state(expected)
+
+        addr = 0x2000 + i * 4
+        assert changed == ([addr] if _diff_state(diff) != before else [])
+
+
+def _records(values):
+    return "".join(
+        f"0x{0x2000 + i * 4:08x} " + ("-\n" if v is None else f"0x{v:08x}\n")
+        for i, v in enumerate(values)
+    )
+
+
+class _File:
+    """Dump file whose mtime changes on every write, however fast."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.mtime_ns = 10**18
+
+    def write(self, text, mode="w"):
+        with open(self.path, mode) as f:
+            f.write(text)
+        self.mtime_ns += 10**9
+        os.utime(self.path, ns=(self.mtime_ns, self.mtime_ns))
+
+
+def _check_follower(follower, previous, changed):
+    """
+    Compare a follower against a fresh parse of its file, and the indices
+    it reported against a diff of the fresh parses.
+    """
+    fresh = Dump(follower.path)
+    assert bytes(follower.dump.valid) == bytes(fresh.valid)
+    assert [
+        follower.dump.values[i] for i in range(COUNT) if fresh.is_valid(i)
+    ] == [fresh.values[i] for i in range(COUNT) if fresh.is_valid(i)]
+
+    if previous is not None:
+        diff = diff_dumps(previous, fresh)
+        assert changed == [(addr - 0x2000) // 4 for addr in diff.changed_addrs()]
+    return fresh
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # About 25 records per block
+    monkeypatch.setattr(watch, "BLOCK_SIZE", 512)
+
+
+def test_follow_append(tmp_path):
+    rng = random.Random(1)
+    values = [_random_value(rng) for _ in range(COUNT)]
+    dump_file = _File(tmp_path / "dump")
+    follower = DumpFollower(dump_file.path)
+
+    assert follower.update() == []
+    dump_file.write(HEADER[:20])
+    assert follower.update() == []
+    assert follower.dump is None
+
+    dump_file.write(HEADER)
+    assert follower.update() is None
+    fresh = _check_follower(follower, None, None)
+
+    lines = _records(values).splitlines(keepends=True)
+    pos = 0
+    while pos < COUNT:
+        pos += rng.randrange(1, 80)
+        text = HEADER + "".join(lines[:pos])
+        # Sometimes end on a partial line, which is picked up later
+        if rng.random() < 0.3 and pos < COUNT:
+            text += lines[pos][:7]
+        dump_file.write(text)
+        changed = follower.update()
+        fresh = _check_follower(follower, fresh, changed)
+        assert follower.update() == []
+
+
+@pytest.mark.parametrize("verify", [False, True])
+def test_follow_rewrite(tmp_path, verify):
+    rng = random.Random(2)
+    values = [_random_value(rng) for _ in range(COUNT)]
+    dump_file = _File(tmp_path / "dump")
+    dump_file.write(HEADER + _records(values))
+    follower = DumpFollower(dump_file.path)
+    follower.update()
+    fresh = _check_follower(follower, None, None)
+
+    for _ in range(20):
+        for i in rng.sample(range(COUNT), rng.randrange(1, 5)):
+            # Keep the size when not verifying, so that the rewrite is not
+            # mistaken for an append
+            if verify:
+                values[i] = _random_value(rng)
+            elif values[i] is not None:
+                values[i] = rng.getrandbits(32)
+        dump_file.write(HEADER + _records(values))
+        changed = follower.update(verify=verify)
+        fresh = _check_follower(follower, fresh, changed)
+
+
+def test_follow_truncate(tmp_path):
+    rng = random.Random(3)
+    values = [_random_value(rng) for _ in range(COUNT)]
+    dump_file = _File(tmp_path / "dump")
+    dump_file.write(HEADER + _records(values))
+    follower = DumpFollower(dump_file.path)
+    follower.update()
+    fresh = _check_follower(follower, None, None)
+
+    lines = _records(values).splitlines(keepends=True)
+    for keep in 400, 399, 100, 0, 250:
+        dump_file.write(HEADER + "".join(lines[:keep]))
+        changed = follower.update()
+        fresh = _check_follower(follower, fresh, changed)
+
+
+def test_follow_header_change(tmp_path):
+    dump_file = _File(tmp_path / "dump")
+    dump_file.write(HEADER + _records([1] * COUNT))
+    follower = DumpFollower(dump_file.path)
+    follower.update()
+
+    dump_file.write(HEADER.replace("type mmio", "type other") + _records([2] * COUNT))
+    assert follower.update() is None
+    assert follower.dump.type == "other"
+    _check_follower(follower, None, None)
+
+
+def test_diff_watcher(tmp_path):
+    rng = random.Random(4)
+    foo_values = [_random_value(rng) for _ in range(COUNT)]
+    bar_values = list(foo_values)
+    foo_file, bar_file = _File(tmp_path / "foo"), _File(tmp_path / "bar")
+    foo_file.write(HEADER + _records(foo_values))
+    bar_file.write(HEADER)
+
+    watcher = DiffWatcher(foo_file.path, bar_file.path)
+    assert watcher.update() is None
+
+    lines = _records(bar_values).splitlines(keepends=True)
+    for end in range(50, COUNT + 50, 50):
+        bar_file.write(HEADER + "".join(lines[:end]))
+        watcher.update()
+        expected = diff_dumps(Dump(foo_file.path), Dump(bar_file.path))
+        assert _diff_state(watcher.diff) == _diff_state(expected)
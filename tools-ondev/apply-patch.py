@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+"""
+Applies a patch file created by dump-diff-to-commands.py --patch, writing all
+registers through a single mapping of /dev/mem or a single I2C device handle.
+Copy libdump next to this script on the device.
+"""
+
+import argparse
+from libdump.i2c import SMBusTransport
+from libdump.mmio import DEV_MEM
+from libdump.patch import apply_patch, load_patch, patch_mem_map
+
+# -- Argument parsing --
+argparser = argparse.ArgumentParser(
+                    prog='apply-patch.py',
+                    description='Apply a register patch file')
+argparser.add_argument("patch")
+argparser.add_argument("-m", "--mem", default=DEV_MEM,
+                       help=f"memory device to write MMIO patches to; a regular file can be used for testing (default: {DEV_MEM})")
+argparser.add_argument("--i2c-bus", type=lambda x: int(x, 0),
+                       help="I2C bus to write I2C patches to (default: i2c_bus from the patch header)")
+argparser.add_argument("--dev-addr", type=lambda x: int(x, 0),
+                       help="I2C device address to write I2C patches to (default: dev_addr from the patch header)")
+args = argparser.parse_args()
+# -- End argument parsing --
+
+patch = load_patch(args.patch)
+
+if not patch.entries:
+    written = 0
+elif patch.type == "mmio":
+    with patch_mem_map(patch, args.mem) as mem:
+        written = apply_patch(patch, mem)
+elif patch.type == "i2c":
+    i2c_bus = args.i2c_bus
+    if i2c_bus is None:
+        i2c_bus = int(patch.header["i2c_bus"], 0)
+    dev_addr = args.dev_addr
+    if dev_addr is None:
+        dev_addr = int(patch.header["dev_addr"], 0)
+    with SMBusTransport(i2c_bus, dev_addr) as transport:
+        written = apply_patch(patch, transport)
+else:
+    argparser.error(f"unsupported patch type: {patch.type}")
+
+print(f"Wrote {written} registers")
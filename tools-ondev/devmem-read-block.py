@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+"""
+Dumps an entire MMIO block in one go by mapping /dev/mem, instead of running
+devmem2 for every register. Copy libdump next to this script on the device.
+"""
+
+import argparse
+from libdump.dump import dump_to_file, BINARY_FMT, TEXT_FMT
+from libdump.mmio import DEV_MEM, read_mmio_block
+
+# -- Argument parsing --
+argparser = argparse.ArgumentParser(
+                    prog='devmem-read-block.py',
+                    description='Dump an MMIO block through /dev/mem')
+argparser.add_argument("base_addr", type=lambda x: int(x, 0))
+argparser.add_argument("size", type=lambda x: int(x, 0),
+                       help="size of the block, i.e. offset of the last register")
+argparser.add_argument("-w", "--width", type=int, default=32, choices=(8, 16, 32, 64),
+                       help="access width in bits (default: 32)")
+argparser.add_argument("--addr-bits", type=int, default=32,
+                       help="amount of bits in addresses; registers are read every addr_bits / 8 bytes (default: 32)")
+argparser.add_argument("-m", "--mem", default=DEV_MEM,
+                       help=f"memory device to read from; a regular file can be used for testing (default: {DEV_MEM})")
+argparser.add_argument("-o", "--output", default="/dev/stdout",
+                       help="file to write the dump to (default: stdout)")
+argparser.add_argument("-b", "--binary", action="store_true",
+                       help="write the binary dump format instead of the text format")
+args = argparser.parse_args()
+# -- End argument parsing --
+
+dump = read_mmio_block(
+    args.base_addr, args.size, args.mem,
+    width=args.width, addr_bits=args.addr_bits
+)
+dump_to_file(dump, args.output, BINARY_FMT if args.binary else TEXT_FMT)
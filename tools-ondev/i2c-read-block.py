@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: MIT
+"""
+Dumps all registers of an I2C device using block reads through i2c-dev,
+instead of running i2cget for every register. Copy libdump next to this
+script on the device.
+"""
+
+import argparse
+from libdump.dump import dump_to_file, BINARY_FMT, TEXT_FMT
+from libdump.i2c import DEFAULT_BLOCK_SIZE, SMBusTransport, read_i2c_block
+
+# -- Argument parsing --
+argparser = argparse.ArgumentParser(
+                    prog='i2c-read-block.py',
+                    description='Dump the registers of an I2C device')
+argparser.add_argument("i2c_bus", type=lambda x: int(x, 0))
+argparser.add_argument("dev_addr", type=lambda x: int(x, 0))
+argparser.add_argument("size", type=lambda x: int(x, 0), nargs="?", default=0xff,
+                       help="last register to read (default: 0xff)")
+argparser.add_argument("-s", "--block-size", type=int, default=DEFAULT_BLOCK_SIZE,
+                       help=f"amount of registers to read in one transaction; 1 disables block reads (default: {DEFAULT_BLOCK_SIZE})")
+argparser.add_argument("--no-force", action="store_true",
+                       help="do not access the device if a driver has claimed it")
+argparser.add_argument("-o", "--output", default="/dev/stdout",
+                       help="file to write the dump to (default: stdout)")
+argparser.add_argument("-b", "--binary", action="store_true",
+                       help="write the binary dump format instead of the text format")
+args = argparser.parse_args()
+# -- End argument parsing --
+
+with SMBusTransport(args.i2c_bus, args.dev_addr, force=not args.no_force) as transport:
+    dump = read_i2c_block(transport, args.size, block_size=args.block_size)
+
+dump_to_file(dump, args.output, BINARY_FMT if args.binary else TEXT_FMT)